@@ -0,0 +1,9 @@
+#!/usr/bin/env bash
+# Build Render : dépendances, fichiers statiques, schéma et table de cache
+set -o errexit
+
+pip install -r requirements.txt
+
+python manage.py collectstatic --no-input
+python manage.py migrate
+python manage.py createcachetable
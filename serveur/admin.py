@@ -1,8 +1,15 @@
+from django import forms
 from django.contrib import admin, messages
+from django.contrib.admin import helpers
 from django.contrib.auth.models import User
 from django.contrib.auth.admin import UserAdmin
-from django.core.mail import send_mail
-from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse
+from django.shortcuts import render
+from django.urls import path
+
+from .catalogue import PERMISSIONS_SUPPRESSION, CatalogueError, exporter, importer
+from . import commandes, imei, journal, tarifs, transitions
 
 from .models import (
     Licence,
@@ -14,6 +21,11 @@ from .models import (
     Commande,
     PaymentConfig,
     Service,
+    ResumeCompte,
+    Notification,
+    JetonAPI,
+    EntreeJournal,
+    RechercheStat,
 )
 
 # =========================
@@ -22,6 +34,108 @@ from .models import (
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ("nom", "date_ajout")
+    change_list_template = "admin/serveur/category/change_list.html"
+
+    def get_urls(self):
+        urls = [
+            path(
+                "catalogue/importer/",
+                self.admin_site.admin_view(self.importer_catalogue),
+                name="serveur_catalogue_importer",
+            ),
+            path(
+                "catalogue/exporter/<str:format_fichier>/",
+                self.admin_site.admin_view(self.exporter_catalogue),
+                name="serveur_catalogue_exporter",
+            ),
+        ]
+        return urls + super().get_urls()
+
+    # =========================
+    # IMPORT CATALOGUE (CSV / JSON)
+    # =========================
+    def importer_catalogue(self, request):
+        if not request.user.has_perm("serveur.change_licence"):
+            return HttpResponse(status=403)
+
+        rapport = None
+        erreurs = []
+
+        if request.method == "POST" and request.FILES.get("fichier"):
+            fichier = request.FILES["fichier"]
+            format_fichier = "json" if fichier.name.lower().endswith(".json") else "csv"
+            dry_run = request.POST.get("dry_run") == "on"
+            supprimer = request.POST.get("supprimer") == "on"
+            if supprimer and not request.user.has_perms(PERMISSIONS_SUPPRESSION):
+                return HttpResponse(status=403)
+
+            try:
+                rapport = importer(fichier.read(), format_fichier, dry_run=dry_run, supprimer=supprimer)
+            except CatalogueError as exc:
+                erreurs = exc.erreurs
+            except ValueError as exc:
+                erreurs = [f"Fichier illisible : {exc}"]
+            else:
+                if not dry_run:
+                    messages.success(request, f"Catalogue synchronisé ({rapport.total} changement(s)).")
+
+        return render(request, "admin/serveur/category/importer_catalogue.html", {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Importer le catalogue",
+            "rapport": rapport,
+            "erreurs": erreurs,
+        })
+
+    def exporter_catalogue(self, request, format_fichier):
+        if format_fichier not in ("csv", "json"):
+            return HttpResponse(status=404)
+
+        content_type = "application/json" if format_fichier == "json" else "text/csv"
+        response = HttpResponse(exporter(format_fichier), content_type=f"{content_type}; charset=utf-8")
+        response["Content-Disposition"] = f'attachment; filename="catalogue.{format_fichier}"'
+        return response
+
+
+# =========================
+# ACTION : RÉVISER LES PRIX (EN MASSE)
+# =========================
+class RevisionPrixForm(forms.Form):
+    pourcentage = forms.FloatField(initial=0, help_text="Ex. 10 pour +10 %, -5 pour -5 %")
+    delta = forms.IntegerField(initial=0, help_text="Montant fixe ajouté (FCFA), peut être négatif")
+    pas = forms.IntegerField(initial=tarifs.PAS_DEFAUT, min_value=1, help_text="Arrondi au multiple de (FCFA)")
+    arrondi = forms.ChoiceField(choices=[
+        ("proche", "Au plus proche"),
+        ("haut", "Au-dessus"),
+        ("bas", "En dessous"),
+    ])
+
+
+@admin.action(description="💲 Réviser les prix de la sélection")
+def reviser_prix(modeladmin, request, queryset):
+    form = RevisionPrixForm(request.POST if "regle" in request.POST else None)
+    apercu = None
+
+    if form.is_valid():
+        regle = form.cleaned_data
+
+        if "appliquer" in request.POST:
+            count = tarifs.appliquer(queryset, **regle)
+            messages.success(request, f"{count} prix mis à jour.")
+            return None
+
+        apercu = tarifs.apercu(queryset, **regle)
+
+    return render(request, "admin/serveur/reviser_prix.html", {
+        **modeladmin.admin_site.each_context(request),
+        "opts": modeladmin.model._meta,
+        "title": "Réviser les prix",
+        "form": form,
+        "apercu": apercu,
+        "selection": request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+        "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+        "select_across": request.POST.get("select_across", "0"),
+    })
 
 
 # =========================
@@ -31,6 +145,8 @@ class CategoryAdmin(admin.ModelAdmin):
 class LicenceAdmin(admin.ModelAdmin):
     list_display = ("nom", "prix", "category", "date_ajout")
     list_editable = ("prix",)
+    list_filter = ("category",)
+    actions = [reviser_prix]
 
 
 # =========================
@@ -40,6 +156,8 @@ class LicenceAdmin(admin.ModelAdmin):
 class ServiceImeiAdmin(admin.ModelAdmin):
     list_display = ("nom", "prix", "category", "date_ajout")
     list_editable = ("prix",)
+    list_filter = ("category",)
+    actions = [reviser_prix]
 
 
 # =========================
@@ -59,97 +177,153 @@ class WalletAdmin(admin.ModelAdmin):
     list_display = ("user", "solde")
     readonly_fields = ("user",)
 
+    def save_model(self, request, obj, form, change):
+        # correction manuelle du solde : tracée dans le journal
+        with transaction.atomic():
+            avant = Wallet.objects.filter(pk=obj.pk).values_list("solde", flat=True).first() or 0
+            super().save_model(request, obj, form, change)
+            if obj.solde != avant:
+                journal.consigner(
+                    "wallet.ajustement", obj.user_id, montant=obj.solde - avant,
+                    avant=avant, apres=obj.solde, par=request.user.username,
+                )
+
+
+# =========================
+# RÉSUMÉ DU COMPTE (LECTURE SEULE)
+# =========================
+@admin.register(ResumeCompte)
+class ResumeCompteAdmin(admin.ModelAdmin):
+    list_display = (
+        "user",
+        "commandes_attente",
+        "commandes_succes",
+        "commandes_echec",
+        "total_depense",
+        "depots_attente",
+        "total_depose",
+    )
+    readonly_fields = list_display
+
+
+# =========================
+# NOTIFICATIONS ADMIN (DIGEST)
+# =========================
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ("date", "type", "user", "libelle", "montant", "immediate", "envoyee_le")
+    list_filter = ("type", "immediate", ("envoyee_le", admin.EmptyFieldListFilter))
+    search_fields = ("libelle", "user__username")
+    readonly_fields = ("date", "type", "user", "libelle", "montant", "details", "immediate", "envoyee_le")
+
+
+# =========================
+# JOURNAL DES CHANGEMENTS (LECTURE SEULE)
+# =========================
+@admin.register(EntreeJournal)
+class EntreeJournalAdmin(admin.ModelAdmin):
+    list_display = ("id", "date", "type", "user_id", "objet_id", "montant")
+    list_filter = ("type",)
+    readonly_fields = ("date", "type", "user_id", "objet_id", "montant", "donnees")
+    show_full_result_count = False
+
+    # ajout seul : rien ne se crée, se modifie ni ne se supprime à la main
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+# =========================
+# STATISTIQUES DE RECHERCHE (LECTURE SEULE)
+# =========================
+@admin.register(RechercheStat)
+class RechercheStatAdmin(admin.ModelAdmin):
+    list_display = ("terme", "nombre", "resultats", "derniere")
+    search_fields = ("terme",)
+    ordering = ("-nombre",)
+    readonly_fields = ("terme", "nombre", "resultats", "derniere")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 
 # =========================
 # ACTION : VALIDER COMMANDE
 # =========================
 def valider_commande(modeladmin, request, queryset):
-    count = 0
-    for c in queryset:
-        if c.statut == "attente":
-            c.statut = "succes"
-            c.save()
-
-            Historique.objects.create(
-                user=c.user,
-                nom_service=c.nom_produit,
-                prix=c.prix,
-                statut="succes",
-            )
-
-            # 📧 EMAIL UTILISATEUR
-            send_mail(
-                subject="✅ Commande validée - SK Serveur",
-                message=(
-                    f"Bonjour {c.user.username},\n\n"
-                    f"Votre commande '{c.nom_produit}' a été VALIDÉE avec succès.\n"
-                    f"Montant : {c.prix} FCFA\n\n"
-                    f"Merci pour votre confiance.\n"
-                    f"— SK Serveur"
-                ),
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[c.user.email],
-                fail_silently=True,
-            )
-
-            count += 1
-
-    messages.success(request, f"{count} commande(s) validée(s).")
+    commandes = transitions.valider_commandes(queryset)
+    messages.success(request, f"{len(commandes)} commande(s) validée(s).{_ignorees(queryset, commandes)}")
 
 
 # =========================
 # ACTION : REFUSER COMMANDE
 # =========================
 def refuser_commande(modeladmin, request, queryset):
-    count = 0
-    for c in queryset:
-        if c.statut == "attente":
-            c.statut = "refuse"
-            c.save()
-
-            # 💰 remboursement
-            wallet, _ = Wallet.objects.get_or_create(user=c.user)
-            wallet.solde += c.prix
-            wallet.save()
-
-            Historique.objects.create(
-                user=c.user,
-                nom_service=c.nom_produit,
-                prix=c.prix,
-                statut="echec",
-            )
-
-            # 📧 EMAIL UTILISATEUR
-            send_mail(
-                subject="❌ Commande refusée - SK Serveur",
-                message=(
-                    f"Bonjour {c.user.username},\n\n"
-                    f"Votre commande '{c.nom_produit}' a été REFUSÉE.\n"
-                    f"Le montant de {c.prix} FCFA a été remboursé dans votre solde.\n\n"
-                    f"— SK Serveur"
-                ),
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[c.user.email],
-                fail_silently=True,
-            )
-
-            count += 1
-
+    commandes = transitions.refuser_commandes(queryset)
     messages.warning(
         request,
-        f"{count} commande(s) refusée(s) et remboursée(s)."
+        f"{len(commandes)} commande(s) refusée(s) et remboursée(s).{_ignorees(queryset, commandes)}"
     )
 
 
+def _ignorees(queryset, traitees):
+    # lignes déjà traitées (par un autre opérateur ou avant la sélection)
+    reste = queryset.count() - len(traitees)
+    return f" {reste} ligne(s) déjà traitée(s) ignorée(s)." if reste else ""
+
+
+class EnregistrementPartielMixin:
+    """
+    Le formulaire de modification n'écrit que les champs changés : il
+    n'écrase jamais un statut basculé entre-temps par une action. date_maj
+    (auto_now, ignoré hors update_fields) suit, pour l'audit incrémental.
+    """
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            obj.save(update_fields=[*form.changed_data, "date_maj"] if form.changed_data else [])
+        else:
+            super().save_model(request, obj, form, change)
+
+
 # =========================
 # COMMANDE
 # =========================
 @admin.register(Commande)
-class CommandeAdmin(admin.ModelAdmin):
-    list_display = ("user", "nom_produit", "prix", "statut", "date")
+class CommandeAdmin(EnregistrementPartielMixin, admin.ModelAdmin):
+    list_display = ("user", "nom_produit", "prix", "imei", "appareil", "statut", "date")
     list_filter = ("statut",)
-    readonly_fields = ("user", "nom_produit", "prix", "date")
+    # statut : uniquement via les actions (transitions.py)
+    readonly_fields = ("user", "nom_produit", "prix", "statut", "date", "appareil_marque", "appareil_modele")
     actions = [valider_commande, refuser_commande]
+    # IMEI (complet ou début), email ou nom d'utilisateur : voir commandes.filtre_recherche
+    search_fields = ("imei_normalise", "email", "username_service")
+    search_help_text = "IMEI (complet ou 4 premiers chiffres et plus), email ou nom d'utilisateur"
+
+    def get_search_results(self, request, queryset, search_term):
+        # pas de icontains sur toute la table : uniquement des filtres indexés
+        if not search_term.strip():
+            return queryset, False
+        filtre = commandes.filtre_recherche(search_term)
+        if filtre is None:
+            return queryset.none(), False
+        return queryset.filter(filtre), False
+
+    @admin.display(description="Appareil")
+    def appareil(self, obj):
+        # commandes antérieures à l'import de la base TAC : lecture de l'index local
+        marque, modele = (obj.appareil_marque, obj.appareil_modele)
+        if not marque and obj.imei:
+            marque, modele = imei.appareil(obj.imei) or ("", "")
+        return f"{marque} {modele}".strip() or "—"
 
 
 # =========================
@@ -172,21 +346,10 @@ class CustomUserAdmin(UserAdmin):
 # ACTION : VALIDER TRANSACTION (RECHARGE)
 # =========================
 def valider_transaction(modeladmin, request, queryset):
-    count = 0
-    for t in queryset:
-        if t.statut == "attente":
-            t.statut = "valide"
-            t.save()
-
-            wallet, _ = Wallet.objects.get_or_create(user=t.user)
-            wallet.solde += t.montant
-            wallet.save()
-
-            count += 1
-
+    depots = transitions.valider_depots(queryset)
     messages.success(
         request,
-        f"{count} recharge(s) validée(s) et solde crédité."
+        f"{len(depots)} recharge(s) validée(s) et solde crédité.{_ignorees(queryset, depots)}"
     )
 
 
@@ -194,16 +357,10 @@ def valider_transaction(modeladmin, request, queryset):
 # ACTION : REFUSER TRANSACTION
 # =========================
 def refuser_transaction(modeladmin, request, queryset):
-    count = 0
-    for t in queryset:
-        if t.statut == "attente":
-            t.statut = "refuse"
-            t.save()
-            count += 1
-
+    depots = transitions.refuser_depots(queryset)
     messages.warning(
         request,
-        f"{count} recharge(s) refusée(s)."
+        f"{len(depots)} recharge(s) refusée(s).{_ignorees(queryset, depots)}"
     )
 
 
@@ -211,10 +368,10 @@ def refuser_transaction(modeladmin, request, queryset):
 # TRANSACTION (ADMIN)
 # =========================
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(EnregistrementPartielMixin, admin.ModelAdmin):
     list_display = ("user", "montant", "methode", "reference", "statut", "date")
     list_filter = ("statut", "methode")
-    readonly_fields = ("user", "montant", "methode", "reference", "date")
+    readonly_fields = ("user", "montant", "methode", "reference", "statut", "date")
     actions = [valider_transaction, refuser_transaction]
 
 
@@ -248,6 +405,7 @@ class ServiceAdmin(admin.ModelAdmin):
     )
     list_filter = ("category",)
     search_fields = ("nom", "description")
+    actions = [reviser_prix]
 
 
 
@@ -255,3 +413,19 @@ class ServiceAdmin(admin.ModelAdmin):
 
 admin.site.unregister(User)
 admin.site.register(User, CustomUserAdmin)
+
+
+# =========================
+# JETONS API (REVENDEURS)
+# =========================
+@admin.register(JetonAPI)
+class JetonAPIAdmin(admin.ModelAdmin):
+    list_display = ("user", "nom", "prefixe", "actif", "date_creation", "dernier_usage")
+    list_filter = ("actif",)
+    list_editable = ("actif",)
+    search_fields = ("user__username", "nom", "prefixe")
+    readonly_fields = ("prefixe", "date_creation", "dernier_usage")
+
+    def has_add_permission(self, request):
+        # la clé en clair n'est affichée qu'à la création : manage.py creer_jeton_api
+        return False
@@ -0,0 +1,274 @@
+"""
+API JSON des revendeurs (authentification par jeton).
+
+    Authorization: Bearer <jeton>     (manage.py creer_jeton_api <username>)
+
+GET  /api/v1/catalogue/   produits, prix, champs requis (ETag → 304)
+POST /api/v1/commandes/   {"commandes": [...]} : tout ou rien, un seul débit
+GET  /api/v1/commandes/   statuts ; ?ids=1,2,3 &statut= &apres=<id> &limite=
+"""
+import hashlib
+import json
+import secrets
+import threading
+from datetime import timedelta
+from functools import wraps
+
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+
+from . import commandes, configuration, routage, versions
+from .models import Category, Commande, JetonAPI, Wallet
+
+
+LOT_MAX = 200
+LIMITE_DEFAUT = 100
+LIMITE_MAX = 500
+IDS_MAX = 1000
+
+_verrou = threading.Lock()
+_catalogue = None  # (etag, contenu JSON)
+
+
+def erreur(message, status, **extra):
+    return JsonResponse({"erreur": message, **extra}, status=status)
+
+
+# =========================
+# JETONS
+# =========================
+def _empreinte(cle):
+    return hashlib.sha256(cle.encode()).hexdigest()
+
+
+def creer_jeton(user, nom=""):
+    """Crée un jeton ; la clé en clair n'est retournée qu'ici."""
+    cle = "sk_" + secrets.token_urlsafe(32)
+    jeton = JetonAPI.objects.create(user=user, nom=nom, empreinte=_empreinte(cle), prefixe=cle[:10])
+    return jeton, cle
+
+
+def jeton_requis(vue):
+    @csrf_exempt
+    @wraps(vue)
+    def wrapper(request, *args, **kwargs):
+        schema, _, cle = request.headers.get("Authorization", "").partition(" ")
+        if schema.lower() not in ("bearer", "token") or not cle:
+            return erreur("jeton manquant", 401)
+
+        jeton = (
+            JetonAPI.objects.select_related("user")
+            .filter(empreinte=_empreinte(cle.strip()), actif=True, user__is_active=True)
+            .first()
+        )
+        if jeton is None:
+            return erreur("jeton invalide", 401)
+
+        # dernier usage à la minute près : pas une écriture par appel
+        maintenant = timezone.now()
+        if jeton.dernier_usage is None or maintenant - jeton.dernier_usage > timedelta(minutes=1):
+            JetonAPI.objects.filter(pk=jeton.pk).update(dernier_usage=maintenant)
+
+        request.user = jeton.user
+        return vue(request, *args, **kwargs)
+
+    return wrapper
+
+
+# =========================
+# CATALOGUE
+# =========================
+def _construire_catalogue():
+    categories = dict(Category.objects.values_list("id", "nom"))
+    produits = []
+
+    for type_produit, modele in commandes.PRODUITS.items():
+        for produit in modele.objects.order_by("id"):
+            produits.append({
+                "type": type_produit,
+                "id": produit.id,
+                "nom": produit.nom,
+                "prix": produit.prix,
+                "categorie": categories.get(produit.category_id, ""),
+                "exige": commandes.exigences(type_produit, produit),
+                "champs": [
+                    {"id": c.id, "nom": c.nom, "type": c.type, "obligatoire": c.obligatoire}
+                    for c in configuration.champs_personnalises(produit)
+                ],
+            })
+
+    return json.dumps({"produits": produits}, ensure_ascii=False).encode()
+
+
+def _catalogue_courant():
+    global _catalogue
+
+    etag = '"{}"'.format(hashlib.sha1(
+        f"{versions.version(versions.CATALOGUE)}:{versions.version(versions.CONFIGURATION)}".encode()
+    ).hexdigest()[:20])
+
+    courant = _catalogue
+    if courant is not None and courant[0] == etag:
+        return courant
+
+    with _verrou:
+        if _catalogue is None or _catalogue[0] != etag:
+            with routage.primaire():
+                _catalogue = (etag, _construire_catalogue())
+        return _catalogue
+
+
+@jeton_requis
+def catalogue(request):
+    if request.method != "GET":
+        return erreur("méthode non autorisée", 405)
+
+    etag, contenu = _catalogue_courant()
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(contenu, content_type="application/json")
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+# =========================
+# COMMANDES
+# =========================
+@jeton_requis
+def commandes_api(request):
+    if request.method == "POST":
+        return _soumettre(request)
+    if request.method == "GET":
+        return _statuts(request)
+    return erreur("méthode non autorisée", 405)
+
+
+def _soumettre(request):
+    try:
+        lot = json.loads(request.body or b"{}").get("commandes")
+    except (ValueError, AttributeError):
+        return erreur("JSON invalide", 400)
+    if not isinstance(lot, list) or not lot:
+        return erreur('"commandes" doit être une liste non vide', 400)
+    if len(lot) > LOT_MAX:
+        return erreur(f"{LOT_MAX} commandes maximum par appel", 400)
+
+    # types vérifiés d'abord : la suite peut indexer / appeler .strip() sans risque
+    erreurs = [
+        {"index": index, "erreurs": problemes}
+        for index, problemes in enumerate(_erreurs_types(item) for item in lot)
+        if problemes
+    ]
+    if erreurs:
+        return erreur("commandes invalides", 400, details=erreurs)
+
+    # produits chargés en une requête par type
+    ids = {}
+    for item in lot:
+        ids.setdefault(item["type"], set()).add(item["produit_id"])
+    produits = {
+        type_produit: commandes.PRODUITS[type_produit].objects.in_bulk(pks)
+        for type_produit, pks in ids.items()
+    }
+
+    lignes = []
+    for index, item in enumerate(lot):
+        produit = produits[item["type"]].get(item["produit_id"])
+        if produit is None:
+            erreurs.append({"index": index, "erreurs": ["produit introuvable"]})
+            continue
+        try:
+            lignes.append(commandes.preparer(request.user, item["type"], produit, item))
+        except commandes.CommandeInvalide as exc:
+            erreurs.append({"index": index, "erreurs": exc.erreurs})
+
+    if erreurs:
+        return erreur("commandes invalides", 400, details=erreurs)
+
+    try:
+        creees = commandes.creer(request.user, lignes)
+    except commandes.SoldeInsuffisant as exc:
+        return erreur("solde insuffisant", 402, total=exc.total)
+
+    solde = Wallet.objects.filter(user=request.user).values_list("solde", flat=True).first()
+    return JsonResponse({
+        "commandes": [_commande_json(c) for c in creees],
+        "total": sum(c.prix for c in creees),
+        "solde": solde,
+    }, status=201)
+
+
+CHAMPS_TEXTE = ("email", "username_service", "imei", "photo_lien")
+
+
+def _erreurs_types(item):
+    """Erreurs de forme d'une commande du lot ([] si les types sont bons)."""
+    if not isinstance(item, dict):
+        return ["objet attendu"]
+
+    erreurs = []
+    if item.get("type") not in commandes.PRODUITS:
+        erreurs.append(f'"type" doit valoir {", ".join(commandes.PRODUITS)}')
+    # bool est un int en Python : exclu explicitement
+    produit_id = item.get("produit_id")
+    if not isinstance(produit_id, int) or isinstance(produit_id, bool) or not 0 < produit_id < 2 ** 63:
+        erreurs.append('"produit_id" doit être un entier positif')
+    for cle in CHAMPS_TEXTE:
+        if item.get(cle) is not None and not isinstance(item[cle], str):
+            erreurs.append(f'"{cle}" doit être une chaîne')
+
+    champs = item.get("champs")
+    if champs is not None:
+        if not isinstance(champs, dict):
+            erreurs.append('"champs" doit être un objet {id: valeur}')
+        elif any(isinstance(v, (dict, list)) for v in champs.values()):
+            erreurs.append('"champs" : valeurs texte ou nombre uniquement')
+    return erreurs
+
+
+def _statuts(request):
+    try:
+        apres = int(request.GET.get("apres", 0))
+        limite = max(1, min(int(request.GET.get("limite", LIMITE_DEFAUT)), LIMITE_MAX))
+        ids = [int(i) for i in request.GET.get("ids", "").split(",") if i.strip()]
+    except ValueError:
+        return erreur("paramètre entier invalide", 400)
+    if len(ids) > IDS_MAX:
+        return erreur(f"{IDS_MAX} ids maximum", 400)
+
+    # pagination par clé : id > apres, pas d'OFFSET
+    qs = Commande.objects.filter(user=request.user, id__gt=apres).order_by("id")
+    if ids:
+        qs = qs.filter(id__in=ids)
+    if request.GET.get("statut"):
+        qs = qs.filter(statut=request.GET["statut"])
+
+    # statuts juste après une soumission : jamais depuis un réplica en retard
+    with routage.primaire():
+        page = list(qs.only(
+            "id", "type_commande", "nom_produit", "prix", "statut", "date",
+            "imei", "appareil_marque", "appareil_modele",
+        )[:limite + 1])
+
+    suivant = page[limite - 1].id if len(page) > limite else None
+    return JsonResponse({
+        "resultats": [_commande_json(c) for c in page[:limite]],
+        "suivant": suivant,
+    })
+
+
+def _commande_json(commande):
+    return {
+        "id": commande.id,
+        "type": commande.type_commande,
+        "nom": commande.nom_produit,
+        "prix": commande.prix,
+        "statut": commande.statut,
+        "imei": commande.imei or None,
+        "appareil": {"marque": commande.appareil_marque, "modele": commande.appareil_modele}
+        if commande.appareil_marque else None,
+        "date": commande.date.isoformat() if commande.date else None,
+    }
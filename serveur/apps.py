@@ -1,3 +1,9 @@
 from django.apps import AppConfig
 import os
 
+
+class ServeurConfig(AppConfig):
+    name = "serveur"
+
+    def ready(self):
+        from . import signals  # noqa: F401
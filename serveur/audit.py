@@ -0,0 +1,103 @@
+"""
+Audit des wallets : le solde doit valoir
+
+    dépôts validés − commandes en attente ou validées
+
+(une commande est débitée à la création, remboursée si refusée / expirée).
+Les compteurs de ResumeCompte sont vérifiés au passage.
+
+Solde attendu calculé par agrégats groupés (compteurs.agreger), jamais par
+boucle sur les utilisateurs. Le point de contrôle "wallets" retient la date
+du dernier passage : le suivant ne recalcule que les utilisateurs dont une
+commande, un dépôt ou le wallet a changé depuis (date_maj indexée), plus ceux
+déjà en écart.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import compteurs
+from .models import Commande, PointControle, ResumeCompte, Transaction, Wallet
+
+
+POINT_CONTROLE = "wallets"
+# transactions encore ouvertes au passage précédent (date_maj antérieure,
+# commit postérieur) : on relit un peu avant la position retenue
+MARGE = timedelta(minutes=5)
+LOT_UTILISATEURS = 1000
+
+
+def _utilisateurs_modifies(depuis):
+    ids = set()
+    for modele in (Commande, Transaction, Wallet):
+        ids.update(
+            modele.objects.filter(date_maj__gte=depuis).values_list("user_id", flat=True).distinct().iterator()
+        )
+    return ids
+
+
+def _lots(ids, taille):
+    ids = sorted(ids)
+    for debut in range(0, len(ids), taille):
+        yield ids[debut:debut + taille]
+
+
+def _verifier(user_ids):
+    """[(user_id, champ, valeur, attendu)] pour `user_ids` (None = tous)."""
+    attendus = compteurs.agreger(user_ids)
+
+    wallets = Wallet.objects.all()
+    resumes = ResumeCompte.objects.all()
+    if user_ids is not None:
+        wallets = wallets.filter(user_id__in=user_ids)
+        resumes = resumes.filter(user_id__in=user_ids)
+
+    ecarts = []
+    soldes = dict(wallets.values_list("user_id", "solde").iterator())
+    for user_id in soldes.keys() | attendus.keys():
+        valeurs = attendus.get(user_id, {})
+        attendu = valeurs.get("total_depose", 0) - valeurs.get("total_depense", 0) - valeurs.get("engage", 0)
+        solde = soldes.get(user_id, 0)
+        if solde != attendu:
+            ecarts.append((user_id, "solde", solde, attendu))
+
+    for resume in resumes.values("user_id", *compteurs.CHAMPS).iterator():
+        valeurs = attendus.get(resume["user_id"], {})
+        for champ in compteurs.CHAMPS:
+            if resume[champ] != valeurs.get(champ, 0):
+                ecarts.append((resume["user_id"], champ, resume[champ], valeurs.get(champ, 0)))
+    return ecarts
+
+
+def auditer(complet=False, enregistrer=True):
+    """
+    Retourne (nombre d'utilisateurs vérifiés ou None si tous, écarts).
+    `complet` ignore le point de contrôle ; `enregistrer` le fait avancer.
+    """
+    point, _ = PointControle.objects.get_or_create(nom=POINT_CONTROLE)
+    debut = timezone.now()
+
+    isole = connection.vendor == "postgresql" and not connection.in_atomic_block
+    with transaction.atomic():
+        # un seul instantané pour les agrégats et les soldes : pas de faux
+        # écart dû à une commande passée entre deux requêtes
+        if isole:
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+
+        if complet or point.position is None:
+            verifies = None
+            ecarts = _verifier(None)
+        else:
+            ids = _utilisateurs_modifies(point.position - MARGE) | set(point.ecarts)
+            verifies = len(ids)
+            ecarts = []
+            for lot in _lots(ids, LOT_UTILISATEURS):
+                ecarts += _verifier(lot)
+
+    if enregistrer:
+        point.position = debut
+        point.ecarts = sorted({user_id for user_id, *_ in ecarts})
+        point.save()
+    return verifies, ecarts
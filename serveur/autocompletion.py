@@ -0,0 +1,112 @@
+"""
+Autocomplétion du catalogue : index de préfixes en mémoire du worker.
+
+L'index est un tableau trié de clés normalisées (sans accents, minuscules),
+une par début de mot de chaque nom de produit / catégorie ; une requête est
+une recherche dichotomique suivie d'un parcours tant que la clé commence par
+le préfixe. Il est reconstruit uniquement quand le tampon de version
+"catalogue" change (signaux sur les modèles du catalogue, imports en masse,
+révisions de prix).
+"""
+import threading
+import unicodedata
+from bisect import bisect_left
+
+from django.urls import reverse
+
+from . import routage, versions
+from .models import Category, Licence, Service, ServiceImei
+
+
+LIMITE_DEFAUT = 8
+LIMITE_MAX = 20
+
+# (type de commande, modèle) : mêmes types que la vue `commande`
+PRODUITS = (
+    ("licence", Licence),
+    ("service", ServiceImei),
+    ("service_general", Service),
+)
+
+_verrou = threading.Lock()
+_index = None  # (version, Index)
+
+
+def normaliser(texte):
+    texte = unicodedata.normalize("NFKD", texte or "")
+    texte = "".join(c for c in texte if not unicodedata.combining(c))
+    return " ".join(texte.lower().split())
+
+
+class Index:
+    def __init__(self, entrees):
+        self.entrees = entrees
+
+        paires = []
+        for position, entree in enumerate(entrees):
+            nom = normaliser(entree["nom"])
+            debut = 0
+            for mot in nom.split(" "):
+                paires.append((nom[debut:], position))
+                debut += len(mot) + 1
+        paires.sort()
+
+        self.cles = [cle for cle, _ in paires]
+        self.positions = [position for _, position in paires]
+
+    def chercher(self, prefixe, limite=LIMITE_DEFAUT):
+        prefixe = normaliser(prefixe)
+        if not prefixe:
+            return []
+
+        vus = set()
+        resultats = []
+        i = bisect_left(self.cles, prefixe)
+        while i < len(self.cles) and self.cles[i].startswith(prefixe):
+            position = self.positions[i]
+            if position not in vus:
+                vus.add(position)
+                resultats.append(self.entrees[position])
+                if len(resultats) >= limite:
+                    break
+            i += 1
+        return resultats
+
+
+def construire():
+    categories = dict(Category.objects.values_list("id", "nom"))
+
+    entrees = [
+        {"type": "categorie", "id": pk, "nom": nom, "categorie": nom}
+        for pk, nom in categories.items()
+    ]
+    for type_produit, modele in PRODUITS:
+        for pk, nom, prix, categorie_id in modele.objects.values_list(
+            "id", "nom", "prix", "category_id"
+        ):
+            entrees.append({
+                "type": type_produit,
+                "id": pk,
+                "nom": nom,
+                "prix": prix,
+                "categorie": categories.get(categorie_id, ""),
+                "url": reverse("commande", args=[type_produit, pk]),
+            })
+    return Index(entrees)
+
+
+def index():
+    """(version, Index) à jour ; reconstruit seulement si le catalogue a changé."""
+    global _index
+
+    version = versions.version(versions.CATALOGUE)
+    courant = _index
+    if courant is not None and courant[0] == version:
+        return courant
+
+    with _verrou:
+        if _index is None or _index[0] != version:
+            # principal : un réplica en retard figerait l'ancien catalogue
+            with routage.primaire():
+                _index = (version, construire())
+        return _index
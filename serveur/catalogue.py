@@ -0,0 +1,426 @@
+"""
+Import / export du catalogue (licences, services IMEI, services).
+
+Le fichier (CSV ou JSON) décrit le catalogue complet : une ligne par produit.
+La synchronisation compare le fichier au catalogue actuel puis applique les
+créations / modifications / suppressions avec bulk_create / bulk_update dans
+une seule transaction, quel que soit le nombre de produits.
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+
+from django.db import transaction
+
+from . import versions
+from .models import Category, Licence, ServiceImei, Service, CustomField
+
+
+# =========================
+# FORMAT DU FICHIER
+# =========================
+COLONNES = [
+    "type",
+    "categorie",
+    "nom",
+    "prix",
+    "description",
+    "image",
+    "email",
+    "username",
+    "imei",
+    "photo",
+    "champs",
+]
+
+# type produit -> (modèle, champ description, préfixe des options, a une image)
+TYPES = {
+    "licence": (Licence, "destription", "need", True),
+    "service_imei": (ServiceImei, "destription", "need", False),
+    "service": (Service, "description", "demande", True),
+}
+
+OPTIONS = ("email", "username", "imei", "photo")
+
+TYPES_CHAMPS = {code for code, _ in CustomField.TYPE_CHOICES}
+
+
+class CatalogueError(Exception):
+    """Fichier catalogue invalide (liste des erreurs par ligne)."""
+
+    def __init__(self, erreurs):
+        self.erreurs = erreurs
+        super().__init__("\n".join(erreurs))
+
+
+@dataclass
+class RapportSynchro:
+    dry_run: bool = False
+    categories_creees: list = field(default_factory=list)
+    crees: dict = field(default_factory=lambda: {t: [] for t in TYPES})
+    modifies: dict = field(default_factory=lambda: {t: [] for t in TYPES})
+    supprimes: dict = field(default_factory=lambda: {t: [] for t in TYPES})
+    champs_crees: int = 0
+    champs_modifies: int = 0
+    champs_supprimes: int = 0
+
+    @property
+    def total(self):
+        return sum(
+            len(d[t])
+            for d in (self.crees, self.modifies, self.supprimes)
+            for t in TYPES
+        )
+
+    def lignes(self):
+        entete = "SIMULATION (aucune écriture)" if self.dry_run else "Synchronisation appliquée"
+        lignes = [entete]
+        if self.categories_creees:
+            lignes.append(f"Catégories créées : {', '.join(self.categories_creees)}")
+        for t in TYPES:
+            lignes.append(
+                f"{t} : {len(self.crees[t])} créé(s), "
+                f"{len(self.modifies[t])} modifié(s), "
+                f"{len(self.supprimes[t])} supprimé(s)"
+            )
+            for nom in self.crees[t]:
+                lignes.append(f"  + {nom}")
+            for nom in self.modifies[t]:
+                lignes.append(f"  ~ {nom}")
+            for nom in self.supprimes[t]:
+                lignes.append(f"  - {nom}")
+        lignes.append(
+            f"Champs personnalisés : {self.champs_crees} créé(s), "
+            f"{self.champs_modifies} modifié(s), {self.champs_supprimes} supprimé(s)"
+        )
+        return lignes
+
+
+# =========================
+# LECTURE
+# =========================
+def _bool(valeur):
+    if isinstance(valeur, bool):
+        return valeur
+    return str(valeur).strip().lower() in ("1", "true", "vrai", "oui", "yes", "x")
+
+
+def _parse_champs(valeur):
+    """'Nom|type|1;Nom2|type|0' (CSV) ou liste de dicts (JSON)."""
+    if valeur in (None, ""):
+        return []
+    if isinstance(valeur, list):
+        if not all(isinstance(c, dict) and c.get("nom") for c in valeur):
+            raise ValueError("champs : objets {nom, type, obligatoire} attendus")
+        return [
+            (str(c["nom"]).strip(), c.get("type", "text"), _bool(c.get("obligatoire", True)))
+            for c in valeur
+        ]
+    champs = []
+    for morceau in str(valeur).split(";"):
+        if not morceau.strip():
+            continue
+        parts = [p.strip() for p in morceau.split("|")]
+        nom = parts[0]
+        type_champ = parts[1] if len(parts) > 1 and parts[1] else "text"
+        obligatoire = _bool(parts[2]) if len(parts) > 2 else True
+        champs.append((nom, type_champ, obligatoire))
+    return champs
+
+
+def lire_fichier(contenu, format_fichier):
+    """Retourne la liste des lignes (dicts) du fichier, texte ou bytes."""
+    if isinstance(contenu, bytes):
+        contenu = contenu.decode("utf-8-sig")
+
+    if format_fichier == "json":
+        donnees = json.loads(contenu)
+        if isinstance(donnees, dict):
+            donnees = donnees.get("produits", [])
+        if not isinstance(donnees, list):
+            raise CatalogueError(["JSON : liste de produits attendue"])
+        return donnees
+
+    return list(csv.DictReader(io.StringIO(contenu)))
+
+
+def normaliser(lignes):
+    """Valide les lignes du fichier et retourne {(type, categorie, nom): produit}."""
+    produits = {}
+    erreurs = []
+
+    for numero, ligne in enumerate(lignes, start=1):
+        if not isinstance(ligne, dict):
+            erreurs.append(f"Ligne {numero} : objet attendu")
+            continue
+        type_produit = str(ligne.get("type", "")).strip()
+        categorie = str(ligne.get("categorie", "")).strip()
+        nom = str(ligne.get("nom", "")).strip()
+
+        if type_produit not in TYPES:
+            erreurs.append(f"Ligne {numero} : type inconnu '{type_produit}'")
+            continue
+        if not categorie or not nom:
+            erreurs.append(f"Ligne {numero} : catégorie et nom obligatoires")
+            continue
+
+        try:
+            prix = int(str(ligne.get("prix", "")).strip())
+            if prix < 0:
+                raise ValueError
+        except ValueError:
+            erreurs.append(f"Ligne {numero} : prix invalide '{ligne.get('prix')}'")
+            continue
+
+        try:
+            champs = _parse_champs(ligne.get("champs"))
+        except ValueError as exc:
+            erreurs.append(f"Ligne {numero} : {exc}")
+            continue
+        if champs and type_produit == "service_imei":
+            erreurs.append(f"Ligne {numero} : pas de champs personnalisés pour un service IMEI")
+            continue
+        inconnus = [t for _, t, _ in champs if t not in TYPES_CHAMPS]
+        if inconnus:
+            erreurs.append(f"Ligne {numero} : type de champ inconnu {', '.join(inconnus)}")
+            continue
+
+        cle = (type_produit, categorie, nom)
+        if cle in produits:
+            erreurs.append(f"Ligne {numero} : doublon '{nom}' dans '{categorie}'")
+            continue
+
+        _, _, _, a_image = TYPES[type_produit]
+        produits[cle] = {
+            "prix": prix,
+            "description": str(ligne.get("description") or ""),
+            "image": str(ligne.get("image") or "") if a_image else None,
+            "options": {
+                opt: _bool(ligne[opt])
+                for opt in OPTIONS
+                if ligne.get(opt) not in (None, "")
+            },
+            "champs": champs,
+        }
+
+    if erreurs:
+        raise CatalogueError(erreurs)
+    return produits
+
+
+# =========================
+# SYNCHRONISATION
+# =========================
+# `supprimer` efface les produits absents du fichier : réservé à qui peut les supprimer
+PERMISSIONS_SUPPRESSION = ("serveur.delete_licence", "serveur.delete_serviceimei", "serveur.delete_service")
+
+
+def _valeurs(type_produit, produit, categorie_id):
+    """Attributs du modèle correspondant à une ligne du fichier."""
+    _, champ_description, prefixe, a_image = TYPES[type_produit]
+    valeurs = {
+        "category_id": categorie_id,
+        "prix": produit["prix"],
+        champ_description: produit["description"],
+    }
+    if a_image:
+        image = produit["image"]
+        valeurs["image"] = image if image or type_produit == "licence" else None
+    for opt, actif in produit["options"].items():
+        valeurs[f"{prefixe}_{opt}"] = actif
+    return valeurs
+
+
+def synchroniser(produits, dry_run=False, supprimer=False):
+    """
+    Applique le catalogue `produits` (issu de `normaliser`) à la base.
+
+    Requêtes : catégories, produits et champs sont chargés en une requête par
+    modèle, puis écrits par lots. Tout est annulé en cas d'erreur ou de dry-run.
+    """
+    rapport = RapportSynchro(dry_run=dry_run)
+
+    with transaction.atomic():
+        categories = {}
+        for cat in Category.objects.only("id", "nom").order_by("id"):
+            categories.setdefault(cat.nom, cat.id)
+
+        nouvelles = sorted({cat for _, cat, _ in produits} - set(categories))
+        if nouvelles:
+            Category.objects.bulk_create([Category(nom=nom) for nom in nouvelles])
+            for cat in Category.objects.filter(nom__in=nouvelles).only("id", "nom"):
+                categories.setdefault(cat.nom, cat.id)
+            rapport.categories_creees = nouvelles
+
+        noms_categories = {pk: nom for nom, pk in categories.items()}
+        instances = {}
+
+        for type_produit, (modele, _, _, _) in TYPES.items():
+            existants = {}
+            doublons = []
+            for obj in modele.objects.all():
+                cle = (type_produit, noms_categories.get(obj.category_id), obj.nom)
+                if cle in existants:
+                    doublons.append(obj)
+                else:
+                    existants[cle] = obj
+
+            a_creer, a_modifier, champs_modifies = [], [], set()
+
+            for cle, produit in produits.items():
+                if cle[0] != type_produit:
+                    continue
+                valeurs = _valeurs(type_produit, produit, categories[cle[1]])
+                obj = existants.pop(cle, None)
+
+                if obj is None:
+                    obj = modele(nom=cle[2], **valeurs)
+                    a_creer.append(obj)
+                    rapport.crees[type_produit].append(f"{cle[1]} / {cle[2]}")
+                else:
+                    changes = [k for k, v in valeurs.items() if getattr(obj, k) != v]
+                    if changes:
+                        for k in changes:
+                            setattr(obj, k, valeurs[k])
+                        champs_modifies.update(changes)
+                        a_modifier.append(obj)
+                        rapport.modifies[type_produit].append(f"{cle[1]} / {cle[2]}")
+                instances[cle] = obj
+
+            a_supprimer = list(existants.values()) + doublons if supprimer else []
+            for obj in a_supprimer:
+                rapport.supprimes[type_produit].append(
+                    f"{noms_categories.get(obj.category_id)} / {obj.nom}"
+                )
+
+            if a_creer:
+                modele.objects.bulk_create(a_creer, batch_size=500)
+            if a_modifier:
+                modele.objects.bulk_update(a_modifier, sorted(champs_modifies), batch_size=500)
+            if a_supprimer:
+                modele.objects.filter(pk__in=[o.pk for o in a_supprimer]).delete()
+
+        _synchroniser_champs(produits, instances, rapport)
+
+        if dry_run:
+            transaction.set_rollback(True)
+        else:
+            # bulk_create / bulk_update n'émettent pas de signaux
+            versions.incrementer(versions.CATALOGUE)
+            versions.incrementer(versions.CONFIGURATION)
+
+    return rapport
+
+
+def _synchroniser_champs(produits, instances, rapport):
+    """Champs personnalisés des licences et services (pas des services IMEI)."""
+    cibles = {"licence": "licence_id", "service": "service_id"}
+
+    existants = {}
+    for champ in CustomField.objects.filter(category__isnull=True).exclude(
+        licence__isnull=True, service__isnull=True
+    ):
+        cible = "licence" if champ.licence_id else "service"
+        cle = (cible, champ.licence_id or champ.service_id, champ.nom)
+        existants[cle] = champ
+
+    a_creer, a_modifier = [], []
+    for cle_produit, produit in produits.items():
+        type_produit = cle_produit[0]
+        if type_produit not in cibles:
+            continue
+        obj = instances[cle_produit]
+        for nom, type_champ, obligatoire in produit["champs"]:
+            champ = existants.pop((type_produit, obj.pk, nom), None)
+            if champ is None:
+                a_creer.append(CustomField(
+                    nom=nom,
+                    type=type_champ,
+                    obligatoire=obligatoire,
+                    **{cibles[type_produit]: obj.pk},
+                ))
+            elif (champ.type, champ.obligatoire) != (type_champ, obligatoire):
+                champ.type = type_champ
+                champ.obligatoire = obligatoire
+                a_modifier.append(champ)
+
+    # les champs des produits supprimés partent en cascade
+    ids_produits = {
+        (cle[0], obj.pk) for cle, obj in instances.items() if cle[0] in cibles
+    }
+    a_supprimer = [
+        champ.pk for (cible, pk, _), champ in existants.items()
+        if (cible, pk) in ids_produits
+    ]
+
+    if a_creer:
+        CustomField.objects.bulk_create(a_creer, batch_size=500)
+    if a_modifier:
+        CustomField.objects.bulk_update(a_modifier, ["type", "obligatoire"], batch_size=500)
+    if a_supprimer:
+        CustomField.objects.filter(pk__in=a_supprimer).delete()
+
+    rapport.champs_crees = len(a_creer)
+    rapport.champs_modifies = len(a_modifier)
+    rapport.champs_supprimes = len(a_supprimer)
+
+
+def importer(contenu, format_fichier, dry_run=False, supprimer=False):
+    produits = normaliser(lire_fichier(contenu, format_fichier))
+    return synchroniser(produits, dry_run=dry_run, supprimer=supprimer)
+
+
+# =========================
+# EXPORT
+# =========================
+def exporter_lignes():
+    """Catalogue complet sous forme de lignes (une requête par modèle)."""
+    categories = dict(Category.objects.values_list("id", "nom"))
+
+    champs = {}
+    for champ in CustomField.objects.filter(category__isnull=True).order_by("id"):
+        if champ.licence_id:
+            champs.setdefault(("licence", champ.licence_id), []).append(champ)
+        elif champ.service_id:
+            champs.setdefault(("service", champ.service_id), []).append(champ)
+
+    lignes = []
+    for type_produit, (modele, champ_description, prefixe, a_image) in TYPES.items():
+        for obj in modele.objects.order_by("category_id", "nom"):
+            ligne = {
+                "type": type_produit,
+                "categorie": categories.get(obj.category_id, ""),
+                "nom": obj.nom,
+                "prix": obj.prix,
+                "description": getattr(obj, champ_description),
+                "image": (obj.image or "") if a_image else "",
+            }
+            for opt in OPTIONS:
+                ligne[opt] = getattr(obj, f"{prefixe}_{opt}")
+            ligne["champs"] = [
+                {"nom": c.nom, "type": c.type, "obligatoire": c.obligatoire}
+                for c in champs.get((type_produit, obj.pk), [])
+            ]
+            lignes.append(ligne)
+    return lignes
+
+
+def exporter(format_fichier):
+    lignes = exporter_lignes()
+
+    if format_fichier == "json":
+        return json.dumps({"produits": lignes}, ensure_ascii=False, indent=2)
+
+    sortie = io.StringIO()
+    writer = csv.DictWriter(sortie, fieldnames=COLONNES)
+    writer.writeheader()
+    for ligne in lignes:
+        ligne = dict(ligne)
+        for opt in OPTIONS:
+            ligne[opt] = int(ligne[opt])
+        ligne["champs"] = ";".join(
+            f"{c['nom']}|{c['type']}|{int(c['obligatoire'])}" for c in ligne["champs"]
+        )
+        writer.writerow(ligne)
+    return sortie.getvalue()
@@ -0,0 +1,364 @@
+"""
+Passage de commande : validation, débit du wallet et création, en lot.
+
+Utilisé par la page `commande`, l'API revendeurs et l'import CSV d'IMEI : les
+commandes sont toutes validées d'abord, puis créées dans une seule
+transaction avec un seul débit du wallet (UPDATE conditionnel : jamais de
+solde négatif, même en concurrence).
+"""
+import csv
+import io
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator, validate_email
+from django.db import connection, transaction
+from django.db.models import Q
+
+from . import compteurs, comptes, configuration, imei, journal, metriques, notifications
+from .models import Commande, CommandeFieldValue, Licence, Service, ServiceImei
+
+
+# type de commande -> modèle (mêmes valeurs que l'URL de la page commande)
+PRODUITS = {
+    "licence": Licence,
+    "service": ServiceImei,
+    "service_general": Service,
+}
+
+LIBELLES = {"email": "Email", "username_service": "Nom d'utilisateur", "photo_lien": "Lien de photo"}
+
+
+class CommandeInvalide(Exception):
+    def __init__(self, erreurs):
+        super().__init__("; ".join(erreurs))
+        self.erreurs = erreurs
+
+
+class SoldeInsuffisant(Exception):
+    def __init__(self, total):
+        super().__init__(f"Solde insuffisant ({total} FCFA requis)")
+        self.total = total
+
+
+def exigences(type_produit, produit):
+    """Champs standard requis : {"email": bool, "username": bool, "imei": bool, "photo": bool}."""
+    if type_produit == "licence":
+        return {"email": True, "username": True, "imei": False, "photo": False}
+    if type_produit == "service":
+        return {"email": True, "username": True, "imei": True, "photo": False}
+    return {
+        "email": produit.demande_email,
+        "username": produit.demande_username,
+        "imei": produit.demande_imei,
+        "photo": produit.demande_photo,
+    }
+
+
+@dataclass
+class Ligne:
+    """Une commande validée, prête à être créée."""
+    commande: Commande
+    valeurs: list = field(default_factory=list)  # [(CustomField, valeur)]
+
+
+def preparer(user, type_produit, produit, donnees):
+    """
+    Valide `donnees` (email, username_service, imei, photo_lien,
+    champs={id: valeur}) pour `produit` ; retourne une Ligne ou lève
+    CommandeInvalide avec toutes les erreurs.
+    """
+    requis = exigences(type_produit, produit)
+    email = (donnees.get("email") or "").strip()
+    username_service = (donnees.get("username_service") or "").strip()
+    numero_imei = imei.normaliser((donnees.get("imei") or "").strip())
+    photo_lien = (donnees.get("photo_lien") or "").strip()
+
+    erreurs = []
+    if requis["email"] and not email:
+        erreurs.append("Email obligatoire.")
+    if requis["username"] and not username_service:
+        erreurs.append("Nom d'utilisateur obligatoire.")
+    if requis["imei"] and not numero_imei:
+        erreurs.append("IMEI obligatoire.")
+    if requis["photo"] and not photo_lien:
+        erreurs.append("Photo obligatoire.")
+
+    # longueurs des colonnes : sinon DataError (PostgreSQL) au lieu d'une erreur par champ
+    for nom, valeur in (("email", email), ("username_service", username_service), ("photo_lien", photo_lien)):
+        longueur = Commande._meta.get_field(nom).max_length
+        if len(valeur) > longueur:
+            erreurs.append(f"{LIBELLES[nom]} : {longueur} caractères maximum.")
+
+    if email:
+        try:
+            validate_email(email)
+        except ValidationError:
+            erreurs.append("Email invalide.")
+    if numero_imei:
+        probleme = imei.erreur(numero_imei)
+        if probleme:
+            erreurs.append(probleme)
+    if photo_lien:
+        try:
+            URLValidator()(photo_lien)
+        except ValidationError:
+            erreurs.append("Lien de photo invalide.")
+
+    champs = donnees.get("champs") or {}
+    valeurs = []
+    for champ in configuration.champs_personnalises(produit):
+        valeur = str(champs.get(champ.id, champs.get(str(champ.id), "")) or "").strip()
+        if valeur and champ.type == "imei":
+            valeur = imei.normaliser(valeur)
+            probleme = imei.erreur(valeur)
+            if probleme:
+                erreurs.append(f"{champ.nom} : {probleme}")
+        if valeur:
+            valeurs.append((champ, valeur))
+        elif champ.obligatoire:
+            erreurs.append(f"{champ.nom} obligatoire.")
+
+    if erreurs:
+        raise CommandeInvalide(erreurs)
+
+    # marque / modèle depuis l'index TAC local : aucun appel réseau
+    marque, modele = imei.appareil(numero_imei) or ("", "")
+
+    return Ligne(
+        commande=Commande(
+            user=user,
+            type_commande=type_produit,
+            nom_produit=produit.nom,
+            prix=produit.prix,
+            email=email,
+            username_service=username_service,
+            imei=numero_imei,
+            imei_normalise=numero_imei,
+            appareil_marque=marque,
+            appareil_modele=modele,
+            photo_lien=photo_lien,
+            statut="attente",
+        ),
+        valeurs=valeurs,
+    )
+
+
+def creer(user, lignes):
+    """
+    Débite le total une seule fois puis crée commandes et valeurs de champs
+    par lots. Lève SoldeInsuffisant (rien n'est écrit) si le solde ne suffit pas.
+    """
+    if not lignes:
+        return []
+
+    total = sum(ligne.commande.prix for ligne in lignes)
+
+    with transaction.atomic():
+        if not comptes.debiter(user.id, total, motif="commande"):
+            raise SoldeInsuffisant(total)
+
+        commandes = Commande.objects.bulk_create([ligne.commande for ligne in lignes])
+        journal.consigner_commandes("commande.creee", commandes)
+        CommandeFieldValue.objects.bulk_create([
+            CommandeFieldValue(commande=commande, field=champ, value=valeur)
+            for commande, ligne in zip(commandes, lignes)
+            for champ, valeur in ligne.valeurs
+        ])
+        compteurs.incrementer(user.id, commandes_attente=len(commandes))
+
+        notifications.notifier_plusieurs("commande", user, [
+            _notification(user, commande, ligne.valeurs) for commande, ligne in zip(commandes, lignes)
+        ])
+
+    for commande in commandes:
+        metriques.COMMANDES.inc(type=commande.type_commande)
+    return commandes
+
+
+def _notification(user, commande, valeurs):
+    champs = "".join(f"{champ.nom} : {valeur}\n" for champ, valeur in valeurs)
+    return {
+        "libelle": commande.nom_produit,
+        "montant": commande.prix,
+        "sujet": "🛒 Nouvelle commande - SK Serveur",
+        "details": (
+            f"Utilisateur : {user.username}\n"
+            f"Email compte : {user.email}\n\n"
+            f"Produit : {commande.nom_produit}\n"
+            f"Type : {commande.type_commande}\n"
+            f"Prix : {commande.prix} FCFA\n\n"
+            f"--- INFOS COMMANDE ---\n"
+            f"Email service : {commande.email}\n"
+            f"Username : {commande.username_service}\n"
+            f"IMEI : {commande.imei}\n"
+            f"Appareil : {commande.appareil_marque} {commande.appareil_modele}\n"
+            f"Photo : {commande.photo_lien}\n\n"
+            f"--- CHAMPS PERSONNALISÉS ---\n"
+            f"{champs}"
+        ),
+    }
+
+
+# =========================
+# LOT D'IMEI (IMPORT CSV)
+# =========================
+LOT_LIGNES_MAX = 1000
+
+COLONNES = {
+    "imei": "imei",
+    "email": "email",
+    "username_service": "username_service",
+    "username": "username_service",
+    "photo_lien": "photo_lien",
+    "photo": "photo_lien",
+}
+
+
+def accepte_lot(type_produit, produit):
+    return exigences(type_produit, produit)["imei"]
+
+
+def _colonnes(entete, champs):
+    """Index de colonne -> clé ("imei", ..., ou id de champ personnalisé)."""
+    par_nom = {champ.nom.strip().lower(): champ.id for champ in champs}
+    par_nom.update({f"custom_{champ.id}": champ.id for champ in champs})
+
+    correspondances = {}
+    for index, nom in enumerate(entete):
+        nom = nom.strip().lower()
+        if nom in COLONNES:
+            correspondances[index] = COLONNES[nom]
+        elif nom in par_nom:
+            correspondances[index] = par_nom[nom]
+    return correspondances
+
+
+def lire_lot(fichier, user, type_produit, produit, defauts=None):
+    """
+    Lit le CSV ligne par ligne (fichier binaire) et valide chaque ligne :
+    IMEI (Luhn, doublons), champs requis, champs personnalisés.
+
+    Retourne (valides [(index dans le rapport, Ligne)],
+    rapport [{ligne, imei, erreurs, commande}]).
+    Lève CommandeInvalide si le fichier lui-même est inexploitable.
+    """
+    champs = configuration.champs_personnalises(produit)
+    defauts = {k: v for k, v in (defauts or {}).items() if v}
+
+    texte = io.TextIOWrapper(fichier, encoding="utf-8-sig", newline="")
+    try:
+        premiere = texte.readline()
+        separateur = ";" if premiere.count(";") > premiere.count(",") else ","
+        entete = next(csv.reader([premiere], delimiter=separateur), [])
+        colonnes = _colonnes(entete, champs)
+        if "imei" not in colonnes.values():
+            raise CommandeInvalide(["Colonne « imei » absente de l'en-tête."])
+
+        valides, rapport, vus = [], [], {}
+        for numero, valeurs in enumerate(csv.reader(texte, delimiter=separateur), start=2):
+            if not any(v.strip() for v in valeurs):
+                continue
+            if len(rapport) >= LOT_LIGNES_MAX:
+                raise CommandeInvalide([f"{LOT_LIGNES_MAX} lignes maximum par fichier."])
+
+            donnees = dict(defauts, champs={})
+            for index, cle in colonnes.items():
+                valeur = valeurs[index].strip() if index < len(valeurs) else ""
+                if isinstance(cle, int):
+                    donnees["champs"][cle] = valeur
+                elif valeur:
+                    donnees[cle] = valeur
+
+            numero_imei = imei.normaliser(donnees.get("imei", ""))
+            donnees["imei"] = numero_imei
+            erreurs = []
+
+            probleme = imei.erreur(numero_imei)
+            if probleme:
+                erreurs.append(probleme)
+            elif numero_imei in vus:
+                erreurs.append(f"IMEI en double (ligne {vus[numero_imei]}).")
+            else:
+                vus[numero_imei] = numero
+
+            try:
+                ligne = preparer(user, type_produit, produit, donnees)
+            except CommandeInvalide as exc:
+                erreurs += [e for e in exc.erreurs if not e.startswith("IMEI")]
+                ligne = None
+
+            rapport.append({
+                "ligne": numero,
+                "imei": numero_imei,
+                "appareil": " ".join(filter(None, imei.appareil(numero_imei) or ())),
+                "erreurs": erreurs,
+                "commande": None,
+            })
+            if not erreurs:
+                valides.append((len(rapport) - 1, ligne))
+    except UnicodeDecodeError:
+        raise CommandeInvalide(["Fichier illisible : enregistrez-le en CSV UTF-8."])
+    except csv.Error as exc:
+        raise CommandeInvalide([f"CSV invalide : {exc}"])
+    finally:
+        texte.detach()
+
+    return valides, rapport
+
+
+# =========================
+# RECHERCHE (SUPPORT)
+# =========================
+# Uniquement des filtres couverts par un index (voir la migration
+# 0023_commande_recherche) : égalité / préfixe partout, « contient » seulement
+# si pg_trgm est installé. Jamais de icontains sur toute la table.
+RECHERCHE_LONGUEUR_MIN = 3
+RECHERCHE_LIMITE = 50
+
+_trigrammes = None
+
+
+def trigrammes_disponibles():
+    """PostgreSQL avec l'extension pg_trgm (vérifié une fois par processus)."""
+    global _trigrammes
+    if _trigrammes is None:
+        if connection.vendor != "postgresql":
+            _trigrammes = False
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                _trigrammes = cursor.fetchone() is not None
+    return _trigrammes
+
+
+def filtre_recherche(terme):
+    """
+    Q pour un IMEI (complet ou début), un email ou un nom d'utilisateur ;
+    None si le terme est trop court pour une recherche indexée.
+    """
+    terme = (terme or "").strip()
+    chiffres = imei.normaliser(terme)
+    if chiffres.isascii() and chiffres.isdigit() and len(chiffres) >= 4:
+        if len(chiffres) == imei.LONGUEUR:
+            return Q(imei_normalise=chiffres)
+        if trigrammes_disponibles():
+            return Q(imei_normalise__contains=chiffres)
+        # LIKE 'x%' : index varchar_pattern_ops créé par db_index sous PostgreSQL
+        return Q(imei_normalise__startswith=chiffres)
+
+    if len(terme) < RECHERCHE_LONGUEUR_MIN:
+        return None
+    if trigrammes_disponibles():
+        return Q(email__icontains=terme) | Q(username_service__icontains=terme)
+    if "@" in terme:
+        return Q(email__istartswith=terme)
+    return Q(email__istartswith=terme) | Q(username_service__istartswith=terme)
+
+
+def rechercher(terme, limite=RECHERCHE_LIMITE):
+    """Commandes correspondantes, les plus récentes d'abord ([] si terme trop court)."""
+    filtre = filtre_recherche(terme)
+    if filtre is None:
+        return []
+    return list(Commande.objects.filter(filtre).select_related("user").order_by("-id")[:limite])
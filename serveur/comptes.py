@@ -0,0 +1,77 @@
+"""
+Compte de l'utilisateur connecté : user + wallet + résumé.
+
+`request.account` (CompteMiddleware) s'appuie sur request.user, chargé par
+CompteBackend avec ses relations wallet / resume : une seule requête jointe,
+au plus une fois par requête HTTP, et aucune écriture en lecture.
+"""
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import journal
+from .models import ResumeCompte, Wallet
+
+
+class CompteBackend(ModelBackend):
+    """ModelBackend dont get_user() joint le wallet et le résumé."""
+
+    def get_user(self, user_id):
+        try:
+            user = User._default_manager.select_related("wallet", "resume").get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+class Compte:
+    def __init__(self, user):
+        self.user = user
+
+    @property
+    def wallet(self):
+        # ligne absente (ancien compte non migré) : solde 0, sans écrire
+        wallet = getattr(self.user, "wallet", None)
+        return wallet if wallet is not None else Wallet(user=self.user, solde=0)
+
+    @property
+    def resume(self):
+        resume = getattr(self.user, "resume", None)
+        return resume if resume is not None else ResumeCompte(user=self.user)
+
+
+# =========================
+# ÉCRITURES
+# =========================
+def provisionner(user):
+    """Crée le wallet et le résumé d'un nouvel utilisateur."""
+    Wallet.objects.get_or_create(user=user)
+    ResumeCompte.objects.get_or_create(user=user)
+
+
+def crediter(user_id, montant, motif=""):
+    """Ajoute `montant` au solde en un UPDATE atomique (crée le wallet si absent)."""
+    with transaction.atomic():
+        if not Wallet.objects.filter(user_id=user_id).update(solde=F("solde") + montant, date_maj=timezone.now()):
+            try:
+                with transaction.atomic():
+                    Wallet.objects.create(user_id=user_id, solde=montant)
+            except IntegrityError:
+                Wallet.objects.filter(user_id=user_id).update(solde=F("solde") + montant, date_maj=timezone.now())
+        journal.consigner("wallet.credit", user_id, montant=montant, motif=motif)
+
+
+def debiter(user_id, montant, motif=""):
+    """
+    Retire `montant` si le solde suffit, en un UPDATE conditionnel.
+    Retourne False (rien n'est débité) sinon.
+    """
+    with transaction.atomic():
+        if not Wallet.objects.filter(user_id=user_id, solde__gte=montant).update(
+            solde=F("solde") - montant, date_maj=timezone.now()
+        ):
+            return False
+        journal.consigner("wallet.debit", user_id, montant=montant, motif=motif)
+    return True
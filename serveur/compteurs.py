@@ -0,0 +1,147 @@
+"""
+Compteurs du tableau de bord (ResumeCompte), mis à jour par incréments.
+
+Chaque mise à jour est un UPDATE atomique avec F() : pas de lecture préalable,
+pas de perte d'incrément entre deux requêtes concurrentes.
+"""
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Greatest
+
+from .models import Commande, ResumeCompte, Transaction
+
+
+CHAMPS = (
+    "commandes_attente",
+    "commandes_succes",
+    "commandes_echec",
+    "total_depense",
+    "depots_attente",
+    "total_depose",
+)
+
+
+def incrementer(user_id, **deltas):
+    """incrementer(user.id, commandes_attente=1, total_depense=-500)"""
+    valeurs = {
+        champ: Greatest(F(champ) + delta, Value(0)) if delta < 0 else F(champ) + delta
+        for champ, delta in deltas.items()
+        if delta
+    }
+    if not valeurs:
+        return
+
+    if ResumeCompte.objects.filter(user_id=user_id).update(**valeurs):
+        return
+
+    # première opération de l'utilisateur : on crée la ligne puis on réessaie
+    try:
+        with transaction.atomic():
+            ResumeCompte.objects.create(user_id=user_id)
+    except IntegrityError:
+        pass
+    ResumeCompte.objects.filter(user_id=user_id).update(**valeurs)
+
+
+# =========================
+# ÉVÉNEMENTS
+# =========================
+def commande_creee(commande):
+    incrementer(commande.user_id, commandes_attente=1)
+
+
+def commande_validee(commande):
+    incrementer(
+        commande.user_id,
+        commandes_attente=-1,
+        commandes_succes=1,
+        total_depense=commande.prix,
+    )
+
+
+def commande_refusee(commande):
+    incrementer(commande.user_id, commandes_attente=-1, commandes_echec=1)
+
+
+def depot_demande(depot):
+    incrementer(depot.user_id, depots_attente=1)
+
+
+def depot_valide(depot):
+    incrementer(depot.user_id, depots_attente=-1, total_depose=depot.montant)
+
+
+def depot_refuse(depot):
+    incrementer(depot.user_id, depots_attente=-1)
+
+
+# =========================
+# RECALCUL COMPLET
+# =========================
+def agreger(user_ids=None):
+    """
+    Compteurs attendus par utilisateur, calculés avec deux agrégats groupés
+    (commandes, dépôts) : {user_id: {champ: valeur, ..., "engage": montant des
+    commandes en attente}}. Utilisateurs sans aucune ligne : absents.
+    """
+    commandes = Commande.objects.all()
+    depots = Transaction.objects.all()
+    if user_ids is not None:
+        commandes = commandes.filter(user_id__in=user_ids)
+        depots = depots.filter(user_id__in=user_ids)
+
+    valeurs = {}
+    for ligne in commandes.values("user_id").annotate(
+        attente=Count("pk", filter=Q(statut="attente")),
+        succes=Count("pk", filter=Q(statut="succes")),
+        echec=Count("pk", filter=Q(statut__in=["refuse", "expire"])),
+        depense=Sum("prix", filter=Q(statut="succes")),
+        engage=Sum("prix", filter=Q(statut="attente")),
+    ).order_by():
+        valeurs[ligne["user_id"]] = {
+            "commandes_attente": ligne["attente"],
+            "commandes_succes": ligne["succes"],
+            "commandes_echec": ligne["echec"],
+            "total_depense": ligne["depense"] or 0,
+            "engage": ligne["engage"] or 0,
+        }
+
+    for ligne in depots.values("user_id").annotate(
+        attente=Count("pk", filter=Q(statut="attente")),
+        depose=Sum("montant", filter=Q(statut="valide")),
+    ).order_by():
+        valeurs.setdefault(ligne["user_id"], {}).update({
+            "depots_attente": ligne["attente"],
+            "total_depose": ligne["depose"] or 0,
+        })
+
+    return valeurs
+
+
+def recalculer(user_ids=None, batch_size=1000):
+    """
+    Recalcule les résumés (voir agreger) puis les écrit en upsert par lots.
+    Retourne le nombre de résumés écrits.
+    """
+    users = User.objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+
+    attendus = agreger(user_ids)
+    resumes = []
+    for pk in users.values_list("pk", flat=True).iterator():
+        resume = ResumeCompte(user_id=pk)
+        for champ, valeur in attendus.get(pk, {}).items():
+            if champ in CHAMPS:
+                setattr(resume, champ, valeur)
+        resumes.append(resume)
+
+    ResumeCompte.objects.bulk_create(
+        resumes,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=["user"],
+        update_fields=list(CHAMPS),
+    )
+    return len(resumes)
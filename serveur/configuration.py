@@ -0,0 +1,78 @@
+"""
+Registre de configuration : moyens de paiement et champs personnalisés.
+
+Ces tables changent quelques fois par mois ; chaque worker les garde en
+mémoire et ne les recharge que lorsque le tampon de version "configuration"
+a changé (signaux sur PaymentConfig / CustomField, import du catalogue).
+En régime établi, une vue ne fait donc aucune requête : le tampon lui-même
+n'est relu dans le cache partagé que toutes les versions.LOCAL_SECONDES.
+"""
+import threading
+from collections import defaultdict
+
+from . import routage, versions
+from .models import CustomField, Licence, PaymentConfig, Service
+
+
+_verrou = threading.Lock()
+_registre = None  # (version, Registre)
+
+
+class Registre:
+    def __init__(self):
+        configs = list(PaymentConfig.objects.order_by("id"))
+        self.paiements_actifs = [c for c in configs if c.actif]
+        self.paiements = {c.methode: c for c in self.paiements_actifs}
+
+        self.champs_categorie = defaultdict(list)
+        self.champs_licence = defaultdict(list)
+        self.champs_service = defaultdict(list)
+        for champ in CustomField.objects.order_by("id"):
+            if champ.licence_id:
+                self.champs_licence[champ.licence_id].append(champ)
+            if champ.service_id:
+                self.champs_service[champ.service_id].append(champ)
+            if champ.category_id:
+                self.champs_categorie[champ.category_id].append(champ)
+
+    def champs(self, produit):
+        """Champs du produit puis ceux de sa catégorie, sans doublon."""
+        if isinstance(produit, Licence):
+            champs = list(self.champs_licence.get(produit.pk, ()))
+        elif isinstance(produit, Service):
+            champs = list(self.champs_service.get(produit.pk, ()))
+        else:
+            champs = []
+
+        for champ in self.champs_categorie.get(produit.category_id, ()):
+            if champ not in champs:
+                champs.append(champ)
+        return champs
+
+
+def registre():
+    global _registre
+
+    version = versions.version(versions.CONFIGURATION)
+    courant = _registre
+    if courant is not None and courant[0] == version:
+        return courant[1]
+
+    with _verrou:
+        if _registre is None or _registre[0] != version:
+            with routage.primaire():
+                _registre = (version, Registre())
+        return _registre[1]
+
+
+def paiements_actifs():
+    return registre().paiements_actifs
+
+
+def paiement(methode):
+    """PaymentConfig active pour `methode`, ou None."""
+    return registre().paiements.get(methode)
+
+
+def champs_personnalises(produit):
+    return registre().champs(produit)
@@ -0,0 +1,23 @@
+import time
+
+from django.core.mail.backends.smtp import EmailBackend
+
+from . import metriques
+
+
+class EmailBackendMesure(EmailBackend):
+    """Backend SMTP qui mesure la durée des envois et compte les échecs."""
+
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+
+        debut = time.perf_counter()
+        envoyes = 0
+        try:
+            envoyes = super().send_messages(email_messages) or 0
+        finally:
+            metriques.EMAILS_DUREE.observer(time.perf_counter() - debut)
+            metriques.EMAILS.inc(envoyes, resultat="envoye")
+            metriques.EMAILS.inc(len(email_messages) - envoyes, resultat="echec")
+        return envoyes
@@ -0,0 +1,140 @@
+"""
+Événements temps réel par utilisateur (server-sent events).
+
+Les actions admin publient, après commit, le nouveau statut d'une commande ou
+d'un dépôt et l'état du compte (solde + compteurs). Chaque événement reçoit un
+numéro de séquence par utilisateur et est rangé dans le cache ; les flux SSE
+ouverts dans le même processus sont réveillés immédiatement, ceux des autres
+workers relisent le cache toutes les POLL_SECONDES (cache par défaut partagé :
+table en base, ou Redis avec REDIS_URL).
+
+Le flux demande un serveur ASGI (uvicorn sk_serveur.asgi:application) ; sous
+WSGI l'endpoint répond 204 et les pages gardent leur comportement habituel.
+"""
+import asyncio
+import json
+import threading
+
+from django.core.cache import cache
+from django.db import transaction
+
+from . import verrous
+from .models import ResumeCompte, Wallet
+
+
+TTL = 600
+POLL_SECONDES = 3
+PING_SECONDES = 15
+# le navigateur se reconnecte (Last-Event-ID) : pas de connexion éternelle
+DUREE_MAX_SECONDES = 300
+LOT_MAX = 50
+
+_verrou = threading.Lock()
+_abonnes = {}  # user_id -> {(boucle, asyncio.Event)}
+
+
+def _cle_sequence(user_id):
+    return f"sse:{user_id}:seq"
+
+
+def _cle_evenement(user_id, numero):
+    return f"sse:{user_id}:{numero}"
+
+
+# =========================
+# PUBLICATION
+# =========================
+def _diffuser(user_id, type, donnees):
+    # incr n'est pas atomique sur la table de cache : numéro attribué sous verrou,
+    # et l'événement écrit avant le numéro pour qu'un flux ne lise jamais un trou.
+    # Verrou non obtenu à temps : on publie quand même, au pire un événement
+    # en remplace un autre et le compte se resynchronise au suivant.
+    with verrous.verrou(_cle_sequence(user_id)):
+        numero = cache.get(_cle_sequence(user_id), 0) + 1
+        cache.set(_cle_evenement(user_id, numero), {"type": type, **donnees}, TTL)
+        cache.set(_cle_sequence(user_id), numero, None)
+
+    with _verrou:
+        abonnes = list(_abonnes.get(user_id, ()))
+    for boucle, signal in abonnes:
+        boucle.call_soon_threadsafe(signal.set)
+
+
+def publier(user_id, type, **donnees):
+    """Publie l'événement une fois la transaction courante validée."""
+    transaction.on_commit(lambda: _diffuser(user_id, type, donnees))
+
+
+def publier_compte(user_id):
+    """Solde et compteurs du tableau de bord, relus après le commit."""
+    def diffuser():
+        donnees = dict(
+            ResumeCompte.objects.filter(user_id=user_id).values(
+                "commandes_attente", "commandes_succes", "commandes_echec", "total_depense"
+            ).first() or {}
+        )
+        donnees["solde"] = (
+            Wallet.objects.filter(user_id=user_id).values_list("solde", flat=True).first() or 0
+        )
+        _diffuser(user_id, "compte", donnees)
+
+    transaction.on_commit(diffuser)
+
+
+# =========================
+# LECTURE / FLUX
+# =========================
+def sequence(user_id):
+    return cache.get(_cle_sequence(user_id), 0)
+
+
+async def _nouveaux(user_id, depuis):
+    courant = await cache.aget(_cle_sequence(user_id), 0)
+    if courant <= depuis:
+        return courant, []
+
+    debut = max(depuis + 1, courant - LOT_MAX + 1)
+    cles = [_cle_evenement(user_id, n) for n in range(debut, courant + 1)]
+    trouves = await cache.aget_many(cles)
+    return courant, [
+        (n, trouves[cle]) for n, cle in zip(range(debut, courant + 1), cles) if cle in trouves
+    ]
+
+
+def _format(numero, evenement):
+    return f"id: {numero}\nevent: {evenement['type']}\ndata: {json.dumps(evenement)}\n\n"
+
+
+async def flux(user_id, depuis):
+    boucle = asyncio.get_running_loop()
+    signal = asyncio.Event()
+    with _verrou:
+        _abonnes.setdefault(user_id, set()).add((boucle, signal))
+
+    try:
+        yield f"retry: {POLL_SECONDES * 1000}\n\n"
+
+        fin = boucle.time() + DUREE_MAX_SECONDES
+        dernier_envoi = boucle.time()
+        while boucle.time() < fin:
+            try:
+                await asyncio.wait_for(signal.wait(), POLL_SECONDES)
+            except asyncio.TimeoutError:
+                pass
+            signal.clear()
+
+            depuis, evenements = await _nouveaux(user_id, depuis)
+            for numero, evenement in evenements:
+                yield _format(numero, evenement)
+                dernier_envoi = boucle.time()
+
+            if boucle.time() - dernier_envoi >= PING_SECONDES:
+                yield ": ping\n\n"
+                dernier_envoi = boucle.time()
+    finally:
+        with _verrou:
+            abonnes = _abonnes.get(user_id)
+            if abonnes is not None:
+                abonnes.discard((boucle, signal))
+                if not abonnes:
+                    del _abonnes[user_id]
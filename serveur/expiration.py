@@ -0,0 +1,163 @@
+"""
+Expiration des commandes et dépôts restés en attente trop longtemps.
+
+Transition attente -> expire (voir transitions.py), traitée par lots : chaque
+lot est réservé avec SELECT ... FOR UPDATE SKIP LOCKED (les lignes qu'un admin
+est en train de traiter sont sautées), basculé en un seul UPDATE, puis
+historique, compteurs et remboursements sont écrits en masse, un crédit par
+utilisateur. Chaque utilisateur concerné reçoit un seul e-mail récapitulatif
+en fin de passage.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import compteurs, comptes, evenements, journal
+from .models import Commande, Historique, Transaction
+
+
+TAILLE_LOT = 500
+DETAILS_MAX = 20
+
+
+def limite(jours):
+    return timezone.now() - timedelta(days=jours)
+
+
+def _reserver(modele, avant, taille):
+    return list(
+        modele.objects.select_for_update(skip_locked=True, of=("self",))
+        .filter(statut="attente", date__lt=avant)
+        .select_related("user")
+        .order_by("id")[:taille]
+    )
+
+
+# =========================
+# COMMANDES
+# =========================
+def expirer_commandes(avant, taille=TAILLE_LOT, bilan=None):
+    """Expire et rembourse les commandes en attente créées avant `avant`."""
+    bilan = bilan if bilan is not None else nouveau_bilan()
+    total = 0
+
+    while True:
+        with transaction.atomic():
+            commandes = _reserver(Commande, avant, taille)
+            if not commandes:
+                break
+
+            Commande.objects.filter(pk__in=[c.pk for c in commandes]).update(
+                statut="expire", version=F("version") + 1, date_maj=timezone.now()
+            )
+
+            journal.consigner_commandes("commande.expiree", commandes)
+
+            par_user = defaultdict(list)
+            for c in commandes:
+                c.statut = "expire"
+                par_user[c.user_id].append(c)
+
+            for user_id, liste in par_user.items():
+                montant = sum(c.prix for c in liste)
+                compteurs.incrementer(user_id, commandes_attente=-len(liste), commandes_echec=len(liste))
+                comptes.crediter(user_id, montant, motif="expiration")
+                evenements.publier_compte(user_id)
+
+                bilan[user_id]["user"] = liste[0].user
+                bilan[user_id]["commandes"] += [(c.nom_produit, c.prix) for c in liste]
+
+            Historique.objects.bulk_create([
+                Historique(user_id=c.user_id, nom_service=c.nom_produit, prix=c.prix, statut="expire")
+                for c in commandes
+            ])
+            for c in commandes:
+                evenements.publier(c.user_id, "commande", id=c.id, statut=c.statut, nom=c.nom_produit)
+
+        total += len(commandes)
+    return total, bilan
+
+
+# =========================
+# DÉPÔTS
+# =========================
+def expirer_depots(avant, taille=TAILLE_LOT, bilan=None):
+    """Clôt les dépôts en attente déclarés avant `avant` (rien n'a été crédité)."""
+    bilan = bilan if bilan is not None else nouveau_bilan()
+    total = 0
+
+    while True:
+        with transaction.atomic():
+            depots = _reserver(Transaction, avant, taille)
+            if not depots:
+                break
+
+            Transaction.objects.filter(pk__in=[t.pk for t in depots]).update(
+                statut="expire", version=F("version") + 1, date_maj=timezone.now()
+            )
+
+            journal.consigner_depots("depot.expire", depots)
+
+            par_user = defaultdict(list)
+            for t in depots:
+                t.statut = "expire"
+                par_user[t.user_id].append(t)
+
+            for user_id, liste in par_user.items():
+                compteurs.incrementer(user_id, depots_attente=-len(liste))
+                bilan[user_id]["user"] = liste[0].user
+                bilan[user_id]["depots"] += [(t.reference, t.montant) for t in liste]
+
+            for t in depots:
+                evenements.publier(t.user_id, "depot", id=t.id, statut=t.statut, libelle=t.get_statut_display())
+
+        total += len(depots)
+    return total, bilan
+
+
+# =========================
+# E-MAILS
+# =========================
+def nouveau_bilan():
+    """user_id -> {"user", "commandes": [(nom, prix)], "depots": [(référence, montant)]}"""
+    return defaultdict(lambda: {"user": None, "commandes": [], "depots": []})
+
+
+def _details(lignes):
+    if len(lignes) > DETAILS_MAX:
+        return lignes[:DETAILS_MAX] + [f"  … et {len(lignes) - DETAILS_MAX} autre(s)"]
+    return lignes
+
+
+def _message(bilan):
+    user = bilan["user"]
+    lignes = [f"Bonjour {user.username},", ""]
+    if bilan["commandes"]:
+        rembourse = sum(prix for _, prix in bilan["commandes"])
+        lignes.append("Ces commandes n'ont pas pu être traitées à temps et ont expiré :")
+        lignes += _details([f"  • {nom} — {prix} FCFA" for nom, prix in bilan["commandes"]])
+        lignes += [f"{rembourse} FCFA ont été remboursés dans votre solde.", ""]
+    if bilan["depots"]:
+        lignes.append("Ces demandes de dépôt n'ont pas été confirmées et ont expiré :")
+        lignes += _details([f"  • Réf. {reference} — {montant} FCFA" for reference, montant in bilan["depots"]])
+        lignes += ["Si vous avez bien payé, contactez-nous avec la référence.", ""]
+    lignes.append("— SK Serveur")
+    return (
+        "⌛ Demandes expirées - SK Serveur",
+        "\n".join(lignes),
+        settings.DEFAULT_FROM_EMAIL,
+        [user.email],
+    )
+
+
+def prevenir(bilan):
+    """Un e-mail par utilisateur concerné, sur une seule connexion SMTP."""
+    messages = [_message(b) for b in bilan.values() if b["user"] is not None and b["user"].email]
+    if messages:
+        send_mass_mail(messages, fail_silently=True)
+    return len(messages)
@@ -0,0 +1,211 @@
+"""
+Proxy d'images produits : miniatures redimensionnées, mises en cache disque.
+
+Chaque image distante (Licence.image, Service.image) est téléchargée une seule
+fois ; toutes les variantes (largeurs × WebP/JPEG) sont générées d'un coup et
+stockées sous un nom dérivé du hash de l'URL. Le cache est borné en taille et
+évincé par ancienneté d'accès (LRU sur la date de modification des fichiers).
+
+Un échec (origine morte, lente, contenu invalide) laisse un marqueur `.echec` :
+pendant IMAGES_ECHEC_SECONDES, tous les workers renvoient directement vers
+l'image d'origine au lieu de retenter le téléchargement.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow absent : on renvoie vers l'image d'origine
+    Image = None
+
+
+logger = logging.getLogger(__name__)
+
+SEL = "serveur.images"
+
+LARGEURS = (240, 480)
+
+FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpg": ("JPEG", "image/jpeg"),
+}
+
+TAILLE_MAX_SOURCE = 15 * 1024 * 1024
+
+_verrous = {}
+_verrou_global = threading.Lock()
+
+
+class ImageIndisponible(Exception):
+    pass
+
+
+def _dossier():
+    dossier = Path(getattr(settings, "IMAGES_CACHE_DIR", Path(settings.BASE_DIR) / "cache_images"))
+    dossier.mkdir(parents=True, exist_ok=True)
+    return dossier
+
+
+def cle(url):
+    return hashlib.sha256(url.encode()).hexdigest()[:40]
+
+
+def chemin_variante(url, largeur, extension):
+    return _dossier() / f"{cle(url)}_{largeur}.{extension}"
+
+
+def _chemin_echec(url):
+    return _dossier() / f"{cle(url)}.echec"
+
+
+def _echec_recent(url):
+    try:
+        date = _chemin_echec(url).stat().st_mtime
+    except FileNotFoundError:
+        return False
+    return time.time() - date < getattr(settings, "IMAGES_ECHEC_SECONDES", 300)
+
+
+# =========================
+# URL SIGNÉE (PAS DE PROXY OUVERT)
+# =========================
+def url_miniature(url, largeur=LARGEURS[0]):
+    if not url:
+        return ""
+    # signature sans horodatage : même URL à chaque rendu (cache navigateur)
+    jeton = signing.Signer(salt=SEL).sign_object(url, compress=True)
+    return reverse("image_miniature", args=[jeton, largeur])
+
+
+def url_source(jeton):
+    """URL d'origine contenue dans le jeton, ou BadSignature."""
+    url = signing.Signer(salt=SEL).unsign_object(jeton)
+    if not url.startswith(("http://", "https://")):
+        raise signing.BadSignature("schéma non autorisé")
+    return url
+
+
+# =========================
+# TÉLÉCHARGEMENT + VARIANTES
+# =========================
+def _telecharger(url):
+    requete = urllib.request.Request(url, headers={"User-Agent": "SK-Serveur/1.0"})
+    timeout = getattr(settings, "IMAGES_TIMEOUT", 10)
+
+    with urllib.request.urlopen(requete, timeout=timeout) as reponse:
+        type_contenu = reponse.headers.get("Content-Type", "")
+        if not type_contenu.startswith("image/"):
+            raise ImageIndisponible(f"type de contenu inattendu : {type_contenu}")
+
+        donnees = reponse.read(TAILLE_MAX_SOURCE + 1)
+        if len(donnees) > TAILLE_MAX_SOURCE:
+            raise ImageIndisponible("image trop volumineuse")
+        return donnees
+
+
+def _generer(url, donnees):
+    try:
+        source = Image.open(io.BytesIO(donnees))
+        source = ImageOps.exif_transpose(source)
+    except Exception as exc:
+        raise ImageIndisponible(f"image illisible : {exc}")
+
+    if source.mode not in ("RGB", "RGBA"):
+        source = source.convert("RGBA" if "transparency" in source.info else "RGB")
+
+    for largeur in LARGEURS:
+        image = source.copy()
+        if image.width > largeur:
+            hauteur = max(1, round(image.height * largeur / image.width))
+            image = image.resize((largeur, hauteur), Image.LANCZOS)
+
+        for extension, (format_pil, _) in FORMATS.items():
+            sortie = image
+            if format_pil == "JPEG" and sortie.mode == "RGBA":
+                fond = Image.new("RGB", sortie.size, (15, 23, 42))
+                fond.paste(sortie, mask=sortie.split()[3])
+                sortie = fond
+
+            tampon = io.BytesIO()
+            sortie.save(tampon, format_pil, quality=80, optimize=True)
+
+            destination = chemin_variante(url, largeur, extension)
+            temporaire = destination.with_suffix(destination.suffix + f".{os.getpid()}.tmp")
+            temporaire.write_bytes(tampon.getvalue())
+            os.replace(temporaire, destination)
+
+
+def variante(url, largeur, extension):
+    """Chemin de la variante demandée, téléchargée et générée si besoin."""
+    if Image is None:
+        raise ImageIndisponible("Pillow n'est pas installé")
+
+    chemin = chemin_variante(url, largeur, extension)
+    if chemin.exists():
+        os.utime(chemin)  # LRU : dernier accès
+        return chemin
+
+    if _echec_recent(url):
+        raise ImageIndisponible("échec récent")
+
+    with _verrou_global:
+        verrou = _verrous.setdefault(cle(url), threading.Lock())
+
+    try:
+        with verrou:
+            # le thread qui tenait le verrou a pu réussir ou échouer entre-temps
+            if not chemin.exists():
+                if _echec_recent(url):
+                    raise ImageIndisponible("échec récent")
+                try:
+                    _generer(url, _telecharger(url))
+                except Exception as exc:
+                    logger.warning("Image %s indisponible : %s", url, exc)
+                    _chemin_echec(url).touch()
+                    if isinstance(exc, ImageIndisponible):
+                        raise
+                    raise ImageIndisponible(f"téléchargement impossible : {exc}")
+                evincer()
+    finally:
+        with _verrou_global:
+            _verrous.pop(cle(url), None)
+
+    return chemin
+
+
+def evincer():
+    """Supprime les variantes les moins récemment utilisées au-delà de la taille max."""
+    taille_max = getattr(settings, "IMAGES_CACHE_MAX_OCTETS", 200 * 1024 * 1024)
+
+    fichiers = []
+    total = 0
+    for entree in os.scandir(_dossier()):
+        if entree.is_file() and not entree.name.endswith(".tmp"):
+            stat = entree.stat()
+            fichiers.append((stat.st_mtime, stat.st_size, entree.path))
+            total += stat.st_size
+
+    if total <= taille_max:
+        return 0
+
+    supprimes = 0
+    for _, taille, chemin in sorted(fichiers):
+        if total <= taille_max:
+            break
+        try:
+            os.remove(chemin)
+        except FileNotFoundError:
+            pass
+        total -= taille
+        supprimes += 1
+    return supprimes
@@ -0,0 +1,156 @@
+"""
+IMEI : normalisation, contrôle de Luhn et identification de l'appareil.
+
+Un IMEI fait 15 chiffres, le dernier étant la clé de Luhn calculée sur les
+14 premiers. La saisie est tolérante (espaces, tirets, points, slashs).
+
+Les 8 premiers chiffres (TAC) identifient marque et modèle. La base TAC est
+importée (`manage.py importer_tac fichier.csv`) dans un fichier binaire trié,
+ouvert en mmap : recherche dichotomique sur disque, quasiment pas de RAM,
+aucun appel réseau.
+"""
+import mmap
+import os
+import re
+import struct
+import threading
+
+from django.conf import settings
+
+
+LONGUEUR = 15
+
+_SEPARATEURS = re.compile(r"[\s\-./]")
+
+
+def normaliser(valeur):
+    """'35-693803 564380 9' -> '356938035643809' (sans autre vérification)."""
+    return _SEPARATEURS.sub("", valeur or "")
+
+
+def luhn_valide(chiffres):
+    total = 0
+    for position, caractere in enumerate(reversed(chiffres)):
+        n = ord(caractere) - 48
+        if position % 2:
+            n *= 2
+            if n > 9:
+                n -= 9
+        total += n
+    return total % 10 == 0
+
+
+def erreur(valeur):
+    """Message d'erreur pour un IMEI déjà normalisé, ou None s'il est valide."""
+    if not valeur:
+        return "IMEI manquant."
+    if not valeur.isdigit() or not valeur.isascii():
+        return "IMEI : chiffres uniquement."
+    if len(valeur) != LONGUEUR:
+        return f"IMEI : {LONGUEUR} chiffres attendus ({len(valeur)} reçus)."
+    if not luhn_valide(valeur):
+        return "IMEI : clé de contrôle (Luhn) invalide."
+    return None
+
+
+# =========================
+# INDEX TAC (FICHIER TRIÉ, MMAP)
+# =========================
+# en-tête : magie, version, nombre d'entrées
+# entrées : (tac uint32, position du libellé uint32), triées par TAC
+# libellés : longueur uint16 + "marque\x1fmodèle" en UTF-8
+ENTETE = struct.Struct("<6sHI")
+ENTREE = struct.Struct("<II")
+LONGUEUR_LIBELLE = struct.Struct("<H")
+MAGIE = b"SKTAC1"
+VERSION = 1
+SEPARATEUR = "\x1f"
+LIBELLE_MAX = 65535  # longueur en octets, tient dans le uint16
+
+
+def ecrire_index(chemin, appareils):
+    """
+    Écrit l'index à partir de {tac (int): (marque, modèle)} ; remplacement
+    atomique pour les processus qui lisent l'ancien fichier.
+    """
+    libelles = {}
+    tampon = bytearray()
+    entrees = []
+    for tac in sorted(appareils):
+        # coupe en octets puis jette le caractère multi-octets tronqué en fin
+        libelle = SEPARATEUR.join(appareils[tac]).encode()[:LIBELLE_MAX].decode(errors="ignore").encode()
+        if libelle not in libelles:
+            libelles[libelle] = len(tampon)
+            tampon += LONGUEUR_LIBELLE.pack(len(libelle)) + libelle
+        entrees.append(ENTREE.pack(tac, libelles[libelle]))
+
+    temporaire = f"{chemin}.{os.getpid()}.tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(chemin)), exist_ok=True)
+    with open(temporaire, "wb") as f:
+        f.write(ENTETE.pack(MAGIE, VERSION, len(entrees)))
+        f.write(b"".join(entrees))
+        f.write(tampon)
+    os.replace(temporaire, chemin)
+    return len(entrees)
+
+
+class IndexTAC:
+    def __init__(self, chemin):
+        with open(chemin, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magie, version, self.nombre = ENTETE.unpack_from(self.mm, 0)
+        if magie != MAGIE or version != VERSION:
+            raise ValueError(f"{chemin} n'est pas un index TAC")
+        self.debut_libelles = ENTETE.size + self.nombre * ENTREE.size
+
+    def chercher(self, tac):
+        """(marque, modèle) pour un TAC entier, ou None. O(log n)."""
+        bas, haut = 0, self.nombre
+        while bas < haut:
+            milieu = (bas + haut) // 2
+            courant, position = ENTREE.unpack_from(self.mm, ENTETE.size + milieu * ENTREE.size)
+            if courant < tac:
+                bas = milieu + 1
+            elif courant > tac:
+                haut = milieu
+            else:
+                debut = self.debut_libelles + position
+                (longueur,) = LONGUEUR_LIBELLE.unpack_from(self.mm, debut)
+                debut += LONGUEUR_LIBELLE.size
+                marque, _, modele = self.mm[debut:debut + longueur].decode().partition(SEPARATEUR)
+                return marque, modele
+        return None
+
+
+_verrou = threading.Lock()
+_index = None  # (chemin, date de modification, IndexTAC)
+
+
+def index_tac():
+    """Index du processus, rouvert si le fichier a été réimporté ; None si absent."""
+    global _index
+
+    chemin = str(settings.TAC_INDEX)
+    try:
+        modification = os.stat(chemin).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    courant = _index
+    if courant is not None and courant[:2] == (chemin, modification):
+        return courant[2]
+
+    with _verrou:
+        if _index is None or _index[:2] != (chemin, modification):
+            _index = (chemin, modification, IndexTAC(chemin))
+        return _index[2]
+
+
+def appareil(valeur):
+    """(marque, modèle) d'un IMEI (ou d'un TAC), ou None si inconnu."""
+    chiffres = normaliser(valeur)
+    if len(chiffres) < 8 or not (chiffres[:8].isascii() and chiffres[:8].isdigit()):
+        return None
+    index = index_tac()
+    return index.chercher(int(chiffres[:8])) if index is not None else None
@@ -0,0 +1,162 @@
+"""
+Journal des changements d'état (EntreeJournal), en ajout seul.
+
+Écriture : `consigner` / `consigner_plusieurs`, appelés dans la transaction
+qui fait le changement (création de commande, transitions, expiration,
+mouvements de wallet) : le journal ne contient que des changements validés.
+
+Lecture : `exporter` relit le journal par id croissant à partir du curseur
+(PointControle "journal") et l'ajoute en JSONL gzip dans JOURNAL_EXPORT_DIR.
+Livraison au moins une fois : après un arrêt brutal, un lot peut être écrit
+deux fois ; les consommateurs dédupliquent sur `id`.
+
+Les ids sont attribués à l'INSERT, pas au commit : une transaction longue
+(expiration d'un gros lot, sauvegarde admin lente) peut valider un id plus
+petit que le curseur. Les ids absents d'un lot exporté sont donc gardés dans
+`PointControle.ecarts` et recherchés à chaque passage, pendant TROU_MAX ;
+après, ils sont considérés comme annulés (rollback, saut de séquence).
+"""
+import gzip
+import json
+import os
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import EntreeJournal, PointControle
+
+
+POINT_CONTROLE = "journal"
+TAILLE_LOT = 5000
+# un id attribué par une transaction pas encore validée apparaîtrait après
+# des ids plus grands : on ne lit pas les entrées de moins de DELAI
+DELAI = timedelta(seconds=5)
+# aucune transaction ne reste ouverte aussi longtemps
+TROU_MAX = timedelta(hours=1)
+
+
+# =========================
+# ÉCRITURE
+# =========================
+def _entree(type, user_id, objet_id=None, montant=0, **donnees):
+    return EntreeJournal(type=type, user_id=user_id, objet_id=objet_id, montant=montant, donnees=donnees)
+
+
+def consigner(type, user_id, objet_id=None, montant=0, **donnees):
+    _entree(type, user_id, objet_id, montant, **donnees).save()
+
+
+def consigner_plusieurs(entrees):
+    """`entrees` : [(type, user_id, objet_id, montant, {données})] ; une seule insertion."""
+    EntreeJournal.objects.bulk_create([
+        _entree(type, user_id, objet_id, montant, **donnees)
+        for type, user_id, objet_id, montant, donnees in entrees
+    ])
+
+
+def consigner_commandes(type, liste):
+    consigner_plusieurs([
+        (type, c.user_id, c.id, c.prix, {"produit": c.nom_produit, "type_commande": c.type_commande})
+        for c in liste
+    ])
+
+
+def consigner_depots(type, liste):
+    consigner_plusieurs([
+        (type, t.user_id, t.id, t.montant, {"methode": t.methode, "reference": t.reference})
+        for t in liste
+    ])
+
+
+# =========================
+# EXPORT JSONL
+# =========================
+def _ligne(entree):
+    return json.dumps({
+        "id": entree.id,
+        "type": entree.type,
+        "user_id": entree.user_id,
+        "objet_id": entree.objet_id,
+        "montant": entree.montant,
+        "donnees": entree.donnees,
+        "date": entree.date.isoformat(),
+    }, ensure_ascii=False)
+
+
+def _fichier_courant(dossier, premier_id):
+    """Dernier fichier du jour s'il reste de la place, sinon un nouveau."""
+    jour = timezone.now().strftime("%Y%m%d")
+    existants = sorted(dossier.glob(f"journal-{jour}-*.jsonl.gz"))
+    if existants and existants[-1].stat().st_size < settings.JOURNAL_FICHIER_MAX_OCTETS:
+        return existants[-1]
+    return dossier / f"journal-{jour}-{premier_id:012d}.jsonl.gz"
+
+
+def _ajouter(chemin, lignes):
+    # un membre gzip complet par lot, ajouté en une écriture : le fichier
+    # reste lisible par gzip / zcat (membres concaténés)
+    contenu = gzip.compress(("\n".join(lignes) + "\n").encode())
+    with open(chemin, "ab") as f:
+        f.write(contenu)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _rattraper(dossier, point):
+    """Exporte les entrées validées depuis dans les trous sous le curseur."""
+    if not point.ecarts:
+        return 0
+
+    horizon = (timezone.now() - TROU_MAX).isoformat()
+    trous = {id: vu for id, vu in point.ecarts if vu > horizon}
+    entrees = list(EntreeJournal.objects.filter(id__in=trous).order_by("id"))
+    if entrees:
+        _ajouter(_fichier_courant(dossier, entrees[0].id), [_ligne(e) for e in entrees])
+
+    for entree in entrees:
+        del trous[entree.id]
+    point.ecarts = [[id, vu] for id, vu in sorted(trous.items())]
+    point.save(update_fields=["ecarts", "date_maj"])
+    return len(entrees)
+
+
+def _trous(precedent, entrees):
+    """Ids entre l'ancien curseur et la fin du lot qui n'y figurent pas."""
+    vu = timezone.now().isoformat()
+    presents = {e.id for e in entrees}
+    return [[id, vu] for id in range(precedent + 1, entrees[-1].id) if id not in presents]
+
+
+def exporter(dossier=None, taille=TAILLE_LOT, lots_max=None):
+    """Exporte les entrées nouvelles ; retourne (nombre, curseur final)."""
+    dossier = Path(dossier or settings.JOURNAL_EXPORT_DIR)
+    dossier.mkdir(parents=True, exist_ok=True)
+    point, _ = PointControle.objects.get_or_create(nom=POINT_CONTROLE)
+
+    total = _rattraper(dossier, point)
+    lots = 0
+    while lots_max is None or lots < lots_max:
+        limite = timezone.now() - DELAI
+        entrees = []
+        for entree in EntreeJournal.objects.filter(id__gt=point.curseur).order_by("id")[:taille]:
+            if entree.date > limite:
+                break
+            entrees.append(entree)
+        if not entrees:
+            break
+
+        _ajouter(_fichier_courant(dossier, entrees[0].id), [_ligne(e) for e in entrees])
+
+        # curseur avancé seulement une fois le lot sur disque
+        point.ecarts = point.ecarts + _trous(point.curseur, entrees)
+        point.curseur = entrees[-1].id
+        point.position = entrees[-1].date
+        point.save(update_fields=["curseur", "position", "ecarts", "date_maj"])
+
+        total += len(entrees)
+        lots += 1
+        if len(entrees) < taille:
+            break
+    return total, point.curseur
@@ -0,0 +1,236 @@
+"""
+Limitation du débit (token bucket) par IP et par nom d'utilisateur.
+
+Les seaux sont dans le cache "limiteur" : Redis (partagé entre les workers,
+mise à jour sous un verrou par seau, verrous.py) ou, sans Redis, la mémoire du
+processus sous un verrou local. Jamais la base : le refus (429) est décidé
+avant tout hachage de mot de passe ou requête SQL. Si Redis ne répond pas on
+retombe sur un dictionnaire en mémoire du processus.
+
+Un verrou non obtenu à temps laisse passer la requête : la contention sur un
+seau n'est pas une preuve d'abus.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+
+from . import verrous
+
+
+logger = logging.getLogger(__name__)
+
+UNITES = {"s": 1, "sec": 1, "min": 60, "m": 60, "h": 3600, "j": 86400, "d": 86400}
+
+PREFIXE = "limiteur"
+CACHE = "limiteur"
+
+
+def parse_taux(taux):
+    """'5/min' -> (capacité 5, 5/60 jeton par seconde)."""
+    nombre, unite = taux.split("/")
+    capacite = int(nombre)
+    return capacite, capacite / UNITES[unite.strip()]
+
+
+# =========================
+# STOCKAGE
+# =========================
+class _MemoireLocale:
+    """Repli en mémoire (borné) quand le cache ne répond pas."""
+
+    def __init__(self, taille_max=10000):
+        self.taille_max = taille_max
+        self.donnees = OrderedDict()
+        self.verrou = threading.Lock()
+
+    def get(self, cle):
+        with self.verrou:
+            valeur = self.donnees.get(cle)
+            if valeur is not None:
+                self.donnees.move_to_end(cle)
+            return valeur
+
+    def set(self, cle, valeur, timeout=None):
+        with self.verrou:
+            self.donnees[cle] = valeur
+            self.donnees.move_to_end(cle)
+            while len(self.donnees) > self.taille_max:
+                self.donnees.popitem(last=False)
+
+    def incr(self, cle):
+        with self.verrou:
+            self.donnees[cle] = self.donnees.get(cle, 0) + 1
+
+
+_memoire = _MemoireLocale()
+_verrou_local = threading.Lock()
+
+
+def _cache():
+    return caches[CACHE]
+
+
+def seaux_locaux():
+    """Vrai si les seaux (et les rejets) sont propres au processus (pas de Redis)."""
+    return isinstance(_cache(), LocMemCache)
+
+
+def _lire(cle):
+    try:
+        return _cache().get(cle)
+    except Exception:
+        return _memoire.get(cle)
+
+
+def _ecrire(cle, valeur, timeout):
+    try:
+        _cache().set(cle, valeur, timeout)
+    except Exception:
+        _memoire.set(cle, valeur)
+
+
+@contextmanager
+def _verrou_seau(cle):
+    """Fournit True si le seau est à nous, False après l'attente de verrous.ATTENTE."""
+    if seaux_locaux():
+        # seaux propres au processus : un verrou de threads suffit
+        with _verrou_local:
+            yield True
+        return
+    with verrous.verrou(cle) as obtenu:
+        yield obtenu
+
+
+def _compter_rejet(nom, portee):
+    cle = f"{PREFIXE}:rejets:{nom}:{portee}"
+    try:
+        # incr atomique sur Redis comme en mémoire locale
+        if not _cache().add(cle, 1, None):
+            _cache().incr(cle)
+    except Exception:
+        _memoire.incr(cle)
+
+
+# =========================
+# TOKEN BUCKET
+# =========================
+def consommer(cle, capacite, debit, maintenant=None):
+    """
+    Retire un jeton du seau `cle`.
+    Retourne (autorisé, secondes avant le prochain jeton).
+    """
+    # lecture + écriture sous verrou : sans lui, toutes les requêtes d'une
+    # rafale simultanée liraient le même nombre de jetons et passeraient
+    with _verrou_seau(cle) as obtenu:
+        if not obtenu:
+            logger.warning("Verrou du seau %s non obtenu : requête laissée passer", cle)
+            return True, 0
+        maintenant = time.time() if maintenant is None else maintenant
+        etat = _lire(cle)
+
+        if etat is None:
+            jetons = float(capacite)
+        else:
+            jetons, dernier = etat
+            jetons = min(capacite, jetons + (maintenant - dernier) * debit)
+
+        if jetons < 1:
+            return False, (1 - jetons) / debit
+
+        _ecrire(cle, (jetons - 1, maintenant), math.ceil(capacite / debit) + 1)
+        return True, 0
+
+
+def adresse_ip(request):
+    if getattr(settings, "LIMITEUR_PROXY_DE_CONFIANCE", False):
+        # chaque proxy ajoute à droite l'adresse qu'il a vue ; les entrées de
+        # gauche viennent du client et peuvent être inventées
+        transmis = [a.strip() for a in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",") if a.strip()]
+        proxies = getattr(settings, "LIMITEUR_PROXIES", 1)
+        if len(transmis) >= proxies:
+            return transmis[-proxies]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def _empreinte(valeur):
+    return hashlib.sha1(valeur.strip().lower().encode()).hexdigest()
+
+
+def _identifiant(request):
+    username = request.POST.get("username")
+    if not username and request.user.is_authenticated:
+        username = request.user.username
+    return username or ""
+
+
+def verifier(nom, request):
+    """None si la requête passe, sinon une réponse 429 prête à renvoyer."""
+    regles = getattr(settings, "LIMITES_REQUETES", {}).get(nom)
+    if not regles or not getattr(settings, "LIMITEUR_ACTIF", True):
+        return None
+
+    for portee in ("ip", "username"):
+        if portee not in regles:
+            continue
+
+        valeur = adresse_ip(request) if portee == "ip" else _identifiant(request)
+        if not valeur:
+            continue
+
+        capacite, debit = parse_taux(regles[portee])
+        autorise, attente = consommer(
+            f"{PREFIXE}:{nom}:{portee}:{_empreinte(valeur)}", capacite, debit
+        )
+        if not autorise:
+            _compter_rejet(nom, portee)
+            logger.warning("Limite atteinte (%s / %s)", nom, portee)
+
+            response = HttpResponse(
+                "Trop de tentatives. Réessayez dans quelques instants.",
+                status=429,
+                content_type="text/plain; charset=utf-8",
+            )
+            response["Retry-After"] = str(math.ceil(attente))
+            return response
+
+    return None
+
+
+def limiter(nom):
+    """Décorateur de vue : applique LIMITES_REQUETES[nom] aux requêtes POST."""
+    def decorateur(vue):
+        @wraps(vue)
+        def wrapper(request, *args, **kwargs):
+            if request.method == "POST":
+                refus = verifier(nom, request)
+                if refus is not None:
+                    return refus
+            return vue(request, *args, **kwargs)
+        return wrapper
+    return decorateur
+
+
+def compteurs_rejets():
+    """{(vue, portée): nombre de requêtes refusées} depuis le démarrage du cache."""
+    compteurs = {}
+    for nom, regles in getattr(settings, "LIMITES_REQUETES", {}).items():
+        for portee in regles:
+            cle = f"{PREFIXE}:rejets:{nom}:{portee}"
+            try:
+                valeur = _cache().get(cle)
+            except Exception:
+                valeur = None
+            if valeur is None:
+                valeur = _memoire.get(cle)
+            compteurs[(nom, portee)] = valeur or 0
+    return compteurs
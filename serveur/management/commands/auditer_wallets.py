@@ -0,0 +1,31 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from serveur import audit
+
+
+class Command(BaseCommand):
+    help = (
+        "Vérifie que chaque solde vaut dépôts validés − commandes débitées, et les "
+        "compteurs du tableau de bord. Incrémental depuis le dernier passage (cron nocturne)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--complet", action="store_true", help="Tous les utilisateurs, sans point de contrôle")
+        parser.add_argument("--sans-enregistrer", action="store_true", help="Ne pas avancer le point de contrôle")
+
+    def handle(self, *args, **options):
+        verifies, ecarts = audit.auditer(complet=options["complet"], enregistrer=not options["sans_enregistrer"])
+
+        noms = dict(User.objects.filter(pk__in={e[0] for e in ecarts}).values_list("pk", "username"))
+        for user_id, champ, valeur, attendu in sorted(ecarts):
+            self.stdout.write(
+                f"{noms.get(user_id, user_id)} (#{user_id})  {champ} : {valeur} au lieu de {attendu} "
+                f"(écart {valeur - attendu:+})"
+            )
+
+        portee = "tous les utilisateurs" if verifies is None else f"{verifies} utilisateur(s) modifié(s)"
+        if ecarts:
+            # code de sortie non nul : cron prévient l'exploitant
+            raise CommandError(f"{len(ecarts)} écart(s) sur {len(noms)} utilisateur(s) ({portee}).")
+        self.stdout.write(self.style.SUCCESS(f"Aucun écart ({portee})."))
@@ -0,0 +1,59 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from serveur.catalogue import CatalogueError, exporter, importer
+
+
+class Command(BaseCommand):
+    help = "Importe (synchronise) ou exporte le catalogue au format CSV / JSON."
+
+    def add_arguments(self, parser):
+        sub = parser.add_subparsers(dest="action", required=True)
+
+        imp = sub.add_parser("importer", help="Synchronise la base avec un fichier catalogue")
+        imp.add_argument("fichier")
+        imp.add_argument("--format", choices=["csv", "json"])
+        imp.add_argument("--dry-run", action="store_true", help="Affiche le rapport sans rien écrire")
+        imp.add_argument(
+            "--supprimer",
+            action="store_true",
+            help="Supprime les produits absents du fichier (synchro complète)",
+        )
+
+        exp = sub.add_parser("exporter", help="Exporte le catalogue actuel")
+        exp.add_argument("fichier", nargs="?", help="Sortie (stdout par défaut)")
+        exp.add_argument("--format", choices=["csv", "json"])
+
+    def handle(self, *args, **options):
+        fichier = options.get("fichier")
+        format_fichier = options.get("format") or (
+            "json" if fichier and fichier.endswith(".json") else "csv"
+        )
+
+        if options["action"] == "exporter":
+            contenu = exporter(format_fichier)
+            if fichier:
+                Path(fichier).write_text(contenu, encoding="utf-8")
+                self.stdout.write(self.style.SUCCESS(f"Catalogue exporté dans {fichier}"))
+            else:
+                self.stdout.write(contenu, ending="")
+            return
+
+        try:
+            contenu = Path(fichier).read_bytes()
+        except OSError as exc:
+            raise CommandError(f"Lecture impossible : {exc}")
+
+        try:
+            rapport = importer(
+                contenu,
+                format_fichier,
+                dry_run=options["dry_run"],
+                supprimer=options["supprimer"],
+            )
+        except CatalogueError as exc:
+            raise CommandError("Fichier invalide :\n" + "\n".join(exc.erreurs))
+
+        for ligne in rapport.lignes():
+            self.stdout.write(ligne)
@@ -0,0 +1,439 @@
+"""
+Générateur de charge asyncio (bibliothèque standard uniquement).
+
+Des clients virtuels se connectent à un serveur déjà lancé, puis rejouent des
+étapes pondérées (home, recherche dans accueil, page commande, envoi de
+commande, ajouter_fonds) avec leurs cookies de session et le jeton CSRF.
+Un puits SMTP local peut recevoir les e-mails envoyés par le serveur :
+
+    EMAIL_HOST=127.0.0.1 EMAIL_PORT=2525 EMAIL_USE_TLS=False \\
+    LIMITEUR_ACTIF=False python manage.py runserver
+
+    python manage.py charge --preparer 200 --clients 200 --duree 60 --smtp 2525
+"""
+import asyncio
+import random
+import re
+import ssl
+import time
+from collections import defaultdict
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from serveur.comptes import provisionner
+from serveur.models import Licence, Service, ServiceImei, Wallet
+
+
+PREFIXE = "__charge_"
+MOT_DE_PASSE = "charge-sk-2024"
+
+POIDS_DEFAUT = "home=25,accueil=15,recherche=25,commande=20,commander=10,fonds=5"
+
+RE_CSRF = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+# =========================
+# CLIENT HTTP MINIMAL (UNE CONNEXION PAR REQUÊTE)
+# =========================
+class Reponse:
+    def __init__(self, statut, entetes, corps):
+        self.statut = statut
+        self.entetes = entetes
+        self.corps = corps
+
+    @property
+    def texte(self):
+        return self.corps.decode("utf-8", "replace")
+
+
+class Client:
+    def __init__(self, base, timeout):
+        url = urlsplit(base)
+        self.https = url.scheme == "https"
+        self.hote = url.hostname
+        self.port = url.port or (443 if self.https else 80)
+        self.entete_hote = url.netloc
+        self.origine = f"{url.scheme}://{url.netloc}"
+        self.timeout = timeout
+        self.cookies = {}
+
+    async def requete(self, methode, chemin, donnees=None, entetes=None):
+        corps = urlencode(donnees).encode() if donnees is not None else b""
+        lignes = [
+            f"{methode} {chemin} HTTP/1.1",
+            f"Host: {self.entete_hote}",
+            "Connection: close",
+            "User-Agent: SK-Charge/1.0",
+            "Accept-Encoding: identity",
+        ]
+        if self.cookies:
+            lignes.append("Cookie: " + "; ".join(f"{k}={v}" for k, v in self.cookies.items()))
+        if donnees is not None:
+            lignes.append("Content-Type: application/x-www-form-urlencoded")
+            lignes.append(f"Content-Length: {len(corps)}")
+            lignes.append(f"Referer: {self.origine}{chemin}")
+            if "csrftoken" in self.cookies:
+                lignes.append(f"X-CSRFToken: {self.cookies['csrftoken']}")
+        for nom, valeur in (entetes or {}).items():
+            lignes.append(f"{nom}: {valeur}")
+
+        return await asyncio.wait_for(
+            self._echanger(("\r\n".join(lignes) + "\r\n\r\n").encode() + corps),
+            self.timeout,
+        )
+
+    async def _echanger(self, brut):
+        contexte = ssl.create_default_context() if self.https else None
+        lecteur, ecrivain = await asyncio.open_connection(self.hote, self.port, ssl=contexte)
+        try:
+            ecrivain.write(brut)
+            await ecrivain.drain()
+            donnees = await lecteur.read()
+        finally:
+            ecrivain.close()
+
+        tete, _, corps = donnees.partition(b"\r\n\r\n")
+        lignes = tete.decode("latin-1").split("\r\n")
+        statut = int(lignes[0].split()[1])
+
+        entetes = defaultdict(list)
+        for ligne in lignes[1:]:
+            nom, _, valeur = ligne.partition(":")
+            entetes[nom.strip().lower()].append(valeur.strip())
+
+        for valeur in entetes.get("set-cookie", []):
+            for nom, morsel in SimpleCookie(valeur).items():
+                if morsel.value:
+                    self.cookies[nom] = morsel.value
+                else:
+                    self.cookies.pop(nom, None)
+
+        if "chunked" in ",".join(entetes.get("transfer-encoding", [])):
+            corps = _dechunker(corps)
+        return Reponse(statut, entetes, corps)
+
+
+def _dechunker(corps):
+    sortie = bytearray()
+    while corps:
+        taille, _, corps = corps.partition(b"\r\n")
+        n = int(taille.split(b";")[0] or b"0", 16)
+        if n == 0:
+            break
+        sortie += corps[:n]
+        corps = corps[n + 2:]
+    return bytes(sortie)
+
+
+# =========================
+# PUITS SMTP (ACCEPTE ET JETTE)
+# =========================
+class PuitsSmtp:
+    def __init__(self):
+        self.messages = 0
+
+    async def demarrer(self, port):
+        return await asyncio.start_server(self._session, "127.0.0.1", port)
+
+    async def _session(self, lecteur, ecrivain):
+        def repondre(ligne):
+            ecrivain.write(ligne.encode() + b"\r\n")
+
+        repondre("220 puits-sk ESMTP")
+        try:
+            while True:
+                ligne = await lecteur.readline()
+                if not ligne:
+                    break
+                verbe = ligne[:4].decode("latin-1").upper()
+                if verbe in ("EHLO", "HELO"):
+                    repondre("250-puits-sk")
+                    repondre("250-AUTH PLAIN")
+                    repondre("250 8BITMIME")
+                elif verbe == "AUTH":
+                    repondre("235 OK")
+                elif verbe == "DATA":
+                    repondre("354 fin par <CRLF>.<CRLF>")
+                    await ecrivain.drain()
+                    while (await lecteur.readline()) not in (b".\r\n", b""):
+                        pass
+                    self.messages += 1
+                    repondre("250 OK")
+                elif verbe == "QUIT":
+                    repondre("221 bye")
+                    break
+                else:
+                    repondre("250 OK")
+                await ecrivain.drain()
+        finally:
+            ecrivain.close()
+
+
+# =========================
+# STATISTIQUES
+# =========================
+def percentile(valeurs, p):
+    if not valeurs:
+        return 0.0
+    rang = max(0, min(len(valeurs) - 1, round(p / 100 * len(valeurs) + 0.5) - 1))
+    return valeurs[rang]
+
+
+class Statistiques:
+    def __init__(self):
+        self.durees = defaultdict(list)
+        self.erreurs = defaultdict(int)
+        self.codes = defaultdict(lambda: defaultdict(int))
+
+    def noter(self, etape, duree, code, ok):
+        self.durees[etape].append(duree)
+        self.codes[etape][code] += 1
+        if not ok:
+            self.erreurs[etape] += 1
+
+
+# =========================
+# UTILISATEUR VIRTUEL
+# =========================
+class Utilisateur:
+    def __init__(self, numero, options, produits, termes, stats):
+        self.nom = f"{PREFIXE}{numero:05d}"
+        self.client = Client(options["url"], options["timeout"])
+        self.produits = produits
+        self.termes = termes
+        self.stats = stats
+        self.pause = options["pause"] / 1000
+
+    async def mesurer(self, etape, methode, chemin, donnees=None, attendus=(200,), entetes=None):
+        debut = time.perf_counter()
+        try:
+            reponse = await self.client.requete(methode, chemin, donnees, entetes)
+        except Exception as exc:
+            self.stats.noter(etape, time.perf_counter() - debut, type(exc).__name__, False)
+            return None
+        self.stats.noter(etape, time.perf_counter() - debut, reponse.statut, reponse.statut in attendus)
+        return reponse
+
+    def csrf(self, reponse):
+        trouve = RE_CSRF.search(reponse.texte) if reponse else None
+        return trouve.group(1) if trouve else self.client.cookies.get("csrftoken", "")
+
+    async def connecter(self):
+        page = await self.mesurer("login_page", "GET", "/login/")
+        reponse = await self.mesurer(
+            "login",
+            "POST",
+            "/login/",
+            {"csrfmiddlewaretoken": self.csrf(page), "username": self.nom, "password": MOT_DE_PASSE},
+            attendus=(302,),
+        )
+        return bool(reponse and reponse.statut == 302 and "sessionid" in self.client.cookies)
+
+    async def home(self):
+        await self.mesurer("home", "GET", "/")
+
+    async def accueil(self):
+        await self.mesurer("accueil", "GET", "/accueil/")
+
+    async def recherche(self):
+        q = random.choice(self.termes) if self.termes else "a"
+        await self.mesurer(
+            "recherche",
+            "GET",
+            f"/accueil/recherche/?{urlencode({'q': q})}",
+            entetes={"X-Requested-With": "XMLHttpRequest"},
+        )
+
+    async def commande(self):
+        type_produit, produit_id = random.choice(self.produits)
+        await self.mesurer("commande", "GET", f"/commande/{type_produit}/{produit_id}/")
+
+    async def commander(self):
+        type_produit, produit_id = random.choice(self.produits)
+        chemin = f"/commande/{type_produit}/{produit_id}/"
+        page = await self.mesurer("commande", "GET", chemin)
+        await self.mesurer(
+            "commander",
+            "POST",
+            chemin,
+            {
+                "csrfmiddlewaretoken": self.csrf(page),
+                "email": f"{self.nom}@example.com",
+                "username_service": self.nom,
+                "imei": "356938035643809",
+                "photo_lien": "https://example.com/photo.jpg",
+            },
+            attendus=(302,),
+        )
+
+    async def fonds(self):
+        page = await self.mesurer("fonds", "GET", "/fonds/")
+        await self.mesurer(
+            "ajouter_fonds",
+            "POST",
+            "/ajouter-fonds/",
+            {
+                "csrfmiddlewaretoken": self.csrf(page),
+                "montant": random.choice((1000, 2500, 5000)),
+                "methode": "orange",
+                "reference": f"CHG{random.randrange(10**9):09d}",
+            },
+            attendus=(302,),
+        )
+
+    async def jouer(self, etapes, poids, fin):
+        # démarrages étalés : pas de rafale de connexions à t=0
+        await asyncio.sleep(random.random() * min(2.0, max(0.0, fin - time.monotonic())))
+        if not await self.connecter():
+            return
+        while time.monotonic() < fin:
+            etape = random.choices(etapes, weights=poids)[0]
+            if etape in ("commande", "commander") and not self.produits:
+                etape = "home"
+            await getattr(self, etape)()
+            if self.pause:
+                await asyncio.sleep(random.uniform(0, 2 * self.pause))
+
+
+# =========================
+# COMMANDE
+# =========================
+class Command(BaseCommand):
+    help = (
+        "Test de charge : clients virtuels concurrents (asyncio) sur un serveur lancé, "
+        "scénarios pondérés, puis débit, taux d'erreur et latences p50/p95/p99 par étape."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000")
+        parser.add_argument("--clients", type=int, default=50, help="Utilisateurs virtuels simultanés")
+        parser.add_argument("--duree", type=float, default=30, help="Durée du test (secondes)")
+        parser.add_argument("--pause", type=float, default=200, help="Pause moyenne entre étapes (ms)")
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument("--poids", default=POIDS_DEFAUT, help=f"Pondération des étapes ({POIDS_DEFAUT})")
+        parser.add_argument("--smtp", type=int, help="Démarrer un puits SMTP local sur ce port")
+        parser.add_argument(
+            "--preparer", type=int, default=0, metavar="N",
+            help="Créer / réinitialiser N utilisateurs de test (mot de passe connu, portefeuille crédité)",
+        )
+        parser.add_argument("--nettoyer", action="store_true", help="Supprimer les utilisateurs de test et quitter")
+
+    def handle(self, *args, **options):
+        if options["nettoyer"]:
+            supprimes, _ = User.objects.filter(username__startswith=PREFIXE).delete()
+            self.stdout.write(self.style.SUCCESS(f"{supprimes} objet(s) supprimé(s)."))
+            return
+
+        if options["preparer"]:
+            self._preparer(options["preparer"])
+
+        try:
+            poids = {
+                nom.strip(): float(valeur)
+                for nom, valeur in (paire.split("=") for paire in options["poids"].split(","))
+            }
+        except ValueError:
+            raise CommandError(f"--poids invalide : {options['poids']}")
+        inconnues = set(poids) - {"home", "accueil", "recherche", "commande", "commander", "fonds"}
+        if inconnues:
+            raise CommandError(f"Étapes inconnues : {', '.join(sorted(inconnues))}")
+
+        disponibles = User.objects.filter(username__startswith=PREFIXE).count()
+        if disponibles < options["clients"]:
+            raise CommandError(
+                f"{disponibles} utilisateur(s) de test pour {options['clients']} clients : "
+                f"lancer avec --preparer {options['clients']}"
+            )
+
+        produits = self._produits()
+        termes = sorted({
+            nom.split()[0]
+            for modele in (Licence, ServiceImei, Service)
+            for nom in modele.objects.values_list("nom", flat=True)[:200]
+            if nom.split()
+        })
+
+        stats = Statistiques()
+        puits = PuitsSmtp()
+        debut = time.perf_counter()
+        asyncio.run(self._lancer(options, poids, produits, termes, stats, puits))
+        ecoule = time.perf_counter() - debut
+
+        self._rapport(stats, ecoule, puits if options["smtp"] else None)
+
+    # -------------------------
+    def _preparer(self, nombre):
+        existants = set(
+            User.objects.filter(username__startswith=PREFIXE).values_list("username", flat=True)
+        )
+        nouveaux = [
+            f"{PREFIXE}{i:05d}" for i in range(nombre) if f"{PREFIXE}{i:05d}" not in existants
+        ]
+
+        modele = User(username="modele")
+        modele.set_password(MOT_DE_PASSE)  # un seul hachage pour tous les comptes
+        User.objects.bulk_create(
+            [
+                User(username=nom, email=f"{nom}@example.com", password=modele.password)
+                for nom in nouveaux
+            ],
+            batch_size=500,
+        )
+        # bulk_create n'émet pas post_save : portefeuilles et résumés à la main
+        for user in User.objects.filter(username__in=nouveaux).only("pk"):
+            provisionner(user)
+
+        # solde fixe (et non incrémenté) : relancer le test ne le fait pas grossir
+        Wallet.objects.filter(user__username__startswith=PREFIXE).update(solde=10**9)
+        self.stdout.write(f"{len(nouveaux)} utilisateur(s) créé(s), {nombre} prêts.")
+
+    def _produits(self):
+        return (
+            [("licence", pk) for pk in Licence.objects.values_list("pk", flat=True)[:50]]
+            + [("service", pk) for pk in ServiceImei.objects.values_list("pk", flat=True)[:50]]
+            + [("service_general", pk) for pk in Service.objects.values_list("pk", flat=True)[:50]]
+        )
+
+    async def _lancer(self, options, poids, produits, termes, stats, puits):
+        serveur_smtp = await puits.demarrer(options["smtp"]) if options["smtp"] else None
+
+        etapes = list(poids)
+        fin = time.monotonic() + options["duree"]
+        utilisateurs = [
+            Utilisateur(i, options, produits, termes, stats) for i in range(options["clients"])
+        ]
+        try:
+            await asyncio.gather(*(u.jouer(etapes, list(poids.values()), fin) for u in utilisateurs))
+        finally:
+            if serveur_smtp:
+                serveur_smtp.close()
+                await serveur_smtp.wait_closed()
+
+    def _rapport(self, stats, ecoule, puits):
+        self.stdout.write(
+            f"\n{'étape':<14}{'req':>8}{'req/s':>9}{'erreurs':>9}{'%err':>7}"
+            f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  codes"
+        )
+        total = total_erreurs = 0
+        for etape in sorted(stats.durees):
+            durees = sorted(stats.durees[etape])
+            erreurs = stats.erreurs[etape]
+            total += len(durees)
+            total_erreurs += erreurs
+            codes = " ".join(f"{code}:{n}" for code, n in sorted(stats.codes[etape].items(), key=str))
+            self.stdout.write(
+                f"{etape:<14}{len(durees):>8}{len(durees) / ecoule:>9.1f}{erreurs:>9}"
+                f"{100 * erreurs / len(durees):>6.1f}%"
+                f"{percentile(durees, 50) * 1000:>9.0f}{percentile(durees, 95) * 1000:>9.0f}"
+                f"{percentile(durees, 99) * 1000:>9.0f}  {codes}"
+            )
+
+        self.stdout.write(
+            f"\nTotal : {total} requêtes en {ecoule:.1f}s ({total / ecoule:.1f} req/s), "
+            f"{total_erreurs} erreur(s) ({100 * total_erreurs / max(total, 1):.1f}%)"
+        )
+        if puits:
+            self.stdout.write(f"E-mails reçus par le puits SMTP : {puits.messages}")
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from serveur.commandes import RECHERCHE_LIMITE, rechercher
+
+
+class Command(BaseCommand):
+    help = "Retrouve des commandes par IMEI (complet ou début), email ou nom d'utilisateur du service."
+
+    def add_arguments(self, parser):
+        parser.add_argument("terme")
+        parser.add_argument("--limite", type=int, default=RECHERCHE_LIMITE)
+
+    def handle(self, *args, **options):
+        terme = options["terme"]
+        resultats = rechercher(terme, options["limite"])
+        if not resultats and len(terme.strip()) < 3:
+            raise CommandError("Terme trop court : 3 caractères minimum (4 chiffres pour un IMEI).")
+
+        for c in resultats:
+            self.stdout.write(
+                f"#{c.id}  {timezone.localtime(c.date):%d/%m/%Y %H:%M}  {c.statut:<8} "
+                f"{c.user.username}  {c.nom_produit}  {c.prix} FCFA  "
+                f"imei={c.imei or '—'}  email={c.email}  username={c.username_service}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"{len(resultats)} commande(s)."))
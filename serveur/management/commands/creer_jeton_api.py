@@ -0,0 +1,22 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from serveur.api import creer_jeton
+
+
+class Command(BaseCommand):
+    help = "Crée un jeton pour l'API revendeurs ; la clé n'est affichée qu'une fois."
+
+    def add_arguments(self, parser):
+        parser.add_argument("username")
+        parser.add_argument("--nom", default="", help="Libellé du jeton (ex. script du revendeur)")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"Utilisateur inconnu : {options['username']}")
+
+        jeton, cle = creer_jeton(user, options["nom"])
+        self.stdout.write(self.style.SUCCESS(f"Jeton {jeton.prefixe}… créé pour {user.username}."))
+        self.stdout.write(cle)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from serveur import notifications
+
+
+class Command(BaseCommand):
+    help = (
+        "Envoie à ADMIN_EMAIL le récapitulatif des commandes et dépôts en attente "
+        "si la fenêtre NOTIFICATIONS_FENETRE_MINUTES est échue (à lancer par cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Envoyer sans attendre la fin de la fenêtre")
+
+    def handle(self, *args, **options):
+        nombre = notifications.envoyer_digest(force=options["force"])
+        if nombre:
+            self.stdout.write(self.style.SUCCESS(f"Récapitulatif envoyé ({nombre} événement(s))."))
+        else:
+            self.stdout.write("Rien à envoyer.")
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+
+from serveur import expiration
+from serveur.models import Commande, Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Expire les commandes (remboursées) et dépôts restés en attente au-delà de "
+        "EXPIRATION_COMMANDES_JOURS / EXPIRATION_DEPOTS_JOURS (à lancer par cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--jours-commandes", type=int, default=settings.EXPIRATION_COMMANDES_JOURS)
+        parser.add_argument("--jours-depots", type=int, default=settings.EXPIRATION_DEPOTS_JOURS)
+        parser.add_argument("--lot", type=int, default=expiration.TAILLE_LOT, help="Lignes par transaction")
+        parser.add_argument("--simulation", action="store_true", help="Compter sans rien modifier")
+
+    def handle(self, *args, **options):
+        avant_commandes = expiration.limite(options["jours_commandes"])
+        avant_depots = expiration.limite(options["jours_depots"])
+
+        if options["simulation"]:
+            commandes = Commande.objects.filter(statut="attente", date__lt=avant_commandes).aggregate(
+                nombre=Count("id"), montant=Sum("prix")
+            )
+            depots = Transaction.objects.filter(statut="attente", date__lt=avant_depots).count()
+            self.stdout.write(
+                f"{commandes['nombre']} commande(s) à expirer ({commandes['montant'] or 0} FCFA à rembourser), "
+                f"{depots} dépôt(s) à expirer."
+            )
+            return
+
+        bilan = expiration.nouveau_bilan()
+        commandes, _ = expiration.expirer_commandes(avant_commandes, options["lot"], bilan)
+        depots, _ = expiration.expirer_depots(avant_depots, options["lot"], bilan)
+        prevenus = expiration.prevenir(bilan)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{commandes} commande(s) et {depots} dépôt(s) expiré(s), {prevenus} utilisateur(s) prévenu(s)."
+        ))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from serveur import journal
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporte les nouvelles entrées du journal des changements en JSONL gzip "
+        "(JOURNAL_EXPORT_DIR), à partir du curseur du dernier passage."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dossier", default=None, help="Défaut : JOURNAL_EXPORT_DIR")
+        parser.add_argument("--lot", type=int, default=journal.TAILLE_LOT)
+        parser.add_argument("--continu", action="store_true", help="Suivre le journal sans s'arrêter")
+        parser.add_argument("--intervalle", type=float, default=5.0, help="Secondes entre deux lectures (--continu)")
+
+    def handle(self, *args, **options):
+        while True:
+            nombre, curseur = journal.exporter(options["dossier"], options["lot"])
+            if nombre or not options["continu"]:
+                self.stdout.write(f"{nombre} entrée(s) exportée(s), curseur à {curseur}.")
+            if not options["continu"]:
+                return
+            time.sleep(options["intervalle"])
@@ -0,0 +1,66 @@
+import csv
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from serveur import imei
+
+
+# en-têtes acceptés (base maison ou export anglais type Osmocom)
+COLONNES_TAC = ("tac",)
+COLONNES_MARQUE = ("marque", "brand", "manufacturer")
+COLONNES_MODELE = ("modele", "modèle", "model", "marketing_name")
+
+
+def _colonne(entete, noms):
+    for nom in noms:
+        if nom in entete:
+            return entete.index(nom)
+    raise CommandError(f"Colonne absente : {' / '.join(noms)}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Construit l'index TAC local (marque / modèle par IMEI) à partir d'un CSV "
+        "tac,marque,modele. L'index en place est remplacé atomiquement."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("fichier")
+        parser.add_argument("--sortie", default=None, help="Chemin de l'index (défaut : TAC_INDEX)")
+
+    def handle(self, *args, **options):
+        sortie = str(options["sortie"] or settings.TAC_INDEX)
+        appareils = {}
+        ignorees = 0
+
+        try:
+            with open(options["fichier"], encoding="utf-8-sig", newline="") as f:
+                premiere = f.readline()
+                separateur = ";" if premiere.count(";") > premiere.count(",") else ","
+                entete = [c.strip().lower() for c in next(csv.reader([premiere], delimiter=separateur), [])]
+                tac = _colonne(entete, COLONNES_TAC)
+                marque = _colonne(entete, COLONNES_MARQUE)
+                modele = _colonne(entete, COLONNES_MODELE)
+
+                for valeurs in csv.reader(f, delimiter=separateur):
+                    try:
+                        code = valeurs[tac].strip()
+                        libelle = (valeurs[marque].strip(), valeurs[modele].strip())
+                    except IndexError:
+                        ignorees += 1
+                        continue
+                    if len(code) != 8 or not code.isdigit() or not libelle[0]:
+                        ignorees += 1
+                        continue
+                    appareils[int(code)] = libelle
+        except (OSError, UnicodeDecodeError, csv.Error) as exc:
+            raise CommandError(f"Lecture impossible : {exc}")
+
+        if not appareils:
+            raise CommandError("Aucun TAC valide : index inchangé.")
+
+        nombre = imei.ecrire_index(sortie, appareils)
+        self.stdout.write(self.style.SUCCESS(
+            f"{nombre} TAC indexé(s) dans {sortie} ({ignorees} ligne(s) ignorée(s))."
+        ))
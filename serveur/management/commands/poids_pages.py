@@ -0,0 +1,117 @@
+import gzip
+import re
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+
+from serveur.models import Licence, Service, ServiceImei
+
+
+RE_ASSET = re.compile(r'(?:href|src)="(?P<url>[^"]+\.(?:css|js))"')
+RE_INLINE = re.compile(r"<(style|script)>(.*?)</\1>", re.S)
+
+
+def _taille_gzip(contenu):
+    return len(gzip.compress(contenu, compresslevel=6))
+
+
+def _lire_asset(url):
+    nom = url.split("?")[0]
+    if nom.startswith(settings.STATIC_URL) or nom.startswith("/" + settings.STATIC_URL):
+        nom = nom.split(settings.STATIC_URL.strip("/") + "/", 1)[1]
+    else:
+        return None
+
+    if staticfiles_storage.exists(nom):
+        with staticfiles_storage.open(nom) as f:
+            return f.read()
+
+    chemin = finders.find(nom)
+    if chemin:
+        with open(chemin, "rb") as f:
+            return f.read()
+    return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Poids des pages (octets) : tout inline non compressé (avant) vs HTML "
+        "gzip + bundles statiques (1re visite) vs HTML gzip seul (visites suivantes)."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            lignes = self._mesurer()
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"{'page':<12}{'html':>9}{'inline':>9}{'assets':>9}"
+            f"{'avant':>10}{'1re visite':>12}{'suivantes':>11}"
+        )
+        for ligne in lignes:
+            self.stdout.write(
+                f"{ligne['page']:<12}{ligne['html']:>9}{ligne['inline']:>9}{ligne['assets']:>9}"
+                f"{ligne['avant']:>10}{ligne['premiere']:>12}{ligne['suivantes']:>11}"
+            )
+
+    def _pages(self):
+        pages = [
+            ("home", reverse("home"), False),
+            ("login", reverse("login"), False),
+            ("register", reverse("register"), False),
+            ("accueil", reverse("accueil"), True),
+            ("fonds", reverse("fonds"), True),
+        ]
+        for type_produit, modele in (
+            ("licence", Licence),
+            ("service", ServiceImei),
+            ("service_general", Service),
+        ):
+            produit = modele.objects.only("pk").first()
+            if produit:
+                pages.append(
+                    ("commande", reverse("commande", args=[type_produit, produit.pk]), True)
+                )
+                break
+        return pages
+
+    def _mesurer(self):
+        hote = settings.ALLOWED_HOSTS[-1] if settings.ALLOWED_HOSTS else "localhost"
+        anonyme = Client(HTTP_HOST=hote)
+        connecte = Client(HTTP_HOST=hote)
+        connecte.force_login(
+            User.objects.create_user(username="__poids_pages__", email="poids@example.com")
+        )
+
+        lignes = []
+        for nom, url, prive in self._pages():
+            response = (connecte if prive else anonyme).get(url)
+            html = response.content
+            texte = html.decode("utf-8", "replace")
+
+            inline = sum(len(m.group(2).encode()) for m in RE_INLINE.finditer(texte))
+
+            assets_bruts = assets_gzip = 0
+            for m in RE_ASSET.finditer(texte):
+                contenu = _lire_asset(m.group("url"))
+                if contenu is not None:
+                    assets_bruts += len(contenu)
+                    assets_gzip += _taille_gzip(contenu)
+
+            html_gzip = _taille_gzip(html)
+            lignes.append({
+                "page": nom,
+                "html": len(html),
+                "inline": inline,
+                "assets": assets_bruts,
+                "avant": len(html) + assets_bruts,
+                "premiere": html_gzip + assets_gzip,
+                "suivantes": html_gzip,
+            })
+        return lignes
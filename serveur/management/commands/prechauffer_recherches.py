@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from serveur import recherche
+
+
+class Command(BaseCommand):
+    help = (
+        "Met en cache les résultats des recherches les plus fréquentes pour le catalogue "
+        "courant (sans effet si déjà fait pour cette version ; cron conseillé)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--nombre", type=int, default=None, help="Défaut : RECHERCHE_PRECHAUFFAGE")
+        parser.add_argument("--force", action="store_true", help="Recalculer même si déjà préchauffé")
+
+    def handle(self, *args, **options):
+        nombre = recherche.prechauffer(options["nombre"], force=options["force"])
+        if nombre:
+            self.stdout.write(self.style.SUCCESS(f"{nombre} recherche(s) préchauffée(s)."))
+        else:
+            self.stdout.write("Déjà préchauffé pour ce catalogue.")
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from serveur.models import RechercheStat
+
+
+class Command(BaseCommand):
+    help = "Recherches du catalogue les plus fréquentes, et celles qui ne trouvent rien."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--zero", action="store_true", help="Seulement les recherches sans résultat")
+        parser.add_argument("--jours", type=int, default=30, help="Recherches faites depuis N jours")
+        parser.add_argument("--limite", type=int, default=50)
+
+    def handle(self, *args, **options):
+        stats = RechercheStat.objects.filter(derniere__gte=timezone.now() - timedelta(days=options["jours"]))
+        if options["zero"]:
+            stats = stats.filter(resultats=0)
+            self.stdout.write("Recherches sans résultat (produits à ajouter ou à renommer ?) :")
+        else:
+            self.stdout.write("Recherches les plus fréquentes :")
+
+        lignes = stats.order_by("-nombre")[:options["limite"]]
+        for stat in lignes:
+            self.stdout.write(f"  {stat.nombre:>8}  {stat.terme}  ({stat.resultats} résultat(s))")
+        if not lignes:
+            self.stdout.write("  (aucune)")
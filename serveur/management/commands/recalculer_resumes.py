@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from serveur import compteurs
+
+
+class Command(BaseCommand):
+    help = "Recalcule les compteurs du tableau de bord (ResumeCompte) de tous les utilisateurs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="user_ids", help="Limiter à cet id (répétable)")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = compteurs.recalculer(options["user_ids"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"{total} résumé(s) recalculé(s)."))
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from serveur import tarifs
+
+
+class Command(BaseCommand):
+    help = (
+        "Révise les prix d'un ensemble de produits (pourcentage et/ou delta, "
+        "arrondi FCFA avec --pas) en un UPDATE par modèle. Aperçu seul sans --appliquer."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--type",
+            choices=list(tarifs.MODELES) + ["tous"],
+            default="tous",
+        )
+        parser.add_argument("--categorie", help="Nom exact de la catégorie")
+        parser.add_argument("--nom-contient", help="Filtre sur le nom du produit")
+        parser.add_argument("--prix-min", type=int)
+        parser.add_argument("--prix-max", type=int)
+        parser.add_argument("--pourcentage", type=float, default=0)
+        parser.add_argument("--delta", type=int, default=0)
+        parser.add_argument(
+            "--pas", type=int, default=tarifs.PAS_DEFAUT, help="Arrondi au multiple de (FCFA), aucun par défaut"
+        )
+        parser.add_argument("--arrondi", choices=list(tarifs.ARRONDIS), default="proche")
+        parser.add_argument("--appliquer", action="store_true")
+
+    def handle(self, *args, **options):
+        regle = {
+            "pourcentage": options["pourcentage"],
+            "delta": options["delta"],
+            "pas": options["pas"],
+            "arrondi": options["arrondi"],
+        }
+        if not regle["pourcentage"] and not regle["delta"] and regle["pas"] == 1:
+            raise CommandError("Rien à faire : précisez --pourcentage, --delta ou --pas.")
+
+        types = list(tarifs.MODELES) if options["type"] == "tous" else [options["type"]]
+
+        for type_produit in types:
+            queryset = tarifs.MODELES[type_produit].objects.all()
+            if options["categorie"]:
+                queryset = queryset.filter(category__nom=options["categorie"])
+            if options["nom_contient"]:
+                queryset = queryset.filter(nom__icontains=options["nom_contient"])
+            if options["prix_min"] is not None:
+                queryset = queryset.filter(prix__gte=options["prix_min"])
+            if options["prix_max"] is not None:
+                queryset = queryset.filter(prix__lte=options["prix_max"])
+
+            try:
+                apercu = tarifs.apercu(queryset, **regle)
+            except ValueError as exc:
+                raise CommandError(str(exc))
+
+            self.stdout.write(
+                f"{type_produit} : {apercu['nombre']} produit(s), "
+                f"total {apercu['avant']} → {apercu['apres']} FCFA"
+            )
+
+            if options["appliquer"] and apercu["nombre"]:
+                count = tarifs.appliquer(queryset, **regle)
+                self.stdout.write(self.style.SUCCESS(f"  {count} prix mis à jour"))
+
+        if not options["appliquer"]:
+            self.stdout.write("Aperçu uniquement (ajoutez --appliquer).")
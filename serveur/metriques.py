@@ -0,0 +1,195 @@
+"""
+Métriques au format texte Prometheus, tenues en mémoire du processus.
+
+Les compteurs et histogrammes sont incrémentés au fil des requêtes
+(MetriquesMiddleware, vues, backend e-mail) ; l'endpoint /metrics ne fait que
+les sérialiser. Seules les files d'attente (commandes / dépôts en attente)
+demandent une requête groupée, mise en cache quelques secondes.
+
+Derrière plusieurs workers gunicorn, chaque collecte tombe sur un processus
+différent : les séries propres au processus portent le label `worker` (pid),
+pour que Prometheus les suive séparément et les additionne, par exemple
+`sum without (worker) (rate(sk_http_requetes_total[5m]))`.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+
+BUCKETS_LATENCE = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _echapper(valeur):
+    return str(valeur).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _worker():
+    # lu à chaque collecte : le pid change après le fork des workers
+    return str(os.getpid())
+
+
+def _labels(noms, valeurs):
+    if not noms:
+        return ""
+    paires = ",".join(f'{nom}="{_echapper(valeur)}"' for nom, valeur in zip(noms, valeurs))
+    return "{" + paires + "}"
+
+
+class Compteur:
+    type = "counter"
+
+    def __init__(self, nom, aide, labels=()):
+        self.nom = nom
+        self.aide = aide
+        self.labels = tuple(labels)
+        self.valeurs = {}
+        self.verrou = threading.Lock()
+
+    def inc(self, valeur=1, **labels):
+        cle = tuple(labels.get(nom, "") for nom in self.labels)
+        with self.verrou:
+            self.valeurs[cle] = self.valeurs.get(cle, 0) + valeur
+
+    def lignes(self):
+        with self.verrou:
+            valeurs = sorted(self.valeurs.items())
+        noms = ("worker",) + self.labels
+        for cle, valeur in valeurs:
+            yield f"{self.nom}{_labels(noms, (_worker(),) + cle)} {valeur}"
+
+
+class Histogramme(Compteur):
+    type = "histogram"
+
+    def __init__(self, nom, aide, labels=(), buckets=BUCKETS_LATENCE):
+        super().__init__(nom, aide, labels)
+        self.buckets = tuple(buckets)
+
+    def observer(self, valeur, **labels):
+        cle = tuple(labels.get(nom, "") for nom in self.labels)
+        with self.verrou:
+            etat = self.valeurs.get(cle)
+            if etat is None:
+                etat = self.valeurs[cle] = [[0] * len(self.buckets), 0, 0.0]
+            index = bisect_left(self.buckets, valeur)
+            if index < len(self.buckets):
+                etat[0][index] += 1
+            etat[1] += 1
+            etat[2] += valeur
+
+    def lignes(self):
+        with self.verrou:
+            valeurs = sorted((cle, ([*e[0]], e[1], e[2])) for cle, e in self.valeurs.items())
+        noms = ("worker",) + self.labels
+        for cle, (comptes, total, somme) in valeurs:
+            cle = (_worker(),) + cle
+            cumul = 0
+            for borne, nombre in zip(self.buckets, comptes):
+                cumul += nombre
+                yield f"{self.nom}_bucket{_labels(noms + ('le',), cle + (borne,))} {cumul}"
+            yield f"{self.nom}_bucket{_labels(noms + ('le',), cle + ('+Inf',))} {total}"
+            yield f"{self.nom}_sum{_labels(noms, cle)} {round(somme, 6)}"
+            yield f"{self.nom}_count{_labels(noms, cle)} {total}"
+
+
+# =========================
+# REGISTRE
+# =========================
+REQUETES_DUREE = Histogramme(
+    "sk_http_duree_secondes", "Durée des requêtes HTTP par vue", ("vue", "methode")
+)
+REQUETES = Compteur("sk_http_requetes_total", "Requêtes HTTP par vue et code", ("vue", "code"))
+DB_REQUETES = Compteur("sk_db_requetes_total", "Requêtes SQL exécutées, par vue", ("vue",))
+DB_REQUETES_PAR_HTTP = Histogramme(
+    "sk_db_requetes_par_requete_http",
+    "Nombre de requêtes SQL par requête HTTP",
+    ("vue",),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 250),
+)
+
+COMMANDES = Compteur("sk_commandes_creees_total", "Commandes créées", ("type",))
+DEPOTS = Compteur("sk_depots_demandes_total", "Demandes d'ajout de fonds", ("methode",))
+
+EMAILS_DUREE = Histogramme("sk_email_duree_secondes", "Durée d'envoi des e-mails (SMTP)")
+EMAILS = Compteur("sk_emails_total", "E-mails envoyés / en échec", ("resultat",))
+
+REGISTRE = [
+    REQUETES_DUREE,
+    REQUETES,
+    DB_REQUETES,
+    DB_REQUETES_PAR_HTTP,
+    COMMANDES,
+    DEPOTS,
+    EMAILS_DUREE,
+    EMAILS,
+]
+
+DEMARRAGE = time.time()
+
+
+# =========================
+# FILES D'ATTENTE (REQUÊTE GROUPÉE, EN CACHE)
+# =========================
+def files_attente():
+    """{'commandes': {type: n}, 'depots': {methode: n}} mis en cache quelques secondes."""
+    from .models import Commande, Transaction
+
+    cle = "metriques:files_attente"
+    files = cache.get(cle)
+    if files is None:
+        files = {
+            "commandes": dict(
+                Commande.objects.filter(statut="attente")
+                .values_list("type_commande")
+                .annotate(n=Count("pk"))
+                .order_by()
+            ),
+            "depots": dict(
+                Transaction.objects.filter(statut="attente")
+                .values_list("methode")
+                .annotate(n=Count("pk"))
+                .order_by()
+            ),
+        }
+        cache.set(cle, files, getattr(settings, "METRIQUES_TTL_FILES", 30))
+    return files
+
+
+def exposition():
+    """Texte au format d'exposition Prometheus (version 0.0.4)."""
+    from .limiteur import compteurs_rejets, seaux_locaux
+
+    lignes = []
+    for metrique in REGISTRE:
+        lignes.append(f"# HELP {metrique.nom} {metrique.aide}")
+        lignes.append(f"# TYPE {metrique.nom} {metrique.type}")
+        lignes.extend(metrique.lignes())
+
+    files = files_attente()
+    lignes.append("# HELP sk_commandes_attente Commandes en attente, par type")
+    lignes.append("# TYPE sk_commandes_attente gauge")
+    for type_commande, nombre in sorted(files["commandes"].items()):
+        lignes.append(f"sk_commandes_attente{_labels(('type',), (type_commande,))} {nombre}")
+
+    lignes.append("# HELP sk_depots_attente Dépôts en attente, par méthode")
+    lignes.append("# TYPE sk_depots_attente gauge")
+    for methode, nombre in sorted(files["depots"].items()):
+        lignes.append(f"sk_depots_attente{_labels(('methode',), (methode,))} {nombre}")
+
+    lignes.append("# HELP sk_limiteur_rejets_total Requêtes refusées (429) par vue et portée")
+    lignes.append("# TYPE sk_limiteur_rejets_total counter")
+    # sans Redis, les rejets sont comptés par processus eux aussi
+    noms, prefixe = (("worker", "vue", "portee"), (_worker(),)) if seaux_locaux() else (("vue", "portee"), ())
+    for (vue, portee), nombre in sorted(compteurs_rejets().items()):
+        lignes.append(f"sk_limiteur_rejets_total{_labels(noms, prefixe + (vue, portee))} {nombre}")
+
+    lignes.append("# HELP sk_processus_demarrage_timestamp Démarrage du processus (epoch)")
+    lignes.append("# TYPE sk_processus_demarrage_timestamp gauge")
+    lignes.append(f"sk_processus_demarrage_timestamp{_labels(('worker',), (_worker(),))} {int(DEMARRAGE)}")
+
+    return "\n".join(lignes) + "\n"
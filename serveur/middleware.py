@@ -0,0 +1,178 @@
+import asyncio
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.db import connections
+from django.middleware.gzip import GZipMiddleware
+from django.utils.functional import SimpleLazyObject
+
+from . import metriques, profilage, routage
+from .comptes import Compte
+
+
+# =========================
+# MÉTRIQUES (LATENCE / SQL PAR VUE)
+# =========================
+class MetriquesMiddleware:
+    """Durée et nombre de requêtes SQL de chaque requête, par nom d'URL."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        nombre_sql = [0]
+
+        def compter(execute, sql, params, many, context):
+            nombre_sql[0] += 1
+            return execute(sql, params, many, context)
+
+        debut = time.perf_counter()
+        with ExitStack() as pile:
+            # principal + réplicas éventuels
+            for alias in connections:
+                pile.enter_context(connections[alias].execute_wrapper(compter))
+            response = self.get_response(request)
+        duree = time.perf_counter() - debut
+
+        match = getattr(request, "resolver_match", None)
+        vue = (match.url_name or match.view_name) if match else "non_resolu"
+
+        metriques.REQUETES_DUREE.observer(duree, vue=vue, methode=request.method)
+        metriques.REQUETES.inc(vue=vue, code=response.status_code)
+        metriques.DB_REQUETES.inc(nombre_sql[0], vue=vue)
+        metriques.DB_REQUETES_PAR_HTTP.observer(nombre_sql[0], vue=vue)
+        return response
+
+
+# =========================
+# RÉPLICAS EN LECTURE (ROUTAGE PAR REQUÊTE)
+# =========================
+class RoutageMiddleware:
+    """Autorise les réplicas pour les lectures ; POST → principal + cookie sticky."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with routage.replicas_autorises(routage.requete_eligible(request)):
+            response = self.get_response(request)
+
+        if request.method not in ("GET", "HEAD", "OPTIONS") and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                routage.COOKIE_STICKY,
+                "1",
+                max_age=settings.REPLICA_STICKY_SECONDES,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+
+# =========================
+# COMPRESSION (TEXTE UNIQUEMENT)
+# =========================
+class CompressionTexteMiddleware(GZipMiddleware):
+    """GZip des réponses HTML / JSON / texte ; les images sont déjà compressées."""
+
+    TYPES_COMPRESSIBLES = ("text/", "application/json", "application/javascript")
+
+    def process_response(self, request, response):
+        type_contenu = response.get("Content-Type", "")
+        # text/event-stream : gzip retiendrait les événements en tampon
+        if not type_contenu.startswith(self.TYPES_COMPRESSIBLES) or type_contenu.startswith("text/event-stream"):
+            return response
+        return super().process_response(request, response)
+
+
+# =========================
+# COMPTE (request.account)
+# =========================
+class CompteMiddleware:
+    """request.account : user, wallet et résumé, chargés paresseusement."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    ANCIEN_BACKEND = "django.contrib.auth.backends.ModelBackend"
+    BACKEND = "serveur.comptes.CompteBackend"
+
+    def __call__(self, request):
+        # sessions ouvertes avant CompteBackend : on les garde connectées
+        if request.session.get(BACKEND_SESSION_KEY) == self.ANCIEN_BACKEND:
+            request.session[BACKEND_SESSION_KEY] = self.BACKEND
+
+        request.account = SimpleLazyObject(lambda: Compte(request.user))
+        return self.get_response(request)
+
+
+# =========================
+# PROFILAGE À LA DEMANDE (cProfile)
+# =========================
+class ProfilageMiddleware:
+    """
+    Profile la vue sur demande du staff (en-tête X-Profilage: 1) ou par
+    échantillonnage ; voir profilage.py. Placé après l'authentification.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        profil = getattr(request, "_profilage", None)
+        if profil is None:
+            return response
+
+        capture, pile, sql, motif = profil
+        duree, cpu = capture.arreter()
+        pile.close()
+
+        match = request.resolver_match
+        ident = profilage.enregistrer(capture.profil, {
+            "vue": match.url_name or match.view_name,
+            "chemin": request.get_full_path()[:500],
+            "methode": request.method,
+            "code": response.status_code,
+            "user": request.user.get_username() if request.user.is_authenticated else "",
+            "motif": motif,
+            "duree_ms": round(duree * 1000, 1),
+            "cpu_ms": round(cpu * 1000, 1),
+            "sql": sql["nombre"],
+            "sql_ms": round(sql["duree"] * 1000, 1),
+        })
+        if ident and motif == "entete":
+            response["X-Profilage-Id"] = ident
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # vues async (flux d'événements) : hors du thread profilé
+        if asyncio.iscoroutinefunction(view_func):
+            return None
+
+        match = request.resolver_match
+        motif = profilage.raison(request, match.url_name or match.view_name)
+        if motif is None:
+            return None
+
+        capture = profilage.Capture()
+        if not capture.demarrer():
+            return None
+
+        sql = {"nombre": 0, "duree": 0.0}
+
+        def mesurer(execute, requete, params, many, context):
+            debut = time.perf_counter()
+            try:
+                return execute(requete, params, many, context)
+            finally:
+                sql["nombre"] += 1
+                sql["duree"] += time.perf_counter() - debut
+
+        pile = ExitStack()
+        for alias in connections:
+            pile.enter_context(connections[alias].execute_wrapper(mesurer))
+        request._profilage = (capture, pile, sql, motif)
+        return None
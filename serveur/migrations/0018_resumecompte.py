@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-19 12:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('serveur', '0017_alter_paymentconfig_methode_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumeCompte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('commandes_attente', models.PositiveIntegerField(default=0)),
+                ('commandes_succes', models.PositiveIntegerField(default=0)),
+                ('commandes_echec', models.PositiveIntegerField(default=0)),
+                ('total_depense', models.PositiveIntegerField(default=0)),
+                ('depots_attente', models.PositiveIntegerField(default=0)),
+                ('total_depose', models.PositiveIntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='resume', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
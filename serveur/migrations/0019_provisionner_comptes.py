@@ -0,0 +1,59 @@
+from django.db import migrations
+from django.db.models import Count, Q, Sum
+
+
+def provisionner_comptes(apps, schema_editor):
+    """Wallet et résumé pour les utilisateurs qui n'en ont pas encore."""
+    User = apps.get_model("auth", "User")
+    Wallet = apps.get_model("serveur", "Wallet")
+    ResumeCompte = apps.get_model("serveur", "ResumeCompte")
+    Commande = apps.get_model("serveur", "Commande")
+    Transaction = apps.get_model("serveur", "Transaction")
+
+    sans_wallet = User.objects.filter(wallet__isnull=True).values_list("pk", flat=True)
+    Wallet.objects.bulk_create(
+        [Wallet(user_id=pk) for pk in sans_wallet.iterator()],
+        batch_size=1000,
+    )
+
+    resumes = {
+        pk: ResumeCompte(user_id=pk)
+        for pk in User.objects.filter(resume__isnull=True).values_list("pk", flat=True).iterator()
+    }
+
+    for ligne in Commande.objects.values("user_id").annotate(
+        attente=Count("pk", filter=Q(statut="attente")),
+        succes=Count("pk", filter=Q(statut="succes")),
+        echec=Count("pk", filter=Q(statut="refuse")),
+        depense=Sum("prix", filter=Q(statut="succes")),
+    ).order_by():
+        resume = resumes.get(ligne["user_id"])
+        if resume is None:
+            continue
+        resume.commandes_attente = ligne["attente"]
+        resume.commandes_succes = ligne["succes"]
+        resume.commandes_echec = ligne["echec"]
+        resume.total_depense = ligne["depense"] or 0
+
+    for ligne in Transaction.objects.values("user_id").annotate(
+        attente=Count("pk", filter=Q(statut="attente")),
+        depose=Sum("montant", filter=Q(statut="valide")),
+    ).order_by():
+        resume = resumes.get(ligne["user_id"])
+        if resume is None:
+            continue
+        resume.depots_attente = ligne["attente"]
+        resume.total_depose = ligne["depose"] or 0
+
+    ResumeCompte.objects.bulk_create(resumes.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('serveur', '0018_resumecompte'),
+    ]
+
+    operations = [
+        migrations.RunPython(provisionner_comptes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0.1 on 2026-10-19 14:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('serveur', '0019_provisionner_comptes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('commande', 'Commande'), ('depot', 'Dépôt')], max_length=20)),
+                ('libelle', models.CharField(max_length=200)),
+                ('montant', models.PositiveIntegerField()),
+                ('details', models.TextField()),
+                ('date', models.DateTimeField(auto_now_add=True)),
+                ('immediate', models.BooleanField(default=False)),
+                ('envoyee_le', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-19 15:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('serveur', '0020_notification'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JetonAPI',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(blank=True, max_length=100)),
+                ('empreinte', models.CharField(editable=False, max_length=64, unique=True)),
+                ('prefixe', models.CharField(editable=False, max_length=12)),
+                ('actif', models.BooleanField(default=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('dernier_usage', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jetons_api', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-19 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('serveur', '0021_jetonapi'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='commande',
+            name='appareil_marque',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='commande',
+            name='appareil_modele',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
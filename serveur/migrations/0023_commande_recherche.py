@@ -0,0 +1,100 @@
+# Generated by Django 6.0.1 on 2026-10-19 16:10
+
+import re
+
+from django.db import migrations, models, transaction
+
+
+SEPARATEURS = re.compile(r"[\s\-./]")
+
+# Index PostgreSQL des recherches insensibles à la casse : Django compare
+# UPPER("colonne"::text), l'index doit porter sur la même expression.
+INDEX_PREFIXE = [
+    "CREATE INDEX IF NOT EXISTS serveur_commande_email_upper_like "
+    "ON serveur_commande (UPPER(email::text) text_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS serveur_commande_username_upper_like "
+    "ON serveur_commande (UPPER(username_service::text) text_pattern_ops)",
+]
+INDEX_TRIGRAMMES = [
+    "CREATE INDEX IF NOT EXISTS serveur_commande_email_trgm "
+    "ON serveur_commande USING gin (UPPER(email::text) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS serveur_commande_username_trgm "
+    "ON serveur_commande USING gin (UPPER(username_service::text) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS serveur_commande_imei_trgm "
+    "ON serveur_commande USING gin (imei_normalise gin_trgm_ops)",
+]
+NOMS = [
+    "serveur_commande_email_upper_like",
+    "serveur_commande_username_upper_like",
+    "serveur_commande_email_trgm",
+    "serveur_commande_username_trgm",
+    "serveur_commande_imei_trgm",
+]
+
+
+def remplir_imei_normalise(apps, schema_editor):
+    Commande = apps.get_model("serveur", "Commande")
+    lot = []
+    commandes = Commande.objects.exclude(imei__isnull=True).exclude(imei="").only("id", "imei")
+    for commande in commandes.iterator(2000):
+        commande.imei_normalise = SEPARATEURS.sub("", commande.imei)
+        lot.append(commande)
+        if len(lot) >= 2000:
+            Commande.objects.bulk_update(lot, ["imei_normalise"])
+            lot = []
+    Commande.objects.bulk_update(lot, ["imei_normalise"])
+
+
+def creer_index_postgresql(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for sql in INDEX_PREFIXE:
+        schema_editor.execute(sql)
+
+    # pg_trgm demande parfois des droits que l'utilisateur n'a pas :
+    # la recherche se limite alors à l'égalité et au préfixe
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except Exception:
+        return
+    for sql in INDEX_TRIGRAMMES:
+        schema_editor.execute(sql)
+
+
+def supprimer_index_postgresql(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for nom in NOMS:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {nom}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('serveur', '0022_commande_appareil'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='commande',
+            name='imei_normalise',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='commande',
+            name='email',
+            field=models.EmailField(db_index=True, max_length=254),
+        ),
+        migrations.AlterField(
+            model_name='commande',
+            name='username_service',
+            field=models.CharField(db_index=True, max_length=150),
+        ),
+        migrations.RunPython(remplir_imei_normalise, migrations.RunPython.noop),
+        migrations.RunPython(creer_index_postgresql, supprimer_index_postgresql),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-19 16:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('serveur', '0023_commande_recherche'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='commande',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
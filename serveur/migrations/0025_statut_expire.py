@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('serveur', '0024_version_statut'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='commande',
+            name='statut',
+            field=models.CharField(choices=[('attente', 'En attente'), ('succes', 'Succès'), ('refuse', 'Refusée'), ('expire', 'Expirée')], default='attente', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='historique',
+            name='statut',
+            field=models.CharField(choices=[('succes', 'Succès'), ('echec', 'Échec'), ('expire', 'Expirée')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='statut',
+            field=models.CharField(choices=[('attente', 'En attente'), ('valide', 'Validée'), ('refuse', 'Refusée'), ('expire', 'Expirée')], default='attente', max_length=20),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('serveur', '0025_statut_expire'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointControle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=50, unique=True)),
+                ('position', models.DateTimeField(blank=True, null=True)),
+                ('ecarts', models.JSONField(blank=True, default=list)),
+                ('date_maj', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='commande',
+            name='date_maj',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='date_maj',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='wallet',
+            name='date_maj',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('serveur', '0026_audit_wallets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntreeJournal',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('type', models.CharField(choices=[('commande.creee', 'Commande créée'), ('commande.validee', 'Commande validée'), ('commande.refusee', 'Commande refusée'), ('commande.expiree', 'Commande expirée'), ('depot.demande', 'Dépôt demandé'), ('depot.valide', 'Dépôt validé'), ('depot.refuse', 'Dépôt refusé'), ('depot.expire', 'Dépôt expiré'), ('wallet.credit', 'Wallet crédité'), ('wallet.debit', 'Wallet débité'), ('wallet.ajustement', 'Wallet ajusté (admin)')], max_length=30)),
+                ('user_id', models.IntegerField()),
+                ('objet_id', models.BigIntegerField(blank=True, null=True)),
+                ('montant', models.BigIntegerField(default=0)),
+                ('donnees', models.JSONField(blank=True, default=dict)),
+                ('date', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='pointcontrole',
+            name='curseur',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
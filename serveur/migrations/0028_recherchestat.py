@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-19 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('serveur', '0027_journal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RechercheStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('terme', models.CharField(max_length=100, unique=True)),
+                ('nombre', models.PositiveIntegerField(db_index=True, default=0)),
+                ('resultats', models.PositiveIntegerField(default=0)),
+                ('derniere', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
 
+from .imei import normaliser as normaliser_imei
+
 
 # =========================
 # CATEGORY
@@ -61,11 +63,36 @@ class ServiceImei(models.Model):
 class Wallet(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     solde = models.PositiveIntegerField(default=0)
+    # mis à jour aussi par les UPDATE directs (comptes.py) : audit incrémental
+    date_maj = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"{self.user.username} - {self.solde} FCFA"
 
 
+# =========================
+# RÉSUMÉ DU COMPTE (COMPTEURS DU TABLEAU DE BORD)
+# =========================
+class ResumeCompte(models.Model):
+    """
+    Compteurs par utilisateur, tenus à jour par incréments (F()) lors des
+    commandes, dépôts et actions admin. Recalcul complet :
+    `manage.py recalculer_resumes`.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="resume")
+
+    commandes_attente = models.PositiveIntegerField(default=0)
+    commandes_succes = models.PositiveIntegerField(default=0)
+    commandes_echec = models.PositiveIntegerField(default=0)
+    total_depense = models.PositiveIntegerField(default=0)
+
+    depots_attente = models.PositiveIntegerField(default=0)
+    total_depose = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.commandes_attente} en attente"
+
+
 # =========================
 # TRANSACTION
 # =========================
@@ -90,11 +117,15 @@ class Transaction(models.Model):
             ('attente', 'En attente'),
             ('valide', 'Validée'),
             ('refuse', 'Refusée'),
+            ('expire', 'Expirée'),
         ],
         default='attente'
     )
+    # incrémentée à chaque changement de statut (voir transitions.py)
+    version = models.PositiveIntegerField(default=0, editable=False)
 
     date = models.DateTimeField(auto_now_add=True)
+    date_maj = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"{self.user.username} - {self.montant} FCFA"
@@ -115,14 +146,15 @@ class Commande(models.Model):
         ('attente', 'En attente'),
         ('succes', 'Succès'),
         ('refuse', 'Refusée'),
+        ('expire', 'Expirée'),
     ]
 
     type_commande = models.CharField(max_length=20, choices=TYPE_CHOIX)
     nom_produit = models.CharField(max_length=200)
     prix = models.PositiveIntegerField()
 
-    email = models.EmailField()
-    username_service = models.CharField(max_length=150)
+    email = models.EmailField(db_index=True)
+    username_service = models.CharField(max_length=150, db_index=True)
 
     # 🔐 Spécifique aux services IMEI
     imei = models.CharField(
@@ -132,6 +164,13 @@ class Commande(models.Model):
         help_text="IMEI du téléphone (uniquement pour service IMEI)"
     )
 
+    # 🔎 IMEI sans séparateurs, indexé pour la recherche du support
+    imei_normalise = models.CharField(max_length=20, blank=True, default="", db_index=True, editable=False)
+
+    # 📱 Appareil identifié par le TAC de l'IMEI (index local)
+    appareil_marque = models.CharField(max_length=100, blank=True, default="")
+    appareil_modele = models.CharField(max_length=100, blank=True, default="")
+
     photo_lien = models.URLField(
         max_length=1000,
         blank=True,
@@ -144,8 +183,18 @@ class Commande(models.Model):
         choices=STATUT_CHOIX,
         default='attente'
     )
+    # incrémentée à chaque changement de statut (voir transitions.py)
+    version = models.PositiveIntegerField(default=0, editable=False)
 
     date = models.DateTimeField(auto_now_add=True)
+    date_maj = models.DateTimeField(auto_now=True, db_index=True)
+
+    def save(self, *args, **kwargs):
+        # bulk_create ne passe pas ici : commandes.preparer remplit déjà le champ
+        self.imei_normalise = normaliser_imei(self.imei)
+        if kwargs.get("update_fields") is not None and "imei" in kwargs["update_fields"]:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "imei_normalise"}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.user.username} - {self.nom_produit} ({self.statut})"
@@ -164,6 +213,7 @@ class Historique(models.Model):
         choices=[
             ('succes', 'Succès'),
             ('echec', 'Échec'),
+            ('expire', 'Expirée'),
         ]
     )
 
@@ -309,3 +359,124 @@ class Service(models.Model):
 
 
 
+# =========================
+# NOTIFICATIONS ADMIN (DIGEST)
+# =========================
+class Notification(models.Model):
+    """
+    Événement à signaler à ADMIN_EMAIL (commande, dépôt). Regroupés dans un
+    e-mail récapitulatif par fenêtre (`manage.py envoyer_digest`), sauf les
+    montants élevés envoyés tout de suite.
+    """
+    TYPE_CHOICES = [
+        ("commande", "Commande"),
+        ("depot", "Dépôt"),
+    ]
+
+    type = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    libelle = models.CharField(max_length=200)  # produit ou méthode de paiement
+    montant = models.PositiveIntegerField()
+    details = models.TextField()
+
+    date = models.DateTimeField(auto_now_add=True)
+    immediate = models.BooleanField(default=False)
+    envoyee_le = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.get_type_display()} - {self.libelle} - {self.montant} FCFA"
+
+
+# =========================
+# API REVENDEURS (JETONS)
+# =========================
+class JetonAPI(models.Model):
+    """Jeton d'accès à l'API JSON ; seule l'empreinte SHA-256 est stockée."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="jetons_api")
+    nom = models.CharField(max_length=100, blank=True)
+
+    empreinte = models.CharField(max_length=64, unique=True, editable=False)
+    prefixe = models.CharField(max_length=12, editable=False)  # pour le reconnaître dans l'admin
+
+    actif = models.BooleanField(default=True)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    dernier_usage = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.prefixe}…"
+
+
+# =========================
+# POINTS DE CONTRÔLE (TRAITEMENTS INCRÉMENTAUX)
+# =========================
+class PointControle(models.Model):
+    """
+    Position atteinte par un traitement périodique (ex. audit des wallets) :
+    le passage suivant ne relit que les lignes modifiées depuis.
+    """
+    nom = models.CharField(max_length=50, unique=True)
+    position = models.DateTimeField(null=True, blank=True)
+    # dernier id traité (lecture d'une table en ajout seul, ex. journal)
+    curseur = models.PositiveBigIntegerField(default=0)
+    # à revoir au passage suivant : utilisateurs en écart (audit),
+    # ids sautés sous le curseur (journal)
+    ecarts = models.JSONField(default=list, blank=True)
+    date_maj = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.nom} : {self.position}"
+
+
+# =========================
+# JOURNAL DES CHANGEMENTS (AJOUT SEUL)
+# =========================
+class EntreeJournal(models.Model):
+    """
+    Un changement d'état (commande, dépôt, wallet), écrit dans la même
+    transaction que le changement lui-même. Jamais modifié ni supprimé :
+    exporté en JSONL par `manage.py exporter_journal` pour les outils
+    d'analyse et de comptabilité, qui n'interrogent plus les tables vivantes.
+    """
+    TYPE_CHOICES = [
+        ("commande.creee", "Commande créée"),
+        ("commande.validee", "Commande validée"),
+        ("commande.refusee", "Commande refusée"),
+        ("commande.expiree", "Commande expirée"),
+        ("depot.demande", "Dépôt demandé"),
+        ("depot.valide", "Dépôt validé"),
+        ("depot.refuse", "Dépôt refusé"),
+        ("depot.expire", "Dépôt expiré"),
+        ("wallet.credit", "Wallet crédité"),
+        ("wallet.debit", "Wallet débité"),
+        ("wallet.ajustement", "Wallet ajusté (admin)"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    type = models.CharField(max_length=30, choices=TYPE_CHOICES)
+    # pas de clé étrangère : l'historique survit à la suppression d'un compte
+    user_id = models.IntegerField()
+    objet_id = models.BigIntegerField(null=True, blank=True)  # commande ou dépôt
+    montant = models.BigIntegerField(default=0)  # FCFA, signé pour les ajustements
+    donnees = models.JSONField(default=dict, blank=True)
+    date = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"#{self.id} {self.type} user={self.user_id} {self.montant} FCFA"
+
+
+# =========================
+# STATISTIQUES DE RECHERCHE (CATALOGUE)
+# =========================
+class RechercheStat(models.Model):
+    """
+    Une recherche du catalogue (terme normalisé). `nombre` est une estimation
+    (recherches échantillonnées, voir RECHERCHE_ECHANTILLON) ; `resultats` le
+    nombre de produits trouvés à la dernière mesure.
+    """
+    terme = models.CharField(max_length=100, unique=True)
+    nombre = models.PositiveIntegerField(default=0, db_index=True)
+    resultats = models.PositiveIntegerField(default=0)
+    derniere = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.terme} ({self.nombre})"
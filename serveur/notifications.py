@@ -0,0 +1,192 @@
+"""
+Notifications de l'admin (ADMIN_EMAIL) : un récapitulatif par fenêtre.
+
+Chaque commande / dépôt est enregistré dans Notification. Le
+récapitulatif part dès que l'événement le plus ancien non envoyé a dépassé
+NOTIFICATIONS_FENETRE_MINUTES : au prochain événement, ou via
+`manage.py envoyer_digest` (cron) pour les périodes calmes. Les montants
+supérieurs ou égaux à NOTIFICATIONS_SEUIL_IMMEDIAT partent tout de suite.
+Avec NOTIFICATIONS_DIGEST=False, on garde un e-mail par événement.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import Count, Min, Sum
+from django.utils import timezone
+
+from .models import Notification
+
+
+logger = logging.getLogger(__name__)
+
+VERROU = "notifications:digest"
+
+DETAILS_MAX = 50
+
+
+def _envoyer(sujet, message):
+    send_mail(
+        subject=sujet,
+        message=message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[settings.ADMIN_EMAIL],
+        fail_silently=False,
+    )
+
+
+def _fenetre():
+    return timedelta(minutes=settings.NOTIFICATIONS_FENETRE_MINUTES)
+
+
+# =========================
+# ENREGISTREMENT D'UN ÉVÉNEMENT
+# =========================
+def notifier(type, user, libelle, montant, sujet, details):
+    """Envoie tout de suite (mode direct / gros montant) ou met en attente du digest."""
+    notifier_plusieurs(type, user, [
+        {"libelle": libelle, "montant": montant, "sujet": sujet, "details": details}
+    ])
+
+
+def notifier_plusieurs(type, user, evenements):
+    """
+    Même chose pour un lot (commandes en masse) : une seule insertion.
+    `evenements` : [{"libelle", "montant", "sujet", "details"}, ...].
+    Les e-mails partent après le commit de la transaction courante.
+    """
+    if not settings.NOTIFICATIONS_DIGEST:
+        for evenement in evenements:
+            _envoyer_apres_commit(evenement["sujet"], evenement["details"])
+        return
+
+    maintenant = timezone.now()
+    lignes = []
+    for evenement in evenements:
+        immediate = evenement["montant"] >= settings.NOTIFICATIONS_SEUIL_IMMEDIAT
+        lignes.append(Notification(
+            type=type,
+            user=user,
+            libelle=evenement["libelle"],
+            montant=evenement["montant"],
+            details=evenement["details"],
+            immediate=immediate,
+            envoyee_le=maintenant if immediate else None,
+        ))
+        if immediate:
+            _envoyer_apres_commit(f"⚡ {evenement['sujet']}", evenement["details"])
+    Notification.objects.bulk_create(lignes)
+
+    # digest échu ? on l'envoie après le commit de la requête courante
+    transaction.on_commit(envoyer_si_echu)
+
+
+def _envoyer_apres_commit(sujet, message):
+    def envoyer():
+        try:
+            _envoyer(sujet, message)
+        except Exception:
+            logger.exception("Notification admin non envoyée : %s", sujet)
+
+    transaction.on_commit(envoyer)
+
+
+def envoyer_si_echu():
+    try:
+        return envoyer_digest()
+    except Exception:
+        # la requête du client ne doit pas échouer : le cron réessaiera
+        logger.exception("Envoi du digest admin impossible")
+        return 0
+
+
+# =========================
+# RÉCAPITULATIF
+# =========================
+def envoyer_digest(force=False):
+    """
+    Envoie un e-mail pour tous les événements en attente si la fenêtre est
+    échue (ou `force`). Retourne le nombre d'événements regroupés.
+    """
+    attente = Notification.objects.filter(envoyee_le__isnull=True)
+
+    if not force:
+        plus_ancien = attente.aggregate(d=Min("date"))["d"]
+        if plus_ancien is None or timezone.now() - plus_ancien < _fenetre():
+            return 0
+
+    # un seul envoi à la fois, tous workers confondus
+    if not cache.add(VERROU, 1, 300):
+        return 0
+    try:
+        maintenant = timezone.now()
+        ids = list(attente.filter(date__lte=maintenant).values_list("id", flat=True))
+        if not ids:
+            return 0
+
+        # réservation : une ligne déjà réservée par un autre envoi est ignorée
+        lot = Notification.objects.filter(id__in=ids, envoyee_le__isnull=True)
+        if lot.update(envoyee_le=maintenant) == 0:
+            return 0
+        lot = Notification.objects.filter(id__in=ids, envoyee_le=maintenant)
+
+        try:
+            sujet, message, nombre = _recapitulatif(lot)
+            _envoyer(sujet, message)
+        except Exception:
+            lot.update(envoyee_le=None)
+            raise
+        return nombre
+    finally:
+        cache.delete(VERROU)
+
+
+def _recapitulatif(lot):
+    groupes = (
+        lot.values("type", "libelle")
+        .annotate(nombre=Count("id"), total=Sum("montant"))
+        .order_by("type", "-total")
+    )
+    totaux = {
+        ligne["type"]: ligne
+        for ligne in lot.values("type").annotate(nombre=Count("id"), total=Sum("montant")).order_by()
+    }
+    periode = lot.aggregate(debut=Min("date"))["debut"]
+
+    commandes = totaux.get("commande", {"nombre": 0, "total": 0})
+    depots = totaux.get("depot", {"nombre": 0, "total": 0})
+    nombre = commandes["nombre"] + depots["nombre"]
+
+    lignes = [
+        f"Depuis le {timezone.localtime(periode):%d/%m/%Y %H:%M}",
+        "",
+        f"🛒 COMMANDES : {commandes['nombre']} — {commandes['total'] or 0} FCFA",
+    ]
+    lignes += [
+        f"  • {g['libelle']} : {g['nombre']} — {g['total']} FCFA"
+        for g in groupes if g["type"] == "commande"
+    ]
+    lignes += ["", f"💰 DÉPÔTS : {depots['nombre']} — {depots['total'] or 0} FCFA"]
+    lignes += [
+        f"  • {g['libelle']} : {g['nombre']} — {g['total']} FCFA"
+        for g in groupes if g["type"] == "depot"
+    ]
+
+    # champs de chaque commande / dépôt (email, IMEI, référence...) : ceux
+    # qu'aurait contenus l'e-mail individuel
+    lignes += ["", "--- DÉTAIL ---"]
+    for notification in lot.select_related("user").order_by("date")[:DETAILS_MAX]:
+        lignes.append(
+            f"{timezone.localtime(notification.date):%H:%M} {notification.get_type_display()} "
+            f"{notification.user.username} : {notification.libelle} — {notification.montant} FCFA"
+        )
+        lignes += [f"    {ligne}" for ligne in notification.details.splitlines() if ligne.strip()]
+        lignes.append("")
+    if nombre > DETAILS_MAX:
+        lignes.append(f"… et {nombre - DETAILS_MAX} autre(s) (voir l'admin)")
+
+    sujet = f"📋 SK Serveur : {commandes['nombre']} commande(s), {depots['nombre']} dépôt(s)"
+    return sujet, "\n".join(lignes), nombre
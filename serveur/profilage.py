@@ -0,0 +1,189 @@
+"""
+Profilage à la demande des requêtes en production (cProfile).
+
+Une requête est profilée si un membre du staff envoie l'en-tête
+`X-Profilage: 1`, ou par tirage sur PROFILAGE_ECHANTILLON (0 = jamais),
+limité aux vues de PROFILAGE_VUES si la liste n'est pas vide.
+
+Chaque profil est écrit dans PROFILAGE_DIR : `<id>.prof` (format pstats,
+lisible par snakeviz / `python -m pstats`) puis `<id>.json` (vue, chemin,
+utilisateur, durées, SQL), qui marque le profil comme complet. Le dossier est
+un anneau : au-delà de PROFILAGE_MAX profils, les plus anciens sont supprimés.
+
+Un seul profil à la fois par processus : cProfile ne supporte pas deux
+profileurs actifs, les requêtes tirées pendant ce temps passent sans profil.
+"""
+import cProfile
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+ENTETE = "HTTP_X_PROFILAGE"
+IDENT = re.compile(r"^\d{20}-\d+$")
+FONCTIONS_MAX = 50
+
+_verrou = threading.Lock()
+
+
+def _dossier():
+    dossier = Path(settings.PROFILAGE_DIR)
+    dossier.mkdir(parents=True, exist_ok=True)
+    return dossier
+
+
+# =========================
+# DÉCISION
+# =========================
+def raison(request, vue):
+    """"entete", "echantillon" ou None (pas de profil pour cette requête)."""
+    if request.META.get(ENTETE) == "1" and request.user.is_staff:
+        return "entete"
+
+    taux = settings.PROFILAGE_ECHANTILLON
+    if taux > 0 and (not settings.PROFILAGE_VUES or vue in settings.PROFILAGE_VUES) and random.random() < taux:
+        return "echantillon"
+    return None
+
+
+# =========================
+# CAPTURE
+# =========================
+class Capture:
+    """Profileur cProfile d'une requête ; `demarrer` est faux si un autre tourne déjà."""
+
+    def __init__(self):
+        self.profil = None
+        self.debut = self.debut_cpu = 0
+
+    def demarrer(self):
+        if not _verrou.acquire(blocking=False):
+            return False
+        try:
+            self.profil = cProfile.Profile()
+            self.profil.enable()
+        except ValueError:
+            # autre outil de profilage déjà actif (débogueur, couverture…)
+            self.profil = None
+            _verrou.release()
+            return False
+        self.debut = time.perf_counter()
+        self.debut_cpu = time.thread_time()
+        return True
+
+    def arreter(self):
+        self.profil.disable()
+        _verrou.release()
+        return time.perf_counter() - self.debut, time.thread_time() - self.debut_cpu
+
+
+# =========================
+# ANNEAU SUR DISQUE
+# =========================
+def enregistrer(profil, infos):
+    """Écrit le profil et ses infos ; retourne l'identifiant (None si disque en erreur)."""
+    ident = f"{time.time_ns():020d}-{os.getpid()}"
+    try:
+        dossier = _dossier()
+        profil.dump_stats(dossier / f"{ident}.prof")
+        temporaire = dossier / f"{ident}.json.tmp"
+        temporaire.write_text(
+            json.dumps({**infos, "id": ident, "date": timezone.now().isoformat()}, ensure_ascii=False)
+        )
+        os.replace(temporaire, dossier / f"{ident}.json")
+        evincer()
+    except OSError:
+        # profil perdu, jamais la page
+        logger.exception("Profil non enregistré")
+        return None
+    return ident
+
+
+def evincer():
+    """Supprime les profils les plus anciens au-delà de PROFILAGE_MAX."""
+    idents = sorted({chemin.name.split(".")[0] for chemin in _dossier().iterdir()})
+    supprimes = 0
+    for ident in idents[:max(0, len(idents) - settings.PROFILAGE_MAX)]:
+        for chemin in _dossier().glob(f"{ident}.*"):
+            try:
+                chemin.unlink()
+            except FileNotFoundError:
+                pass
+        supprimes += 1
+    return supprimes
+
+
+# =========================
+# LECTURE (PAGE STAFF)
+# =========================
+def liste():
+    """Infos des profils complets, du plus récent au plus ancien."""
+    profils = []
+    for chemin in sorted(_dossier().glob("*.json"), reverse=True):
+        try:
+            profils.append(json.loads(chemin.read_text()))
+        except (FileNotFoundError, ValueError):
+            continue  # évincé ou en cours d'écriture
+    return profils
+
+
+def chemin_profil(ident):
+    """Chemin du .prof de `ident`, ou None (identifiant invalide ou évincé)."""
+    if not IDENT.match(ident):
+        return None
+    chemin = _dossier() / f"{ident}.prof"
+    return chemin if chemin.exists() else None
+
+
+def infos(ident):
+    if not IDENT.match(ident):
+        return None
+    try:
+        return json.loads((_dossier() / f"{ident}.json").read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _nom(fonction):
+    fichier, ligne, nom = fonction
+    if fichier == "~":  # fonctions natives : "<built-in method ...>"
+        return nom
+    # chemins raccourcis : relatifs au projet ou au site-packages
+    for prefixe in sorted({str(settings.BASE_DIR), *filter(None, sys.path)}, key=len, reverse=True):
+        if fichier.startswith(prefixe):
+            fichier = fichier[len(prefixe):].lstrip("/")
+            break
+    return f"{fichier}:{ligne}({nom})"
+
+
+def fonctions(ident, tri="cumulative", nombre=FONCTIONS_MAX):
+    """[{nom, appels, primitifs, propre, cumule}] triées par temps cumulé (ou propre)."""
+    chemin = chemin_profil(ident)
+    if chemin is None:
+        return None
+
+    stats = pstats.Stats(str(chemin))
+    stats.sort_stats("tottime" if tri == "tottime" else "cumulative")
+    lignes = []
+    for fonction in stats.fcn_list[:nombre]:
+        primitifs, appels, propre, cumule, _ = stats.stats[fonction]
+        lignes.append({
+            "nom": _nom(fonction),
+            "appels": appels,
+            "primitifs": primitifs,
+            "propre": propre * 1000,
+            "cumule": cumule * 1000,
+        })
+    return lignes
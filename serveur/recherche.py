@@ -0,0 +1,200 @@
+"""
+Recherche du catalogue (boîte `q` de home / accueil).
+
+Résultats : ids des produits correspondants (avec leur catégorie), mis en
+cache sous le tampon de version "catalogue" ; les pages ne refont les
+icontains que pour un terme jamais vu depuis le dernier changement.
+
+Statistiques : une recherche sur RECHERCHE_ECHANTILLON est comptée dans un
+tampon du processus, vidé en quelques requêtes groupées (RechercheStat) toutes
+les VIDAGE_SECONDES ou dès VIDAGE_TERMES termes distincts.
+
+Préchauffage : à chaque changement du catalogue (et par cron), les
+RECHERCHE_PRECHAUFFAGE termes les plus fréquents sont recalculés et mis en
+cache avant que les clients ne les redemandent.
+"""
+import hashlib
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import routage, versions
+from .models import Licence, RechercheStat, Service, ServiceImei
+
+
+logger = logging.getLogger(__name__)
+
+TERME_MAX = 100
+TTL = 24 * 3600
+VIDAGE_TERMES = 200
+VIDAGE_SECONDES = 60
+# plusieurs modifications à la suite (import) : un seul préchauffage
+DELAI_PRECHAUFFAGE = 2
+CLE_PRECHAUFFE = "recherche:prechauffe"
+
+# clé des résultats -> (modèle, champ description)
+PRODUITS = {
+    "licences": (Licence, "destription"),
+    "services": (ServiceImei, "destription"),
+    "services_generaux": (Service, "description"),
+}
+
+_verrou = threading.Lock()
+_tampon = {}  # terme -> [nombre, résultats]
+_dernier_vidage = time.monotonic()
+_minuteur = None
+
+
+def normaliser(query):
+    """Clé d'un terme : minuscules, espaces réduits (icontains ignore déjà la casse)."""
+    return " ".join((query or "").lower().split())[:TERME_MAX]
+
+
+# =========================
+# RÉSULTATS (CACHE)
+# =========================
+def _cle(terme, version):
+    return f"recherche:{version}:{hashlib.sha1(terme.encode()).hexdigest()}"
+
+
+def _calculer(terme):
+    return {
+        cle: list(
+            modele.objects.filter(Q(nom__icontains=terme) | Q(**{f"{description}__icontains": terme}))
+            .values_list("id", "category_id")
+        )
+        for cle, (modele, description) in PRODUITS.items()
+    }
+
+
+def _resultats(terme, version):
+    cle = _cle(terme, version)
+    resultats = cache.get(cle)
+    if resultats is None:
+        resultats = _calculer(terme)
+        cache.set(cle, resultats, TTL)
+    return resultats
+
+
+def rechercher(query, compter=True):
+    """
+    {"licences": [(id, category_id)], "services": [...], "services_generaux": [...]}
+    pour `query` ; la recherche est (peut-être) comptée dans les statistiques.
+    """
+    terme = normaliser(query)
+    resultats = _resultats(terme, versions.version(versions.CATALOGUE))
+    if compter:
+        enregistrer(terme, sum(len(ids) for ids in resultats.values()))
+    return resultats
+
+
+def ids(resultats, *cles):
+    """(ids des produits par clé, ids des catégories) pour les clés demandées."""
+    produits = {cle: [pk for pk, _ in resultats[cle]] for cle in cles}
+    categories = {categorie for cle in cles for _, categorie in resultats[cle]}
+    return produits, categories
+
+
+# =========================
+# STATISTIQUES (ÉCHANTILLONNÉES, PAR LOTS)
+# =========================
+def enregistrer(terme, nombre_resultats):
+    taux = settings.RECHERCHE_ECHANTILLON
+    if not terme or taux <= 0 or random.random() >= taux:
+        return
+
+    with _verrou:
+        ligne = _tampon.setdefault(terme, [0, 0])
+        ligne[0] += 1
+        ligne[1] = nombre_resultats
+        plein = len(_tampon) >= VIDAGE_TERMES or time.monotonic() - _dernier_vidage >= VIDAGE_SECONDES
+    if plein:
+        vider()
+
+
+def vider():
+    """Écrit le tampon du processus : une insertion + un UPDATE par groupe (nombre, résultats)."""
+    global _tampon, _dernier_vidage
+
+    with _verrou:
+        tampon, _tampon = _tampon, {}
+        _dernier_vidage = time.monotonic()
+    if not tampon:
+        return 0
+
+    # chaque recherche comptée en représente 1 / taux
+    poids = max(1, round(1 / settings.RECHERCHE_ECHANTILLON)) if settings.RECHERCHE_ECHANTILLON > 0 else 1
+    maintenant = timezone.now()
+    try:
+        RechercheStat.objects.bulk_create(
+            [RechercheStat(terme=terme, derniere=maintenant) for terme in tampon],
+            ignore_conflicts=True,
+        )
+        groupes = defaultdict(list)
+        for terme, (nombre, resultats) in tampon.items():
+            groupes[(nombre, resultats)].append(terme)
+        for (nombre, resultats), termes in groupes.items():
+            RechercheStat.objects.filter(terme__in=termes).update(
+                nombre=F("nombre") + nombre * poids, resultats=resultats, derniere=maintenant
+            )
+    except Exception:
+        # statistiques : jamais au prix d'une page en erreur
+        logger.exception("Statistiques de recherche non enregistrées")
+        return 0
+    return len(tampon)
+
+
+# =========================
+# PRÉCHAUFFAGE
+# =========================
+def prechauffer(nombre=None, force=False):
+    """
+    Met en cache les résultats des termes les plus recherchés pour le
+    catalogue courant. Retourne le nombre de termes (0 si déjà fait).
+    """
+    version = versions.version(versions.CATALOGUE)
+    if not force and cache.get(CLE_PRECHAUFFE) == version:
+        return 0
+
+    vider()
+    nombre = settings.RECHERCHE_PRECHAUFFAGE if nombre is None else nombre
+    with routage.primaire():
+        termes = list(RechercheStat.objects.order_by("-nombre").values_list("terme", flat=True)[:nombre])
+        for terme in termes:
+            _resultats(terme, version)
+
+    cache.set(CLE_PRECHAUFFE, version, None)
+    return len(termes)
+
+
+def prechauffer_plus_tard():
+    """Préchauffage en arrière-plan, regroupé sur DELAI_PRECHAUFFAGE secondes."""
+    global _minuteur
+
+    with _verrou:
+        if _minuteur is not None:
+            return
+        _minuteur = threading.Timer(DELAI_PRECHAUFFAGE, _prechauffer_fond)
+        _minuteur.daemon = True
+        _minuteur.start()
+
+
+def _prechauffer_fond():
+    global _minuteur
+
+    with _verrou:
+        _minuteur = None
+    try:
+        prechauffer()
+    except Exception:
+        logger.exception("Préchauffage des recherches impossible")
+    finally:
+        connections.close_all()
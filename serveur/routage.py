@@ -0,0 +1,86 @@
+"""
+Routage optionnel des lectures vers des réplicas (DATABASE_REPLICA_URLS).
+
+Seules les lectures du catalogue et de l'historique partent sur un réplica, et
+seulement pendant une requête HTTP en lecture (GET/HEAD) hors admin. Tout le
+reste reste sur la base principale :
+
+- écritures, transactions ouvertes, commandes de gestion, admin ;
+- requêtes POST (commande, ajout de fonds...) ;
+- les requêtes d'un utilisateur dans les REPLICA_STICKY_SECONDES qui suivent
+  son dernier POST (cookie), pour qu'il relise ce qu'il vient d'écrire malgré
+  le retard de réplication.
+
+Couvert par serveur.tests.RoutageDeuxBasesTests (second fichier SQLite en
+guise de réplica). Essai manuel :
+
+    cp db.sqlite3 replica.sqlite3
+    DATABASE_REPLICA_URLS=sqlite:///replica.sqlite3 python manage.py runserver
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+COOKIE_STICKY = "sk_primaire"
+
+# modèles dont la lecture tolère un léger retard de réplication
+MODELES_LECTURE = {
+    "serveur.category",
+    "serveur.licence",
+    "serveur.serviceimei",
+    "serveur.service",
+    "serveur.commande",
+    "serveur.historique",
+    "serveur.commandefieldvalue",
+}
+
+# faux par défaut : hors requête HTTP (shell, commandes), tout va au principal
+_replicas_autorises = ContextVar("replicas_autorises", default=False)
+
+
+@contextmanager
+def replicas_autorises(actif=True):
+    jeton = _replicas_autorises.set(actif)
+    try:
+        yield
+    finally:
+        _replicas_autorises.reset(jeton)
+
+
+def primaire():
+    """Force la base principale dans ce bloc (ex. reconstruction d'un cache)."""
+    return replicas_autorises(False)
+
+
+def requete_eligible(request):
+    return (
+        request.method in ("GET", "HEAD")
+        and not request.path.startswith("/admin/")
+        and COOKIE_STICKY not in request.COOKIES
+    )
+
+
+class RouteurReplicas:
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, "DATABASE_REPLICAS", [])
+        if (
+            not replicas
+            or not _replicas_autorises.get()
+            or model._meta.label_lower not in MODELES_LECTURE
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # une écriture pendant la requête : la suite relit le principal
+        _replicas_autorises.set(False)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # réplicas = copies du principal : relations toujours valides
+        return True
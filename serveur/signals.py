@@ -0,0 +1,48 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import recherche, versions
+from .comptes import provisionner
+from .models import Category, CustomField, Licence, PaymentConfig, Service, ServiceImei
+
+
+@receiver(post_save, sender=User, dispatch_uid="serveur_provisionner_compte")
+def provisionner_compte(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        provisionner(instance)
+
+
+# =========================
+# CATALOGUE MODIFIÉ → INDEX D'AUTOCOMPLÉTION À RECONSTRUIRE
+# =========================
+@receiver(post_save, sender=Category, dispatch_uid="serveur_catalogue_save_category")
+@receiver(post_save, sender=Licence, dispatch_uid="serveur_catalogue_save_licence")
+@receiver(post_save, sender=ServiceImei, dispatch_uid="serveur_catalogue_save_service_imei")
+@receiver(post_save, sender=Service, dispatch_uid="serveur_catalogue_save_service")
+@receiver(post_delete, sender=Category, dispatch_uid="serveur_catalogue_delete_category")
+@receiver(post_delete, sender=Licence, dispatch_uid="serveur_catalogue_delete_licence")
+@receiver(post_delete, sender=ServiceImei, dispatch_uid="serveur_catalogue_delete_service_imei")
+@receiver(post_delete, sender=Service, dispatch_uid="serveur_catalogue_delete_service")
+def catalogue_modifie(sender, **kwargs):
+    versions.incrementer(versions.CATALOGUE)
+
+
+# =========================
+# MOYENS DE PAIEMENT / CHAMPS → REGISTRE DE CONFIGURATION À RECHARGER
+# =========================
+@receiver(post_save, sender=PaymentConfig, dispatch_uid="serveur_configuration_save_paiement")
+@receiver(post_save, sender=CustomField, dispatch_uid="serveur_configuration_save_champ")
+@receiver(post_delete, sender=PaymentConfig, dispatch_uid="serveur_configuration_delete_paiement")
+@receiver(post_delete, sender=CustomField, dispatch_uid="serveur_configuration_delete_champ")
+def configuration_modifiee(sender, **kwargs):
+    versions.incrementer(versions.CONFIGURATION)
+
+
+# =========================
+# CATALOGUE CHANGÉ (APRÈS COMMIT) → RECHERCHES POPULAIRES À PRÉCHAUFFER
+# =========================
+@receiver(versions.version_changee, dispatch_uid="serveur_prechauffer_recherches")
+def prechauffer_recherches(sender, nom, **kwargs):
+    if nom == versions.CATALOGUE:
+        recherche.prechauffer_plus_tard()
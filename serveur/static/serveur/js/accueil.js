@@ -0,0 +1,78 @@
+function toggleMenu(){
+    document.getElementById("menuList").classList.toggle("show");
+}
+
+// sections catégories : chargées au premier clic, puis gardées
+function chargerSection(section){
+    if (!section.dataset.url || section.dataset.charge) return;
+    section.dataset.charge = "1";
+    section.innerHTML = '<div class="card small">Chargement…</div>';
+
+    fetch(section.dataset.url, {
+        headers: { "X-Requested-With": "XMLHttpRequest" }
+    })
+    .then(res => {
+        if (!res.ok) throw new Error(res.status);
+        return res.text();
+    })
+    .then(html => { section.innerHTML = html; })
+    .catch(() => {
+        delete section.dataset.charge;
+        section.innerHTML = '<div class="card small">Erreur de chargement</div>';
+    });
+}
+
+// catalogue complet : page suivante ajoutée à la place du bouton
+function chargerSuite(bloc){
+    bloc.innerHTML = '<div class="card small">Chargement…</div>';
+
+    fetch(bloc.dataset.suite, {
+        headers: { "X-Requested-With": "XMLHttpRequest" }
+    })
+    .then(res => {
+        if (!res.ok) throw new Error(res.status);
+        return res.text();
+    })
+    .then(html => { bloc.outerHTML = html; })
+    .catch(() => {
+        bloc.innerHTML = '<button type="button" class="btn-fonds" onclick="chargerSuite(this.parentNode)">'
+            + 'Erreur de chargement, réessayer</button>';
+    });
+}
+
+function showSection(id){
+    document.querySelectorAll('.section').forEach(s=>s.classList.remove('active'));
+    const section = document.getElementById(id);
+    section.classList.add('active');
+    chargerSection(section);
+    document.getElementById("menuList").classList.remove("show");
+}
+
+// recherche : fragment de résultats pendant la saisie
+const form = document.querySelector('.search');
+const input = form.querySelector('input');
+let timer = null;
+let controleur = null;
+
+input.addEventListener('input', () => {
+    clearTimeout(timer);
+
+    timer = setTimeout(() => {
+        const q = input.value.trim();
+
+        if (controleur) controleur.abort();
+        controleur = new AbortController();
+
+        fetch(`${form.dataset.url}?q=${encodeURIComponent(q)}`, {
+            headers: { "X-Requested-With": "XMLHttpRequest" },
+            signal: controleur.signal
+        })
+        .then(res => res.text())
+        .then(html => {
+            const resultats = document.querySelector('[data-results]');
+            resultats.innerHTML = html;
+            showSection(resultats.id);
+        })
+        .catch(() => {});
+    }, 300); // délai anti-spam (UX PRO)
+});
@@ -0,0 +1,34 @@
+// suggestions de la barre de recherche (datalist alimentée par /autocompletion/)
+document.querySelectorAll('form.search[data-autocompletion]').forEach(form => {
+    const input = form.querySelector('input[name="q"]');
+    const liste = document.getElementById(input.getAttribute('list'));
+    let timer = null;
+    let controleur = null;
+
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+
+        timer = setTimeout(() => {
+            const q = input.value.trim();
+            if (!q) { liste.innerHTML = ''; return; }
+
+            if (controleur) controleur.abort();
+            controleur = new AbortController();
+
+            fetch(`${form.dataset.autocompletion}?q=${encodeURIComponent(q)}`, {
+                signal: controleur.signal
+            })
+            .then(res => res.json())
+            .then(data => {
+                liste.innerHTML = '';
+                const noms = new Set(data.resultats.map(r => r.nom));
+                noms.forEach(nom => {
+                    const option = document.createElement('option');
+                    option.value = nom;
+                    liste.appendChild(option);
+                });
+            })
+            .catch(() => {});
+        }, 120);
+    });
+});
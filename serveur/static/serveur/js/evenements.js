@@ -0,0 +1,30 @@
+// statuts et solde en direct (SSE) : plus besoin de recharger la page
+(function(){
+    const url = document.body.dataset.evenements;
+    if (!url || !window.EventSource) return;
+
+    const STATUTS_COMMANDE = { succes: "✅ Succès", refuse: "❌ Refusée", expire: "⌛ Expirée" };
+    const source = new EventSource(url);
+
+    source.addEventListener('compte', e => {
+        const compte = JSON.parse(e.data);
+        document.querySelectorAll('[data-compte]').forEach(el => {
+            if (el.dataset.compte in compte) el.textContent = compte[el.dataset.compte];
+        });
+    });
+
+    source.addEventListener('commande', e => {
+        const commande = JSON.parse(e.data);
+        document.querySelectorAll(`[data-commande="${commande.id}"]`).forEach(el => {
+            el.textContent = STATUTS_COMMANDE[commande.statut] || commande.statut;
+        });
+    });
+
+    source.addEventListener('depot', e => {
+        const depot = JSON.parse(e.data);
+        document.querySelectorAll(`[data-transaction="${depot.id}"]`).forEach(el => {
+            el.className = `status ${depot.statut}`;
+            el.textContent = depot.libelle;
+        });
+    });
+})();
@@ -0,0 +1,30 @@
+function showMobile(){
+    document.getElementById("mobile-box").style.display="block";
+    document.getElementById("usdt-box").style.display="none";
+}
+function showUSDT(){
+    document.getElementById("mobile-box").style.display="none";
+    document.getElementById("usdt-box").style.display="block";
+}
+
+function selectMethode(el){
+    const methode = el.value;
+    const numero = el.selectedOptions[0].dataset.num || "";
+    document.getElementById("methodeInput").value = methode;
+
+    let box = methode.includes("usdt")
+        ? document.getElementById("usdtAddress")
+        : document.getElementById("mobileNumber");
+
+    box.style.display="block";
+    box.innerText = (methode.includes("usdt") ? "🔗 " : "📞 ") + numero + " (cliquer pour copier)";
+    box.onclick = () => copyText(numero, box);
+}
+
+function copyText(text, el){
+    navigator.clipboard.writeText(text).then(()=>{
+        const old = el.innerText;
+        el.innerText = "✅ Copié !";
+        setTimeout(()=> el.innerText = old, 1200);
+    });
+}
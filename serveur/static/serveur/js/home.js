@@ -0,0 +1,2 @@
+function openWhatsApp(){document.getElementById("whatsappModal").style.display="block";}
+function closeWhatsApp(){document.getElementById("whatsappModal").style.display="none";}
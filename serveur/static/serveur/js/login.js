@@ -0,0 +1,5 @@
+setTimeout(function() {
+    document.querySelectorAll('.toast').forEach(function(t) {
+        t.style.display = 'none';
+    });
+}, 3000);
@@ -0,0 +1,18 @@
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class StockageStatique(CompressedManifestStaticFilesStorage):
+    """
+    Fichiers statiques hashés et compressés (WhiteNoise).
+
+    Tant que collectstatic n'a pas été lancé (dev, tests), il n'y a pas de
+    manifeste : {% static %} renvoie alors le nom non hashé au lieu d'échouer.
+    """
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            if self.hashed_files:
+                raise
+            return name
@@ -0,0 +1,72 @@
+"""
+Révision des prix en masse : un seul UPDATE par modèle.
+
+Le nouveau prix est calculé en SQL, en arithmétique entière (pourcentage puis
+delta fixe, arrondi au pas FCFA choisi, jamais négatif), ce qui évite de charger et sauvegarder
+chaque produit.
+"""
+from django.db.models import BigIntegerField, Count, F, IntegerField, Sum, Value
+from django.db.models.functions import Cast, Greatest
+
+from . import versions
+from .models import Licence, ServiceImei, Service
+
+
+MODELES = {
+    "licence": Licence,
+    "service_imei": ServiceImei,
+    "service": Service,
+}
+
+ARRONDIS = {
+    "proche": "Au plus proche",
+    "haut": "Au-dessus",
+    "bas": "En dessous",
+}
+
+# pas d'arrondi par défaut : arrondir tous les prix doit être demandé (--pas)
+PAS_DEFAUT = 1
+# pourcentage au centième près : prix × (10000 + centièmes de %)
+ECHELLE = 10000
+
+
+def expression_prix(pourcentage=0, delta=0, pas=PAS_DEFAUT, arrondi="proche"):
+    """Expression SQL du nouveau prix à partir de la colonne `prix`."""
+    if pas < 1:
+        raise ValueError("Le pas d'arrondi doit être d'au moins 1 FCFA.")
+    if arrondi not in ARRONDIS:
+        raise ValueError(f"Arrondi inconnu : {arrondi}")
+
+    # calcul exact en entiers, en 1/ECHELLE de FCFA : en flottants,
+    # 100 × 1,10 = 110,00000000000001 serait arrondi "au-dessus" à 115
+    def entier(valeur):
+        return Value(valeur, output_field=BigIntegerField())
+
+    brut = Cast(F("prix"), BigIntegerField()) * entier(ECHELLE + round(pourcentage * 100)) + entier(delta * ECHELLE)
+    # négatif -> 0 avant la division (division entière = troncature vers 0)
+    brut = Greatest(brut, entier(0), output_field=BigIntegerField())
+
+    diviseur = pas * ECHELLE
+    decalage = {"bas": 0, "proche": diviseur // 2, "haut": diviseur - 1}[arrondi]
+    return Cast((brut + entier(decalage)) / entier(diviseur) * entier(pas), IntegerField())
+
+
+def apercu(queryset, **regle):
+    """Nombre de produits et totaux avant / après, en une requête."""
+    resultat = queryset.aggregate(
+        nombre=Count("pk"),
+        avant=Sum("prix"),
+        apres=Sum(expression_prix(**regle)),
+    )
+    return {
+        "nombre": resultat["nombre"],
+        "avant": resultat["avant"] or 0,
+        "apres": resultat["apres"] or 0,
+    }
+
+
+def appliquer(queryset, **regle):
+    """Applique la règle en un seul UPDATE ; retourne le nombre de lignes."""
+    lignes = queryset.order_by().update(prix=expression_prix(**regle))
+    versions.incrementer(versions.CATALOGUE)
+    return lignes
@@ -0,0 +1,12 @@
+from django import template
+
+from serveur.images import LARGEURS, url_miniature
+
+
+register = template.Library()
+
+
+@register.filter
+def miniature(url, largeur=LARGEURS[0]):
+    """{{ produit.image|miniature:480 }} -> URL de la miniature servie en local."""
+    return url_miniature(url, int(largeur))
@@ -1,3 +1,1698 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import importlib
+import io
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import contextmanager
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import Permission, User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core import mail
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.smtp import EmailBackend as SMTPEmailBackend
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import (
+    api, audit, autocompletion, catalogue, commandes, comptes, compteurs, configuration, evenements, expiration, images,
+    imei, journal, limiteur, metriques, notifications, profilage, recherche, routage, signals, tarifs, transitions,
+    versions, views,
+)
+from .admin import CommandeAdmin
+from .email import EmailBackendMesure
+from .management.commands import charge
+from .middleware import CompteMiddleware, RoutageMiddleware
+from .models import (
+    Category, Commande, CustomField, EntreeJournal, Historique, Licence, Notification, PaymentConfig, PointControle,
+    RechercheStat, ResumeCompte, ServiceImei, Transaction, Wallet,
+)
+
+
+# =========================
+# CATALOGUE (IMPORT / EXPORT)
+# =========================
+CATALOGUE_CSV = (
+    "type,categorie,nom,prix,description,image,email,username,imei,photo,champs\n"
+    "licence,Windows,Pro,1000,,,1,1,0,0,Clé|text|1\n"
+    "licence,Windows,Famille,800,,,1,1,0,0,\n"
+    "service_imei,Déblocage,Samsung,2500,,,1,0,1,0,\n"
+)
+
+
+class CatalogueTests(TestCase):
+    def importer(self, contenu=CATALOGUE_CSV, format_fichier="csv", **options):
+        return catalogue.importer(contenu, format_fichier, **options)
+
+    def test_creation_modification_suppression(self):
+        rapport = self.importer()
+        self.assertEqual(len(rapport.crees["licence"]), 2)
+        self.assertEqual(rapport.categories_creees, ["Déblocage", "Windows"])
+        self.assertEqual(CustomField.objects.get(licence__nom="Pro").nom, "Clé")
+
+        # Famille absente, Pro plus chère
+        modifie = CATALOGUE_CSV.replace("Pro,1000", "Pro,1200").replace("licence,Windows,Famille,800,,,1,1,0,0,\n", "")
+        rapport = self.importer(modifie, supprimer=True)
+        self.assertEqual(rapport.modifies["licence"], ["Windows / Pro"])
+        self.assertEqual(rapport.supprimes["licence"], ["Windows / Famille"])
+        self.assertEqual(list(Licence.objects.values_list("nom", "prix")), [("Pro", 1200)])
+
+        # même fichier : rien à faire
+        self.assertEqual(self.importer(modifie, supprimer=True).total, 0)
+
+    def test_absents_gardes_sans_supprimer(self):
+        self.importer()
+        self.importer(CATALOGUE_CSV.replace("licence,Windows,Famille,800,,,1,1,0,0,\n", ""))
+        self.assertTrue(Licence.objects.filter(nom="Famille").exists())
+
+    def test_simulation_annulee(self):
+        rapport = self.importer(dry_run=True)
+        self.assertEqual(rapport.total, 3)
+        self.assertFalse(Licence.objects.exists())
+        self.assertFalse(Category.objects.exists())
+
+    def test_aller_retour_json(self):
+        self.importer()
+        export = catalogue.exporter("json")
+        self.assertEqual(self.importer(export, "json", supprimer=True).total, 0)
+
+    def test_fichiers_invalides(self):
+        for contenu, format_fichier, attendu in (
+            ("[1, 2]", "json", "Ligne 1 : objet attendu"),
+            ('["a"]', "json", "Ligne 1 : objet attendu"),
+            ('"texte"', "json", "liste de produits attendue"),
+            (
+                '[{"type": "licence", "categorie": "W", "nom": "P", "prix": 1, "champs": [1]}]', "json",
+                "Ligne 1 : champs",
+            ),
+            ("type,categorie,nom,prix\nlicence,W,P,gratuit\n", "csv", "Ligne 1 : prix invalide"),
+            ("type,categorie,nom,prix\nlogiciel,W,P,1\n", "csv", "Ligne 1 : type inconnu"),
+        ):
+            with self.subTest(contenu=contenu):
+                with self.assertRaises(catalogue.CatalogueError) as erreur:
+                    self.importer(contenu, format_fichier)
+                self.assertIn(attendu, erreur.exception.erreurs[0])
+        self.assertFalse(Licence.objects.exists())
+
+
+class ImportCatalogueAdminTests(TestCase):
+    url = "/admin/serveur/category/catalogue/importer/"
+
+    def setUp(self):
+        self.staff = User.objects.create_user("staff", is_staff=True)
+        self.staff.user_permissions.add(Permission.objects.get(codename="change_licence"))
+        self.client.force_login(self.staff)
+        catalogue.importer(CATALOGUE_CSV, "csv")
+
+    def importer(self, contenu=CATALOGUE_CSV, nom="catalogue.csv", **options):
+        fichier = SimpleUploadedFile(nom, contenu.encode())
+        return self.client.post(self.url, {"fichier": fichier, "dry_run": "on", **options})
+
+    def test_supprimer_demande_les_droits_de_suppression(self):
+        self.assertEqual(self.importer(supprimer="on").status_code, 403)
+
+        self.staff.user_permissions.add(*Permission.objects.filter(
+            codename__in=["delete_licence", "delete_serviceimei", "delete_service"]
+        ))
+        self.assertEqual(self.importer(supprimer="on").status_code, 200)
+
+    def test_json_invalide_affiche_les_erreurs(self):
+        response = self.importer("[1, 2]", "catalogue.json")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "objet attendu")
+
+
+# =========================
+# ORIGINE LOCALE (STUB) POUR LE PROXY D'IMAGES
+# =========================
+class _Origine(BaseHTTPRequestHandler):
+    contenu = b""
+    appels = 0
+
+    def do_GET(self):
+        type(self).appels += 1
+        if self.path == "/texte":
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.end_headers()
+            self.wfile.write(b"<html></html>")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(self.contenu)))
+        self.end_headers()
+        self.wfile.write(self.contenu)
+
+    def log_message(self, *args):
+        pass
+
+
+@unittest.skipIf(images.Image is None, "Pillow n'est pas installé")
+class ImageMiniatureTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        tampon = io.BytesIO()
+        images.Image.new("RGB", (1600, 1200), (200, 30, 30)).save(tampon, "PNG")
+        _Origine.contenu = tampon.getvalue()
+
+        cls.serveur = ThreadingHTTPServer(("127.0.0.1", 0), _Origine)
+        cls.origine = f"http://127.0.0.1:{cls.serveur.server_port}"
+        threading.Thread(target=cls.serveur.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.serveur.shutdown()
+        cls.serveur.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        _Origine.appels = 0
+        self.dossier = tempfile.mkdtemp()
+        reglages = override_settings(IMAGES_CACHE_DIR=self.dossier)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.addCleanup(shutil.rmtree, self.dossier, True)
+
+    def test_miniature_webp_telechargee_une_seule_fois(self):
+        url = images.url_miniature(f"{self.origine}/produit.png", 240)
+
+        response = self.client.get(url, HTTP_ACCEPT="image/webp,*/*")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertIn("immutable", response["Cache-Control"])
+
+        contenu = b"".join(response.streaming_content)
+        self.assertLess(len(contenu), len(_Origine.contenu))
+        self.assertEqual(images.Image.open(io.BytesIO(contenu)).width, 240)
+
+        # autres variantes servies depuis le disque, sans retourner à l'origine
+        response = self.client.get(images.url_miniature(f"{self.origine}/produit.png", 480))
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(_Origine.appels, 1)
+
+    def test_jeton_falsifie(self):
+        response = self.client.get("/img/abc:def/240/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_largeur_non_autorisee(self):
+        url = images.url_miniature(f"{self.origine}/produit.png", 240).replace("/240/", "/999/")
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_contenu_non_image_redirige_vers_origine(self):
+        response = self.client.get(images.url_miniature(f"{self.origine}/texte", 240))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response["Location"], f"{self.origine}/texte")
+
+    def test_echec_memorise(self):
+        url = images.url_miniature(f"{self.origine}/texte", 240)
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.assertEqual(self.client.get(url).status_code, 302)
+        # redirigé sans retourner à l'origine
+        self.assertEqual(_Origine.appels, 1)
+
+        # marqueur périmé : nouvelle tentative
+        with override_settings(IMAGES_ECHEC_SECONDES=0):
+            self.assertEqual(self.client.get(url).status_code, 302)
+        self.assertEqual(_Origine.appels, 2)
+
+    def test_origine_injoignable(self):
+        with socket.socket() as libre:
+            libre.bind(("127.0.0.1", 0))
+            url = f"http://127.0.0.1:{libre.getsockname()[1]}/produit.png"
+
+        with self.assertRaises(images.ImageIndisponible):
+            images.variante(url, 240, "jpg")
+        with mock.patch.object(images, "_telecharger") as telecharger, self.assertRaises(images.ImageIndisponible):
+            images.variante(url, 240, "jpg")
+        telecharger.assert_not_called()
+
+    def test_eviction_lru(self):
+        images.variante(f"{self.origine}/a.png", 240, "jpg")
+        images.variante(f"{self.origine}/b.png", 240, "jpg")
+        dossier = images.chemin_variante("", 240, "jpg").parent
+
+        for chemin in dossier.glob(images.cle(f"{self.origine}/a.png") + "_*"):
+            os.utime(chemin, (1, 1))
+        recents = list(dossier.glob(images.cle(f"{self.origine}/b.png") + "_*"))
+
+        with override_settings(IMAGES_CACHE_MAX_OCTETS=sum(p.stat().st_size for p in recents)):
+            images.evincer()
+
+        self.assertEqual(sorted(dossier.iterdir()), sorted(recents))
+
+
+# =========================
+# ROUTAGE DES LECTURES (RÉPLICAS)
+# =========================
+@override_settings(DATABASE_REPLICAS=["replica_1"], REPLICA_STICKY_SECONDES=15)
+class RoutageReplicasTests(SimpleTestCase):
+    databases = {"default"}  # transaction.atomic
+
+    def setUp(self):
+        self.routeur = routage.RouteurReplicas()
+        self.factory = RequestFactory()
+
+    def _lectures(self, request):
+        """(base du catalogue, base du wallet) vues par la vue, + réponse."""
+        vu = {}
+
+        def vue(request):
+            vu["catalogue"] = self.routeur.db_for_read(Licence)
+            vu["wallet"] = self.routeur.db_for_read(Wallet)
+            return HttpResponse()
+
+        response = RoutageMiddleware(vue)(request)
+        return vu["catalogue"], vu["wallet"], response
+
+    def test_get_catalogue_sur_replica(self):
+        catalogue, wallet, _ = self._lectures(self.factory.get("/accueil/"))
+        self.assertEqual(catalogue, "replica_1")
+        self.assertEqual(wallet, "default")
+
+    def test_post_sur_principal_puis_sticky(self):
+        catalogue, _, response = self._lectures(self.factory.post("/ajouter-fonds/"))
+        self.assertEqual(catalogue, "default")
+        self.assertEqual(response.cookies[routage.COOKIE_STICKY]["max-age"], 15)
+
+        request = self.factory.get("/accueil/")
+        request.COOKIES[routage.COOKIE_STICKY] = "1"
+        self.assertEqual(self._lectures(request)[0], "default")
+
+    def test_admin_sur_principal(self):
+        self.assertEqual(self._lectures(self.factory.get("/admin/serveur/commande/"))[0], "default")
+
+    def test_hors_requete_sur_principal(self):
+        self.assertEqual(self.routeur.db_for_read(Licence), "default")
+
+    def test_ecriture_puis_lecture_sur_principal(self):
+        with routage.replicas_autorises():
+            self.routeur.db_for_write(Licence)
+            self.assertEqual(self.routeur.db_for_read(Licence), "default")
+
+    def test_transaction_sur_principal(self):
+        with routage.replicas_autorises():
+            with transaction.atomic():
+                self.assertEqual(self.routeur.db_for_read(Licence), "default")
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_sans_replica(self):
+        self.assertEqual(self._lectures(self.factory.get("/accueil/"))[0], "default")
+
+
+REPLICA = "replica_test"
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class RoutageDeuxBasesTests(TransactionTestCase):
+    # pas de TestCase : sa transaction englobante garderait toutes les lectures au principal
+
+    @classmethod
+    def setUpClass(cls):
+        # second fichier SQLite jouant le réplica, sans retard de réplication :
+        # déclaré pour cette classe seulement. `databases` n'est complété qu'ici,
+        # le runner vérifiant les alias (checks) avant tout setUpClass
+        fd, cls.fichier_replica = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(fd)
+        bases = {**settings.DATABASES, REPLICA: {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": cls.fichier_replica,
+            "TEST": {"NAME": cls.fichier_replica},
+        }}
+        cls.enterClassContext(override_settings(DATABASES=bases))
+        connections.settings[REPLICA] = connections.configure_settings(bases)[REPLICA]
+        connections[REPLICA].creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        cls.databases = {"default", REPLICA}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            super().tearDownClass()
+        finally:
+            connections[REPLICA].creation.destroy_test_db(cls.fichier_replica, verbosity=0)
+            del connections[REPLICA]
+            del connections.settings[REPLICA]
+            del cls.databases
+            if os.path.exists(cls.fichier_replica):
+                os.remove(cls.fichier_replica)
+
+    def setUp(self):
+        # contenu différent sur chaque base : la page montre d'où elle a lu
+        Category.objects.create(nom="Catalogue principal")
+        Category.objects.using(REPLICA).create(nom="Catalogue réplica")
+
+        user = User.objects.create_user("client")
+        comptes.provisionner(user)
+        self.client.force_login(user)
+
+    def test_get_lit_le_replica(self):
+        response = self.client.get("/accueil/recherche/")
+        self.assertContains(response, "Catalogue réplica")
+        self.assertNotContains(response, "Catalogue principal")
+
+    def test_post_lit_le_principal_puis_cookie_sticky(self):
+        response = self.client.post("/accueil/recherche/")
+        self.assertContains(response, "Catalogue principal")
+        self.assertIn(routage.COOKIE_STICKY, response.cookies)
+
+        # le client de test renvoie le cookie : la lecture suivante reste sur le principal
+        self.assertContains(self.client.get("/accueil/recherche/"), "Catalogue principal")
+
+        del self.client.cookies[routage.COOKIE_STICKY]
+        self.assertContains(self.client.get("/accueil/recherche/"), "Catalogue réplica")
+
+
+# =========================
+# TRANSITIONS DE STATUT (CONCURRENCE)
+# =========================
+def _commandes(user, nombre, prix=100):
+    comptes.provisionner(user)
+    ResumeCompte.objects.filter(user=user).update(commandes_attente=nombre)
+    return Commande.objects.bulk_create([
+        Commande(user=user, type_commande="service", nom_produit=f"P{i}", prix=prix,
+                 email="a@exemple.com", username_service="a")
+        for i in range(nombre)
+    ])
+
+
+class TransitionsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("client", "client@exemple.com")
+
+    def test_deuxieme_passage_sans_effet(self):
+        _commandes(self.user, 3)
+        self.assertEqual(len(transitions.refuser_commandes(Commande.objects.all())), 3)
+        self.assertEqual(transitions.refuser_commandes(Commande.objects.all()), [])
+        self.assertEqual(transitions.valider_commandes(Commande.objects.all()), [])
+
+        self.assertEqual(Wallet.objects.get(user=self.user).solde, 300)
+        self.assertEqual(Historique.objects.count(), 3)
+        self.assertEqual(set(Commande.objects.values_list("version", flat=True)), {1})
+
+    def test_devance_entre_lecture_et_ecriture(self):
+        """Un autre opérateur valide juste après notre lecture : nous ne touchons à rien."""
+        ids = [c.pk for c in _commandes(self.user, 2)]
+        devance = []
+
+        def autre_operateur(execute, sql, params, many, context):
+            if not devance and sql.startswith("UPDATE") and "serveur_commande" in sql:
+                devance.append(True)
+                Commande.objects.filter(pk__in=ids).update(statut="succes", version=F("version") + 1)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(autre_operateur):
+            refusees = transitions.refuser_commandes(Commande.objects.filter(pk__in=ids))
+
+        self.assertEqual(refusees, [])
+        self.assertEqual(Wallet.objects.get(user=self.user).solde, 0)
+        self.assertEqual(Historique.objects.count(), 0)
+        self.assertEqual(set(Commande.objects.values_list("statut", flat=True)), {"succes"})
+
+    def test_transition_interdite(self):
+        with self.assertRaises(transitions.TransitionInvalide):
+            transitions.basculer(Commande.objects.all(), "succes", "refuse", transitions.COMMANDE)
+
+    def test_depot_credite_une_fois(self):
+        comptes.provisionner(self.user)
+        Transaction.objects.create(user=self.user, montant=5000, methode="wave", reference="R1")
+        transitions.valider_depots(Transaction.objects.all())
+        transitions.valider_depots(Transaction.objects.all())
+        self.assertEqual(Wallet.objects.get(user=self.user).solde, 5000)
+
+
+class TransitionsParallelesTests(TransactionTestCase):
+    """
+    Plusieurs opérateurs valident / refusent les mêmes commandes en même temps.
+    Sous SQLite les transactions sont sérialisées ; la course réelle (lectures
+    simultanées puis UPDATE) se joue sous PostgreSQL.
+    """
+
+    OPERATEURS = 6
+    NOMBRE = 30
+
+    def test_chaque_commande_traitee_une_seule_fois(self):
+        user = User.objects.create_user("client", "client@exemple.com")
+        ids = [c.pk for c in _commandes(user, self.NOMBRE)]
+        depart = threading.Barrier(self.OPERATEURS)
+        traitees, erreurs = [], []
+
+        def operateur(numero):
+            action = transitions.valider_commandes if numero % 2 else transitions.refuser_commandes
+            try:
+                depart.wait()
+                for _ in range(200):
+                    try:
+                        traitees.extend(c.pk for c in action(Commande.objects.filter(pk__in=ids)))
+                        break
+                    except OperationalError:
+                        # SQLite (base de test en mémoire partagée) verrouille toute la
+                        # table au lieu d'attendre : l'action est atomique, on la relance
+                        # comme l'opérateur le ferait. Jamais le cas sous PostgreSQL.
+                        if connection.vendor != "sqlite":
+                            raise
+                        time.sleep(0.005)
+            except Exception as exc:  # pragma: no cover - remonté par l'assertion
+                erreurs.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=operateur, args=(n,)) for n in range(self.OPERATEURS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(erreurs, [])
+        self.assertEqual(sorted(traitees), sorted(ids))
+        self.assertEqual(Historique.objects.count(), self.NOMBRE)
+
+        refusees = Commande.objects.filter(statut="refuse").count()
+        self.assertEqual(Wallet.objects.get(user=user).solde, refusees * 100)
+
+        resume = ResumeCompte.objects.get(user=user)
+        self.assertEqual(resume.commandes_attente, 0)
+        self.assertEqual(resume.commandes_echec, refusees)
+        self.assertEqual(resume.commandes_succes, self.NOMBRE - refusees)
+
+
+# =========================
+# RECHERCHE CATALOGUE (CACHE + STATISTIQUES)
+# =========================
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests-recherche"}},
+    RECHERCHE_ECHANTILLON=1.0,
+)
+class RechercheTests(TestCase):
+    def setUp(self):
+        self.categorie = Category.objects.create(nom="Débloquage")
+
+    def test_resultats_en_cache_jusqu_au_changement_du_catalogue(self):
+        self.assertEqual(recherche.rechercher("Unlock")["licences"], [])
+
+        with self.assertNumQueries(0):
+            recherche.rechercher("  unlock ")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            licence = Licence.objects.create(nom="Unlock Pro", prix=1000, category=self.categorie)
+        self.assertEqual(recherche.rechercher("unlock")["licences"], [(licence.id, self.categorie.id)])
+
+    def test_statistiques_groupees(self):
+        for _ in range(3):
+            recherche.rechercher("introuvable")
+        recherche.vider()
+
+        stat = RechercheStat.objects.get(terme="introuvable")
+        self.assertEqual((stat.nombre, stat.resultats), (3, 0))
+
+
+# =========================
+# PROFILAGE À LA DEMANDE
+# =========================
+class ProfilageTests(TestCase):
+    def setUp(self):
+        self.dossier = tempfile.mkdtemp()
+        reglages = override_settings(PROFILAGE_DIR=self.dossier, PROFILAGE_ECHANTILLON=0, PROFILAGE_MAX=2)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.addCleanup(shutil.rmtree, self.dossier, True)
+
+        self.staff = User.objects.create_user("staff", "staff@exemple.com", is_staff=True)
+
+    def test_entete_staff(self):
+        self.client.force_login(self.staff)
+        response = self.client.get("/", HTTP_X_PROFILAGE="1")
+        ident = response["X-Profilage-Id"]
+
+        infos = profilage.infos(ident)
+        self.assertEqual((infos["vue"], infos["user"], infos["motif"]), ("home", "staff", "entete"))
+        self.assertTrue(any("views.py" in f["nom"] and "(home)" in f["nom"] for f in profilage.fonctions(ident)))
+
+        page = self.client.get(f"/supervision/profils/{ident}/")
+        self.assertContains(page, "(home)")
+
+    def test_entete_ignore_hors_staff(self):
+        response = self.client.get("/", HTTP_X_PROFILAGE="1")
+        self.assertNotIn("X-Profilage-Id", response)
+        self.assertEqual(profilage.liste(), [])
+        self.assertEqual(self.client.get("/supervision/profils/").status_code, 302)
+
+    @override_settings(PROFILAGE_ECHANTILLON=1.0, PROFILAGE_VUES=["home"])
+    def test_echantillon_en_anneau(self):
+        for _ in range(3):
+            self.client.get("/")
+        self.client.get("/login/")
+
+        profils = profilage.liste()
+        self.assertEqual(len(profils), 2)
+        self.assertEqual({p["motif"] for p in profils}, {"echantillon"})
+        self.assertEqual(len(os.listdir(self.dossier)), 4)
+
+
+# =========================
+# RÉVISION DES PRIX (ARRONDIS EXACTS)
+# =========================
+class TarifsTests(TestCase):
+    def setUp(self):
+        self.categorie = Category.objects.create(nom="Licences")
+
+    def revise(self, prix, **regle):
+        licence = Licence.objects.create(nom="L", prix=prix, category=self.categorie)
+        tarifs.appliquer(Licence.objects.filter(pk=licence.pk), **regle)
+        licence.refresh_from_db()
+        return licence.prix
+
+    def test_pourcentage_sans_erreur_flottante(self):
+        # 100 × 1,10 et 200 × 1,15 : valeurs exactes, quel que soit l'arrondi
+        for arrondi in tarifs.ARRONDIS:
+            with self.subTest(arrondi=arrondi):
+                self.assertEqual(self.revise(100, pourcentage=10, pas=5, arrondi=arrondi), 110)
+                self.assertEqual(self.revise(200, pourcentage=15, pas=5, arrondi=arrondi), 230)
+
+    def test_arrondis_au_pas(self):
+        # 1000 × 1,033 = 1033
+        attendus = {"bas": 1030, "proche": 1035, "haut": 1035}
+        for arrondi, attendu in attendus.items():
+            with self.subTest(arrondi=arrondi):
+                self.assertEqual(self.revise(1000, pourcentage=3.3, pas=5, arrondi=arrondi), attendu)
+
+    def test_delta_et_plancher(self):
+        self.assertEqual(self.revise(1000, pourcentage=-10, delta=-3, pas=10, arrondi="proche"), 900)
+        self.assertEqual(self.revise(100, delta=-500, arrondi="haut"), 0)
+
+    def test_commande_sans_arrondi_par_defaut(self):
+        licence = Licence.objects.create(nom="L", prix=1003, category=self.categorie)
+        call_command("reviser_prix", "--delta", "4", "--appliquer", stdout=io.StringIO())
+        licence.refresh_from_db()
+        self.assertEqual(licence.prix, 1007)
+
+        call_command("reviser_prix", "--pas", "5", "--appliquer", stdout=io.StringIO())
+        licence.refresh_from_db()
+        self.assertEqual(licence.prix, 1005)
+
+
+# =========================
+# TAMPONS DE VERSION (CACHE PARTAGÉ ENTRE WORKERS)
+# =========================
+class VersionsPartageesTests(TestCase):
+    def setUp(self):
+        versions.oublier()
+
+    def test_cache_par_defaut_partage(self):
+        # LocMemCache : un cache par processus, les autres workers ne verraient rien
+        self.assertNotIn("locmem", settings.CACHES["default"]["BACKEND"])
+
+    def test_autre_worker_voit_le_changement(self):
+        self.assertEqual(configuration.paiements_actifs(), [])
+
+        # écriture et nouveau tampon faits par un autre processus : seule la
+        # table de cache est commune
+        PaymentConfig.objects.bulk_create([PaymentConfig(methode="wave", numero="0700")])
+        autre_worker = caches.create_connection("default")
+        autre_worker.set(versions._cle(versions.CONFIGURATION), "nouveau", None)
+
+        # tampon gardé LOCAL_SECONDES par le worker, puis relu
+        self.assertEqual(configuration.paiements_actifs(), [])
+        with mock.patch.object(versions, "LOCAL_SECONDES", 0):
+            versions.oublier()
+            self.assertEqual([c.methode for c in configuration.paiements_actifs()], ["wave"])
+
+    def test_registre_recharge_apres_modification(self):
+        self.assertEqual(configuration.paiements_actifs(), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PaymentConfig.objects.create(methode="wave", numero="0700")
+
+        # le worker qui a écrit voit le nouveau tampon sans attendre
+        self.assertEqual(configuration.paiement("wave").numero, "0700")
+
+    def test_lecture_a_chaud_sans_requete(self):
+        PaymentConfig.objects.create(methode="wave", numero="0700")
+        configuration.registre()
+
+        with self.assertNumQueries(0):
+            self.assertEqual([c.methode for c in configuration.paiements_actifs()], ["wave"])
+            self.assertIsNone(configuration.paiement("orange"))
+
+
+# =========================
+# LIMITEUR DE DÉBIT
+# =========================
+@override_settings(LIMITEUR_PROXY_DE_CONFIANCE=True, LIMITEUR_PROXIES=1)
+class AdresseIPTests(SimpleTestCase):
+    def adresse(self, transmis, distante="10.0.0.1"):
+        request = RequestFactory().get("/", HTTP_X_FORWARDED_FOR=transmis, REMOTE_ADDR=distante)
+        return limiteur.adresse_ip(request)
+
+    def test_entree_ajoutee_par_le_proxy(self):
+        # "1.1.1.1" vient du client : changer d'en-tête ne change pas de seau
+        self.assertEqual(self.adresse("1.1.1.1, 203.0.113.7"), "203.0.113.7")
+        self.assertEqual(self.adresse("9.9.9.9, 203.0.113.7"), "203.0.113.7")
+
+    @override_settings(LIMITEUR_PROXIES=2)
+    def test_plusieurs_proxies(self):
+        self.assertEqual(self.adresse("1.1.1.1, 203.0.113.7, 172.16.0.2"), "203.0.113.7")
+        self.assertEqual(self.adresse("172.16.0.2"), "10.0.0.1")
+
+    def test_sans_en_tete(self):
+        self.assertEqual(self.adresse(""), "10.0.0.1")
+
+
+@override_settings(
+    LIMITEUR_ACTIF=True,
+    LIMITEUR_PROXY_DE_CONFIANCE=False,
+    LIMITES_REQUETES={"login": {"ip": "100/min", "username": "2/min"}},
+)
+class LimiteurTests(TestCase):
+    def setUp(self):
+        # mémoire du processus : pas remise à zéro par la transaction du test
+        caches[limiteur.CACHE].clear()
+
+    def connexion(self, username="client"):
+        return self.client.post("/login/", {"username": username, "password": "faux"})
+
+    def test_429_avec_retry_after(self):
+        self.assertEqual(self.connexion().status_code, 200)
+        self.assertEqual(self.connexion().status_code, 200)
+
+        refus = self.connexion()
+        self.assertEqual(refus.status_code, 429)
+        # 2/min : un jeton toutes les 30 s
+        self.assertTrue(0 < int(refus["Retry-After"]) <= 30)
+
+        # autre nom d'utilisateur, même IP : autre seau
+        self.assertEqual(self.connexion("autre").status_code, 200)
+
+    def test_compteurs_de_rejets(self):
+        for _ in range(5):
+            self.connexion()
+
+        self.assertEqual(limiteur.compteurs_rejets()[("login", "username")], 3)
+        self.assertEqual(limiteur.compteurs_rejets()[("login", "ip")], 0)
+        self.assertIn(
+            f'sk_limiteur_rejets_total{{worker="{os.getpid()}",vue="login",portee="username"}} 3',
+            metriques.exposition(),
+        )
+
+    def test_rafale_simultanee(self):
+        lire = limiteur._lire
+
+        def lire_lentement(cle):
+            valeur = lire(cle)
+            time.sleep(0.002)  # élargit la fenêtre lecture -> écriture
+            return valeur
+
+        resultats = []
+        with mock.patch.object(limiteur, "_lire", lire_lentement):
+            fils = [
+                threading.Thread(target=lambda: resultats.append(limiteur.consommer("rafale", 5, 0.001)[0]))
+                for _ in range(20)
+            ]
+            for fil in fils:
+                fil.start()
+            for fil in fils:
+                fil.join()
+
+        self.assertEqual(resultats.count(True), 5)
+
+    def test_refus_sans_requete_sql(self):
+        request = RequestFactory().post("/login/", {"username": "client"})
+        request.user = mock.Mock(is_authenticated=False)
+        for _ in range(2):
+            limiteur.verifier("login", request)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(limiteur.verifier("login", request).status_code, 429)
+
+    def test_verrou_non_obtenu_laisse_passer(self):
+        @contextmanager
+        def occupe(cle):
+            yield False
+
+        with mock.patch.object(limiteur, "_verrou_seau", occupe):
+            self.assertEqual(limiteur.consommer("occupe", 1, 0.001), (True, 0))
+        self.assertIsNone(limiteur._lire("occupe"))
+
+
+# =========================
+# API REVENDEURS
+# =========================
+class APICommandesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("revendeur", "r@exemple.com")
+        comptes.provisionner(self.user)
+        comptes.crediter(self.user.id, 1000)
+        _, cle = api.creer_jeton(self.user)
+        self.entetes = {"HTTP_AUTHORIZATION": f"Bearer {cle}"}
+
+        categorie = Category.objects.create(nom="Licences")
+        self.licence = Licence.objects.create(nom="Licence", prix=300, category=categorie, destription="")
+
+    def soumettre(self, *items):
+        return self.client.post(
+            "/api/v1/commandes/", json.dumps({"commandes": list(items)}),
+            content_type="application/json", **self.entetes,
+        )
+
+    def item(self, **extra):
+        return {"type": "licence", "produit_id": self.licence.id, "email": "a@exemple.com",
+                "username_service": "a", **extra}
+
+    def solde(self):
+        return Wallet.objects.get(user=self.user).solde
+
+    def test_lot_un_seul_debit(self):
+        response = self.soumettre(self.item(), self.item())
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()["total"], response.json()["solde"]), (600, 400))
+        self.assertEqual(self.solde(), 400)
+        self.assertEqual(EntreeJournal.objects.filter(type="wallet.debit", user_id=self.user.id).count(), 1)
+        self.assertEqual(Commande.objects.filter(user=self.user, statut="attente").count(), 2)
+
+    def test_solde_insuffisant_402(self):
+        response = self.soumettre(*[self.item() for _ in range(4)])
+        self.assertEqual(response.status_code, 402)
+        self.assertEqual(response.json()["total"], 1200)
+        self.assertEqual(self.solde(), 1000)
+        self.assertFalse(Commande.objects.exists())
+
+    def test_types_invalides_400(self):
+        response = self.soumettre(
+            self.item(produit_id=[1]), self.item(email=123), self.item(champs=[]), self.item(produit_id=True),
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([d["index"] for d in response.json()["details"]], [0, 1, 2, 3])
+        self.assertFalse(Commande.objects.exists())
+
+    def test_champs_trop_longs_400(self):
+        response = self.soumettre(
+            self.item(username_service="a" * 151),
+            self.item(email="a" * 250 + "@exemple.com"),
+            self.item(photo_lien="https://exemple.com/" + "a" * 1000),
+        )
+        self.assertEqual(response.status_code, 400)
+        details = response.json()["details"]
+        self.assertEqual([d["index"] for d in details], [0, 1, 2])
+        self.assertEqual(details[0]["erreurs"], ["Nom d'utilisateur : 150 caractères maximum."])
+        self.assertIn("Email : 254 caractères maximum.", details[1]["erreurs"])
+        self.assertIn("Lien de photo : 1000 caractères maximum.", details[2]["erreurs"])
+        self.assertFalse(Commande.objects.exists())
+
+    def test_erreurs_par_index_rien_n_est_ecrit(self):
+        response = self.soumettre(self.item(), self.item(email="pas-un-email"), self.item(produit_id=999999))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()["details"],
+            [{"index": 1, "erreurs": ["Email invalide."]}, {"index": 2, "erreurs": ["produit introuvable"]}],
+        )
+        self.assertEqual(self.solde(), 1000)
+
+    def test_pagination_par_cle(self):
+        _commandes(self.user, 5)
+        vus = []
+        apres = 0
+        while apres is not None:
+            page = self.client.get(f"/api/v1/commandes/?limite=2&apres={apres}", **self.entetes).json()
+            vus += [c["id"] for c in page["resultats"]]
+            apres = page["suivant"]
+
+        self.assertEqual(vus, sorted(Commande.objects.values_list("id", flat=True)))
+        self.assertEqual(len(vus), 5)
+
+
+# =========================
+# PAGE COMMANDE (DÉBIT DU WALLET)
+# =========================
+class PageCommandeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("client", "client@exemple.com")
+        comptes.provisionner(self.user)
+        comptes.crediter(self.user.id, 500)
+        self.client.force_login(self.user)
+
+        categorie = Category.objects.create(nom="Licences")
+        self.licence = Licence.objects.create(nom="Licence", prix=300, category=categorie, destription="")
+        self.url = f"/commande/licence/{self.licence.id}/"
+
+    def commander(self, **donnees):
+        return self.client.post(self.url, {"email": "a@exemple.com", "username_service": "a", **donnees})
+
+    def solde(self):
+        return Wallet.objects.get(user=self.user).solde
+
+    def test_commande_debite_le_wallet(self):
+        self.assertRedirects(self.commander(), "/accueil/", fetch_redirect_response=False)
+        self.assertEqual(self.solde(), 200)
+        commande = Commande.objects.get(user=self.user)
+        self.assertEqual((commande.prix, commande.statut), (300, "attente"))
+        self.assertEqual(ResumeCompte.objects.get(user=self.user).commandes_attente, 1)
+        # la commande en attente est couverte par le débit : aucun écart pour l'audit
+        Transaction.objects.create(user=self.user, montant=500, methode="wave", reference="r", statut="valide")
+        ResumeCompte.objects.filter(user=self.user).update(total_depose=500)
+        self.assertEqual(audit.auditer(complet=True, enregistrer=False)[1], [])
+
+    def test_solde_insuffisant(self):
+        self.commander()
+        self.assertRedirects(self.commander(), "/fonds/", fetch_redirect_response=False)
+        self.assertEqual(self.solde(), 200)
+        self.assertEqual(Commande.objects.filter(user=self.user).count(), 1)
+
+    def test_champ_invalide_sans_debit(self):
+        self.assertRedirects(self.commander(email="pas-un-email"), self.url, fetch_redirect_response=False)
+        self.assertEqual(self.solde(), 500)
+        self.assertFalse(Commande.objects.exists())
+
+
+# =========================
+# ADMIN : ENREGISTREMENT PARTIEL
+# =========================
+class EnregistrementPartielTests(TestCase):
+    def test_date_maj_suit_les_champs_modifies(self):
+        user = User.objects.create_user("client")
+        commande = _commandes(user, 1)[0]
+        Commande.objects.filter(pk=commande.pk).update(date_maj=timezone.now() - timedelta(days=1))
+        commande.refresh_from_db()
+        avant = commande.date_maj
+
+        commande.email = "nouveau@exemple.com"
+        formulaire = mock.Mock(changed_data=["email"])
+        CommandeAdmin(Commande, admin.site).save_model(None, commande, formulaire, True)
+
+        commande.refresh_from_db()
+        self.assertEqual(commande.email, "nouveau@exemple.com")
+        self.assertGreater(commande.date_maj, avant)
+        # l'audit incrémental retrouve l'utilisateur
+        self.assertIn(user.id, audit._utilisateurs_modifies(avant + timedelta(seconds=1)))
+
+
+# =========================
+# EXPIRATION DES DEMANDES EN ATTENTE
+# =========================
+def _vieillir(queryset, jours=10):
+    queryset.update(date=timezone.now() - timedelta(days=jours))
+
+
+class ExpirationTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user("alice", "alice@exemple.com")
+        self.bob = User.objects.create_user("bob", "bob@exemple.com")
+        _vieillir(Commande.objects.filter(pk__in=[c.pk for c in _commandes(self.alice, 3, prix=100)]))
+        _vieillir(Commande.objects.filter(pk__in=[c.pk for c in _commandes(self.bob, 2, prix=250)]))
+        self.recente = Commande.objects.create(
+            user=self.alice, type_commande="service", nom_produit="Récente", prix=999, statut="attente"
+        )
+        ResumeCompte.objects.filter(user=self.alice).update(commandes_attente=4)
+
+    def expirer(self, taille=expiration.TAILLE_LOT):
+        with self.captureOnCommitCallbacks(execute=True):
+            return expiration.expirer_commandes(expiration.limite(7), taille)
+
+    def test_remboursement_par_utilisateur(self):
+        total, bilan = self.expirer()
+
+        self.assertEqual(total, 5)
+        self.assertEqual(Wallet.objects.get(user=self.alice).solde, 300)
+        self.assertEqual(Wallet.objects.get(user=self.bob).solde, 500)
+        # un seul crédit par utilisateur
+        credits = EntreeJournal.objects.filter(type="wallet.credit")
+        self.assertEqual(
+            sorted(credits.values_list("user_id", "montant")),
+            sorted([(self.alice.id, 300), (self.bob.id, 500)]),
+        )
+        self.assertEqual(EntreeJournal.objects.filter(type="commande.expiree").count(), 5)
+
+        resume = ResumeCompte.objects.get(user=self.alice)
+        self.assertEqual((resume.commandes_attente, resume.commandes_echec), (1, 3))
+        self.recente.refresh_from_db()
+        self.assertEqual(self.recente.statut, "attente")
+
+    def test_par_lots(self):
+        total, _ = self.expirer(taille=2)
+        self.assertEqual(total, 5)
+        self.assertEqual(Commande.objects.filter(statut="expire").count(), 5)
+        self.assertEqual(Historique.objects.filter(statut="expire").count(), 5)
+        # deuxième passage : plus rien
+        self.assertEqual(self.expirer(taille=2)[0], 0)
+
+    def test_un_seul_email_par_utilisateur(self):
+        depot = Transaction.objects.create(user=self.alice, montant=5000, methode="wave", reference="R1")
+        _vieillir(Transaction.objects.filter(pk=depot.pk))
+
+        bilan = expiration.nouveau_bilan()
+        expiration.expirer_commandes(expiration.limite(7), bilan=bilan)
+        expiration.expirer_depots(expiration.limite(3), bilan=bilan)
+        mail.outbox.clear()
+        self.assertEqual(expiration.prevenir(bilan), 2)
+
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ["alice@exemple.com", "bob@exemple.com"])
+        message = next(m for m in mail.outbox if m.to == ["alice@exemple.com"]).body
+        self.assertIn("300 FCFA ont été remboursés", message)
+        self.assertIn("Réf. R1", message)
+
+
+@unittest.skipUnless(connection.features.has_select_for_update_skip_locked, "SKIP LOCKED non supporté")
+class ExpirationVerrousTests(TransactionTestCase):
+    def test_ligne_verrouillee_sautee(self):
+        user = User.objects.create_user("client", "client@exemple.com")
+        commandes = _commandes(user, 3)
+        _vieillir(Commande.objects.all())
+
+        verrouillee, relachee = threading.Event(), threading.Event()
+
+        def admin_en_cours():
+            with transaction.atomic():
+                list(Commande.objects.select_for_update().filter(pk=commandes[0].pk))
+                verrouillee.set()
+                relachee.wait(10)
+            connection.close()
+
+        fil = threading.Thread(target=admin_en_cours)
+        fil.start()
+        verrouillee.wait(10)
+        try:
+            total, _ = expiration.expirer_commandes(expiration.limite(7), taille=1)
+        finally:
+            relachee.set()
+            fil.join()
+
+        self.assertEqual(total, 2)
+        self.assertEqual(Commande.objects.get(pk=commandes[0].pk).statut, "attente")
+
+
+# =========================
+# AUDIT DES WALLETS
+# =========================
+class AuditTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(f"u{i}") for i in range(3)]
+        for user in self.users:
+            comptes.provisionner(user)
+        # comptes ouverts depuis longtemps : hors de la fenêtre incrémentale
+        Wallet.objects.update(date_maj=timezone.now() - timedelta(days=2))
+
+    def derive(self, user, il_y_a):
+        """Solde faussé, date_maj comme si l'écriture datait de `il_y_a`."""
+        Wallet.objects.filter(user=user).update(solde=F("solde") + 50, date_maj=timezone.now() - il_y_a)
+
+    def test_points_de_controle(self):
+        self.assertEqual(audit.auditer(complet=True), (None, []))
+
+        # écart récent : vu par le passage incrémental
+        self.derive(self.users[0], timedelta(0))
+        verifies, ecarts = audit.auditer()
+        self.assertEqual(ecarts, [(self.users[0].id, "solde", 50, 0)])
+        self.assertEqual(PointControle.objects.get(nom=audit.POINT_CONTROLE).ecarts, [self.users[0].id])
+
+        # rien de nouveau : l'écart connu est revérifié quand même
+        verifies, ecarts = audit.auditer()
+        self.assertEqual(verifies, 1)
+        self.assertEqual([e[0] for e in ecarts], [self.users[0].id])
+
+        # écrit juste avant le passage précédent (transaction encore ouverte) : rattrapé par MARGE
+        point = PointControle.objects.get(nom=audit.POINT_CONTROLE)
+        self.derive(self.users[1], timezone.now() - point.position + audit.MARGE / 2)
+        self.assertEqual({e[0] for e in audit.auditer()[1]}, {self.users[0].id, self.users[1].id})
+
+        # écart ancien, hors fenêtre : seul le passage complet le trouve
+        self.derive(self.users[2], timedelta(days=1))
+        self.assertNotIn(self.users[2].id, {e[0] for e in audit.auditer()[1]})
+        self.assertEqual({e[0] for e in audit.auditer(complet=True)[1]}, {u.id for u in self.users})
+
+    def test_sans_enregistrer(self):
+        audit.auditer(complet=True)
+        self.derive(self.users[0], timedelta(0))
+        audit.auditer(enregistrer=False)
+        self.assertEqual(PointControle.objects.get(nom=audit.POINT_CONTROLE).ecarts, [])
+
+
+# =========================
+# EXPORT DU JOURNAL
+# =========================
+class ExportJournalTests(TestCase):
+    def setUp(self):
+        self.dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dossier, True)
+
+    def consigner(self, nombre, age=timedelta(minutes=1)):
+        for i in range(nombre):
+            journal.consigner("wallet.credit", 1, montant=i)
+        EntreeJournal.objects.filter(date__gt=timezone.now() - journal.DELAI).update(date=timezone.now() - age)
+
+    def exportes(self):
+        ids = []
+        for chemin in sorted(Path(self.dossier).iterdir()):
+            with gzip.open(chemin, "rt") as f:
+                ids += [json.loads(ligne)["id"] for ligne in f]
+        return ids
+
+    def test_deux_exports_sans_doublon_ni_trou(self):
+        self.consigner(5)
+        # trop récentes (DELAI) : une transaction plus ancienne pourrait encore valider un id plus petit
+        journal.consigner("wallet.debit", 1, montant=7)
+        journal.consigner("wallet.debit", 1, montant=8)
+
+        self.assertEqual(journal.exporter(self.dossier, taille=2)[0], 5)
+
+        EntreeJournal.objects.update(date=timezone.now() - timedelta(minutes=1))
+        self.consigner(3)
+        total, curseur = journal.exporter(self.dossier, taille=2)
+        self.assertEqual(total, 5)
+
+        tous = list(EntreeJournal.objects.order_by("id").values_list("id", flat=True))
+        self.assertEqual(self.exportes(), tous)
+        self.assertEqual(curseur, tous[-1])
+        self.assertEqual(journal.exporter(self.dossier)[0], 0)
+
+    def test_entree_validee_sous_le_curseur(self):
+        self.consigner(3)
+        premier, lent, dernier = EntreeJournal.objects.order_by("id")
+        # la transaction de `lent` n'est pas encore validée quand le curseur passe `dernier`
+        ident = lent.id
+        lent.delete()
+        self.assertEqual(journal.exporter(self.dossier)[0], 2)
+        self.assertEqual(PointControle.objects.get(nom="journal").curseur, dernier.id)
+
+        lent.id = ident
+        lent.save(force_insert=True)
+        self.assertEqual(journal.exporter(self.dossier)[0], 1)
+        self.assertEqual(sorted(self.exportes()), [premier.id, lent.id, dernier.id])
+        self.assertEqual(PointControle.objects.get(nom="journal").ecarts, [])
+
+    def test_trou_oublie_apres_trou_max(self):
+        self.consigner(3)
+        annule = EntreeJournal.objects.order_by("id")[1]
+        annule.delete()  # rollback : l'id ne sera jamais validé
+        journal.exporter(self.dossier)
+        self.assertEqual(len(PointControle.objects.get(nom="journal").ecarts), 1)
+
+        with mock.patch.object(journal, "TROU_MAX", timedelta(0)):
+            self.assertEqual(journal.exporter(self.dossier)[0], 0)
+        self.assertEqual(PointControle.objects.get(nom="journal").ecarts, [])
+
+    @override_settings(JOURNAL_FICHIER_MAX_OCTETS=1)
+    def test_rotation_par_taille(self):
+        self.consigner(5)
+        journal.exporter(self.dossier, taille=2)
+
+        fichiers = sorted(Path(self.dossier).iterdir())
+        # un lot par fichier dès que la taille max est atteinte
+        self.assertEqual(len(fichiers), 3)
+        self.assertEqual(len(self.exportes()), 5)
+
+
+# =========================
+# COMMANDES EN LOT (CSV D'IMEI)
+# =========================
+def _imei(debut):
+    """IMEI valide (clé de Luhn ajoutée) à partir de 14 chiffres."""
+    for cle in "0123456789":
+        if imei.luhn_valide(debut + cle):
+            return debut + cle
+
+
+class CommandeLotTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("client", "client@exemple.com")
+        comptes.provisionner(self.user)
+        self.service = ServiceImei.objects.create(
+            nom="Déblocage", prix=100, category=Category.objects.create(nom="IMEI"), destription="",
+        )
+        self.a, self.b = _imei("35693803564380"), _imei("49015420323751")
+
+    def lire(self, contenu, **defauts):
+        return commandes.lire_lot(
+            io.BytesIO(contenu.encode()), self.user, "service", self.service,
+            {"email": "a@exemple.com", "username_service": "a", **defauts},
+        )
+
+    def test_erreurs_par_ligne(self):
+        valides, rapport = self.lire(
+            f"IMEI;Email\n{self.a};\n;\n12345;\n{self.a[:-1]}0;\n{self.a};\n{self.b};b@exemple.com\n"
+        )
+
+        self.assertEqual([ligne["ligne"] for ligne in rapport], [2, 4, 5, 6, 7])
+        self.assertEqual(rapport[0]["erreurs"], [])
+        self.assertIn("15 chiffres", rapport[1]["erreurs"][0])
+        self.assertIn("Luhn", rapport[2]["erreurs"][0])
+        self.assertEqual(rapport[3]["erreurs"], ["IMEI en double (ligne 2)."])
+        self.assertEqual([ligne.commande.email for _, ligne in valides], ["a@exemple.com", "b@exemple.com"])
+
+    def test_en_tete_sans_imei(self):
+        with self.assertRaises(commandes.CommandeInvalide):
+            self.lire(f"numero\n{self.a}\n")
+
+    def test_lignes_max(self):
+        with mock.patch.object(commandes, "LOT_LIGNES_MAX", 1):
+            with self.assertRaisesMessage(commandes.CommandeInvalide, "1 lignes maximum"):
+                self.lire(f"imei\n{self.a}\n{self.b}\n")
+
+    def televerser(self, contenu):
+        self.client.force_login(self.user)
+        fichier = io.BytesIO(contenu.encode())
+        fichier.name = "lot.csv"
+        return self.client.post(
+            f"/commande/service/{self.service.id}/lot/",
+            {"fichier": fichier, "email": "a@exemple.com", "username_service": "a"},
+        )
+
+    def test_page_cree_les_lignes_valides(self):
+        comptes.crediter(self.user.id, 1000)
+        response = self.televerser(f"imei\n{self.a}\n123\n{self.b}\n")
+
+        self.assertEqual(response.context["nombre_creees"], 2)
+        self.assertEqual(response.context["nombre_erreurs"], 1)
+        self.assertEqual(Wallet.objects.get(user=self.user).solde, 800)
+        self.assertEqual(
+            sorted(Commande.objects.values_list("imei", flat=True)), sorted([self.a, self.b])
+        )
+
+    def test_page_solde_insuffisant(self):
+        comptes.crediter(self.user.id, 150)
+        response = self.televerser(f"imei\n{self.a}\n{self.b}\n")
+
+        self.assertEqual(response.context["nombre_creees"], 0)
+        self.assertContains(response, "Solde insuffisant")
+        self.assertFalse(Commande.objects.exists())
+        self.assertEqual(Wallet.objects.get(user=self.user).solde, 150)
+
+
+# =========================
+# ACCUEIL : CATALOGUE COMPLET PAR PAGES
+# =========================
+class AccueilCatalogueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("client")
+        comptes.provisionner(self.user)
+        self.client.force_login(self.user)
+        self.noms = [f"Catégorie {i}" for i in range(7)]
+        for nom in self.noms:
+            Category.objects.create(nom=nom)
+
+    def noms_affiches(self, response):
+        return [nom for nom in self.noms if f">{nom}</h2>" in response.content.decode()]
+
+    def test_accueil_montre_tout_le_catalogue(self):
+        response = self.client.get("/accueil/")
+        self.assertEqual(len(self.noms_affiches(response)), views.CATEGORIES_PAR_PAGE)
+        self.assertContains(response, "?page=2")
+
+        suite = self.client.get("/accueil/recherche/?page=2")
+        self.assertEqual(len(self.noms_affiches(suite)), 7 - views.CATEGORIES_PAR_PAGE)
+        self.assertNotContains(suite, "Voir plus")
+
+        # toutes les catégories, chacune une seule fois
+        self.assertEqual(sorted(self.noms_affiches(response) + self.noms_affiches(suite)), sorted(self.noms))
+
+    def test_recherche_vide_revient_au_catalogue(self):
+        response = self.client.get("/accueil/recherche/?q=")
+        self.assertEqual(len(self.noms_affiches(response)), views.CATEGORIES_PAR_PAGE)
+        self.assertContains(response, "Voir plus")
+
+
+# =========================
+# ÉVÉNEMENTS TEMPS RÉEL
+# =========================
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "sse"}})
+class EvenementsTests(SimpleTestCase):
+    def setUp(self):
+        caches["default"].clear()
+
+    def test_flux_reveille_par_un_evenement_publie(self):
+        async def lire():
+            messages = evenements.flux(7, evenements.sequence(7))
+            self.assertTrue((await messages.__anext__()).startswith("retry:"))
+
+            suivant = asyncio.ensure_future(messages.__anext__())
+            await asyncio.sleep(0)
+            # publié depuis un autre thread, comme le on_commit d'une vue
+            await asyncio.to_thread(evenements._diffuser, 7, "commande", {"id": 3, "statut": "success"})
+            try:
+                # bien avant POLL_SECONDES : réveil immédiat, pas relecture périodique
+                return await asyncio.wait_for(suivant, 1)
+            finally:
+                await messages.aclose()
+
+        message = asyncio.run(lire())
+        self.assertTrue(message.startswith("id: 1\nevent: commande\n"))
+        self.assertEqual(json.loads(message.split("data: ")[1]), {"type": "commande", "id": 3, "statut": "success"})
+        self.assertEqual(evenements._abonnes, {})
+
+    def test_reprise_depuis_le_dernier_id(self):
+        for statut in ("pending", "success"):
+            evenements._diffuser(7, "commande", {"id": 3, "statut": statut})
+        self.assertEqual(evenements.sequence(7), 2)
+
+        async def lire():
+            messages = evenements.flux(7, 1)
+            await messages.__anext__()
+            try:
+                return await asyncio.wait_for(messages.__anext__(), 1)
+            finally:
+                await messages.aclose()
+
+        with mock.patch.object(evenements, "POLL_SECONDES", 0.01):
+            message = asyncio.run(lire())
+        self.assertTrue(message.startswith("id: 2\n"))
+        self.assertIn('"statut": "success"', message)
+
+
+# =========================
+# INDEX TAC
+# =========================
+class IndexTACTests(SimpleTestCase):
+    def setUp(self):
+        dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dossier)
+        self.chemin = os.path.join(dossier, "tac.idx")
+
+    def test_libelle_long_coupe_sur_un_caractere_entier(self):
+        # "é" = 2 octets : la limite tombe au milieu du dernier
+        modele = "a" + "é" * 40000
+        imei.ecrire_index(self.chemin, {35332811: ("Marque", modele), 35332812: ("Tecno", "Spark 10")})
+
+        index = imei.IndexTAC(self.chemin)
+        marque, lu = index.chercher(35332811)
+        self.assertEqual(marque, "Marque")
+        self.assertTrue(modele.startswith(lu))
+        self.assertLessEqual(len(f"Marque\x1f{lu}".encode()), imei.LIBELLE_MAX)
+        self.assertEqual(index.chercher(35332812), ("Tecno", "Spark 10"))
+        self.assertIsNone(index.chercher(35332813))
+
+
+# =========================
+# RECHERCHE DES COMMANDES (SUPPORT)
+# =========================
+class RechercheCommandesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("client")
+        self.a, self.b = _imei("35693803564380"), _imei("35693899999999")
+        Commande.objects.bulk_create([
+            Commande(user=self.user, type_commande="service", nom_produit="A", prix=1, email="Awa.Diop@exemple.com",
+                     username_service="awa_d", imei=self.a, imei_normalise=self.a),
+            Commande(user=self.user, type_commande="service", nom_produit="B", prix=1, email="moussa@exemple.com",
+                     username_service="moussa221", imei=self.b, imei_normalise=self.b),
+            Commande(user=self.user, type_commande="licence", nom_produit="C", prix=1, email="kone@exemple.com",
+                     username_service="awa_k"),
+        ])
+
+    def noms(self, terme):
+        return sorted(c.nom_produit for c in commandes.rechercher(terme))
+
+    def test_imei_complet_ou_debut(self):
+        self.assertEqual(self.noms(self.a), ["A"])
+        self.assertEqual(self.noms(f"{self.a[:2]} {self.a[2:8]}-{self.a[8:]}"), ["A"])
+        self.assertEqual(self.noms("356938"), ["A", "B"])
+        self.assertEqual(self.noms("3569389"), ["B"])
+        # préfixe uniquement, pas de sous-chaîne
+        self.assertEqual(self.noms(self.a[4:10]), [])
+
+    def test_email_et_nom_d_utilisateur(self):
+        self.assertEqual(self.noms("awa.diop@"), ["A"])
+        self.assertEqual(self.noms("AWA_"), ["A", "C"])
+        self.assertEqual(self.noms("moussa"), ["B"])
+        self.assertEqual(self.noms("exemple.com"), [])
+
+    def test_terme_trop_court(self):
+        self.assertIsNone(commandes.filtre_recherche("aw"))
+        self.assertIsNone(commandes.filtre_recherche("35"))
+        self.assertEqual(commandes.rechercher(" "), [])
+
+    def test_recherche_admin(self):
+        staff = User.objects.create_superuser("staff")
+        self.client.force_login(staff)
+        response = self.client.get("/admin/serveur/commande/", {"q": "3569389"})
+        self.assertEqual(response.context["cl"].result_count, 1)
+
+    def test_commande_chercher_commande(self):
+        sortie = io.StringIO()
+        call_command("chercher_commande", "moussa", stdout=sortie)
+        self.assertIn("username=moussa221", sortie.getvalue())
+        self.assertIn("1 commande(s).", sortie.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command("chercher_commande", "ab", stdout=io.StringIO())
+
+
+# =========================
+# COMPTEURS DU TABLEAU DE BORD
+# =========================
+class CompteursTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("client", "client@exemple.com")
+        comptes.provisionner(self.user)
+        comptes.crediter(self.user.id, 1000)
+        categorie = Category.objects.create(nom="Licences")
+        self.licence = Licence.objects.create(nom="Licence", prix=300, category=categorie, destription="")
+
+    def resume(self, user=None):
+        return ResumeCompte.objects.filter(user=user or self.user).values(*compteurs.CHAMPS).get()
+
+    def commander(self, nombre=1):
+        donnees = {"email": "a@exemple.com", "username_service": "a"}
+        return commandes.creer(
+            self.user, [commandes.preparer(self.user, "licence", self.licence, donnees) for _ in range(nombre)]
+        )
+
+    def test_commande_et_transitions(self):
+        premiere, seconde = self.commander(2)
+        self.assertEqual(self.resume()["commandes_attente"], 2)
+
+        transitions.valider_commandes(Commande.objects.filter(pk=premiere.pk))
+        transitions.refuser_commandes(Commande.objects.filter(pk=seconde.pk))
+        resume = self.resume()
+        self.assertEqual(
+            (resume["commandes_attente"], resume["commandes_succes"], resume["commandes_echec"]), (0, 1, 1)
+        )
+        self.assertEqual(resume["total_depense"], 300)
+
+        depot = Transaction.objects.create(user=self.user, montant=500, methode="wave", reference="r")
+        compteurs.depot_demande(depot)
+        self.assertEqual(self.resume()["depots_attente"], 1)
+        transitions.valider_depots(Transaction.objects.filter(pk=depot.pk))
+        self.assertEqual((self.resume()["depots_attente"], self.resume()["total_depose"]), (0, 500))
+
+    def test_un_seul_update_borne_a_zero(self):
+        with self.assertNumQueries(1):
+            compteurs.incrementer(self.user.id, commandes_attente=-3, total_depense=50)
+        self.assertEqual((self.resume()["commandes_attente"], self.resume()["total_depense"]), (0, 50))
+
+    def test_premiere_operation_cree_la_ligne(self):
+        ResumeCompte.objects.filter(user=self.user).delete()
+        compteurs.incrementer(self.user.id, depots_attente=1)
+        self.assertEqual(self.resume()["depots_attente"], 1)
+
+    def test_recalculer(self):
+        self.commander(3)
+        transitions.valider_commandes(Commande.objects.filter(pk=Commande.objects.first().pk))
+        Transaction.objects.create(user=self.user, montant=700, methode="wave", reference="r", statut="valide")
+        inactif = User.objects.create_user("inactif")
+        attendu = {
+            "commandes_attente": 2, "commandes_succes": 1, "commandes_echec": 0,
+            "total_depense": 300, "depots_attente": 0, "total_depose": 700,
+        }
+
+        # compteurs faussés, une ligne manquante : tout est réécrit en upsert
+        ResumeCompte.objects.update(commandes_attente=99, total_depense=1)
+        ResumeCompte.objects.filter(user=inactif).delete()
+        self.assertEqual(compteurs.recalculer(batch_size=1), 2)
+
+        self.assertEqual(self.resume(), attendu)
+        self.assertEqual(self.resume(inactif), dict.fromkeys(compteurs.CHAMPS, 0))
+
+
+# =========================
+# COMPTE DE LA REQUÊTE (request.account)
+# =========================
+class CompteTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("client", "client@exemple.com")
+
+    def requete(self, backend="serveur.comptes.CompteBackend"):
+        request = RequestFactory().get("/")
+        request.session = SessionStore()
+        request.session.update({SESSION_KEY: str(self.user.pk), BACKEND_SESSION_KEY: backend})
+        request.session[HASH_SESSION_KEY] = self.user.get_session_auth_hash()
+        AuthenticationMiddleware(lambda r: None).process_request(request)
+        CompteMiddleware(lambda r: HttpResponse())(request)
+        return request
+
+    def test_provisionne_a_la_creation(self):
+        self.assertEqual(Wallet.objects.get(user=self.user).solde, 0)
+        self.assertTrue(ResumeCompte.objects.filter(user=self.user).exists())
+
+        # chargement de fixtures (raw) : les lignes viennent de la fixture elle-même
+        signals.provisionner_compte(User, User(pk=999), created=True, raw=True)
+        self.assertFalse(Wallet.objects.filter(user_id=999).exists())
+
+    def test_compte_en_une_requete(self):
+        request = self.requete()
+        with self.assertNumQueries(1):
+            compte = request.account
+            self.assertEqual((compte.wallet.solde, compte.resume.commandes_attente), (0, 0))
+        with self.assertNumQueries(0):
+            self.assertEqual(request.account.wallet.user_id, self.user.pk)
+
+    def test_session_de_l_ancien_backend(self):
+        request = self.requete("django.contrib.auth.backends.ModelBackend")
+        self.assertEqual(request.session[BACKEND_SESSION_KEY], "serveur.comptes.CompteBackend")
+        self.assertEqual(request.account.user.pk, self.user.pk)
+
+    def test_compte_sans_wallet_sans_ecriture(self):
+        Wallet.objects.filter(user=self.user).delete()
+        request = self.requete()
+        self.assertEqual(request.account.user.pk, self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(request.account.wallet.solde, 0)
+        self.assertFalse(Wallet.objects.filter(user=self.user).exists())
+
+    def test_migration_0019(self):
+        migration = importlib.import_module("serveur.migrations.0019_provisionner_comptes")
+        ancien = User.objects.create_user("ancien")
+        Wallet.objects.filter(user=ancien).delete()
+        ResumeCompte.objects.filter(user=ancien).delete()
+        Commande.objects.bulk_create([
+            Commande(user=ancien, type_commande="licence", nom_produit="P", prix=prix, statut=statut,
+                     email="a@exemple.com", username_service="a")
+            for prix, statut in ((100, "attente"), (200, "succes"), (300, "refuse"))
+        ])
+        Transaction.objects.create(user=ancien, montant=500, methode="wave", reference="r", statut="valide")
+        ResumeCompte.objects.filter(user=self.user).update(commandes_attente=7)
+
+        migration.provisionner_comptes(django_apps, None)
+
+        self.assertEqual(Wallet.objects.get(user=ancien).solde, 0)
+        resume = ResumeCompte.objects.filter(user=ancien).values(*compteurs.CHAMPS).get()
+        self.assertEqual(resume, {
+            "commandes_attente": 1, "commandes_succes": 1, "commandes_echec": 1,
+            "total_depense": 200, "depots_attente": 0, "total_depose": 500,
+        })
+        # résumés existants inchangés
+        self.assertEqual(ResumeCompte.objects.get(user=self.user).commandes_attente, 7)
+
+
+# =========================
+# MÉTRIQUES (PROMETHEUS)
+# =========================
+class MetriquesTests(TestCase):
+    def test_acces_staff_ou_jeton(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+
+        with override_settings(METRIQUES_TOKEN="secret"):
+            self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer faux").status_code, 403)
+            response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+
+        # jeton non configuré : "Bearer " seul ne suffit pas
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer ").status_code, 403)
+
+        self.client.force_login(User.objects.create_user("staff", is_staff=True))
+        self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+    def test_requetes_http_comptees_par_worker(self):
+        avant = metriques.REQUETES.valeurs.get(("metrics", 403), 0)
+        self.client.get("/metrics")
+        self.client.get("/metrics")
+        self.assertEqual(metriques.REQUETES.valeurs[("metrics", 403)], avant + 2)
+
+        texte = metriques.exposition()
+        worker = os.getpid()
+        self.assertIn(f'sk_http_requetes_total{{worker="{worker}",vue="metrics",code="403"}} {avant + 2}', texte)
+        self.assertIn(
+            f'sk_http_duree_secondes_bucket{{worker="{worker}",vue="metrics",methode="GET",le="+Inf"}}', texte
+        )
+
+    def test_histogramme(self):
+        histogramme = metriques.Histogramme("h", "aide", ("vue",), buckets=(1, 5))
+        for valeur in (0.5, 3, 10):
+            histogramme.observer(valeur, vue="a")
+        worker = os.getpid()
+        self.assertEqual(list(histogramme.lignes()), [
+            f'h_bucket{{worker="{worker}",vue="a",le="1"}} 1',
+            f'h_bucket{{worker="{worker}",vue="a",le="5"}} 2',
+            f'h_bucket{{worker="{worker}",vue="a",le="+Inf"}} 3',
+            f'h_sum{{worker="{worker}",vue="a"}} 13.5',
+            f'h_count{{worker="{worker}",vue="a"}} 3',
+        ])
+
+    def test_emails_envoyes_et_en_echec(self):
+        envoyes = metriques.EMAILS.valeurs.get(("envoye",), 0)
+        echecs = metriques.EMAILS.valeurs.get(("echec",), 0)
+        messages = [mail.EmailMessage("s", "c", to=["a@exemple.com"]) for _ in range(3)]
+
+        with mock.patch.object(SMTPEmailBackend, "send_messages", return_value=2):
+            self.assertEqual(EmailBackendMesure().send_messages(messages), 2)
+
+        self.assertEqual(metriques.EMAILS.valeurs[("envoye",)], envoyes + 2)
+        self.assertEqual(metriques.EMAILS.valeurs[("echec",)], echecs + 1)
+
+    def test_files_attente(self):
+        _commandes(User.objects.create_user("client"), 2)
+        caches["default"].delete("metriques:files_attente")
+        self.assertIn('sk_commandes_attente{type="service"} 2', metriques.exposition())
+
+
+# =========================
+# AUTOCOMPLÉTION DU CATALOGUE
+# =========================
+class AutocompletionTests(TestCase):
+    def setUp(self):
+        versions.oublier()
+        logiciels = Category.objects.create(nom="Logiciels")
+        Category.objects.create(nom="Déblocage")
+        for nom in ("Windows Pro", "Office Pro Plus", "Antivirus"):
+            Licence.objects.create(nom=nom, prix=1000, category=logiciels, destription="")
+
+    def noms(self, prefixe, **params):
+        response = self.client.get("/autocompletion/", {"q": prefixe, **params})
+        return [r["nom"] for r in response.json()["resultats"]]
+
+    def test_debut_de_mot_sans_accent(self):
+        self.assertEqual(sorted(self.noms("pro")), ["Office Pro Plus", "Windows Pro"])
+        self.assertEqual(self.noms("DEBL"), ["Déblocage"])
+        self.assertEqual(self.noms("pro pl"), ["Office Pro Plus"])
+        # milieu de mot : pas de résultat
+        self.assertEqual(self.noms("ndows"), [])
+        self.assertEqual(self.noms(""), [])
+
+    def test_limite(self):
+        self.assertEqual(len(self.noms("pro", limite=1)), 1)
+        index = autocompletion.Index([{"nom": f"Pack {i}"} for i in range(50)])
+        self.assertEqual(len(index.chercher("pack")), autocompletion.LIMITE_DEFAUT)
+        self.assertEqual(len(self.noms("", limite="abc")), 0)
+
+    def test_etag_et_304(self):
+        response = self.client.get("/autocompletion/", {"q": "pro"})
+        etag = response["ETag"]
+
+        response = self.client.get("/autocompletion/", {"q": " PRO "}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotEqual(self.client.get("/autocompletion/", {"q": "win"})["ETag"], etag)
+
+    def test_index_reconstruit_apres_changement_du_catalogue(self):
+        self.assertEqual(self.noms("term"), [])
+        version, index = autocompletion.index()
+        with self.assertNumQueries(0):
+            self.assertIs(autocompletion.index()[1], index)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Licence.objects.create(nom="Terminal Server", prix=1, category=Category.objects.first(), destription="")
+
+        self.assertEqual(self.noms("term"), ["Terminal Server"])
+        ancien_etag = f'"{version}-{autocompletion.LIMITE_DEFAUT}-'
+        self.assertFalse(self.client.get("/autocompletion/", {"q": "term"})["ETag"].startswith(ancien_etag))
+
+
+# =========================
+# RÉCAPITULATIF DES NOTIFICATIONS ADMIN
+# =========================
+@override_settings(NOTIFICATIONS_DIGEST=True, NOTIFICATIONS_FENETRE_MINUTES=15, NOTIFICATIONS_SEUIL_IMMEDIAT=50000)
+class NotificationsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("client", "client@exemple.com")
+
+    def commander(self, imei_debut="35693803564380"):
+        commande = Commande(
+            user=self.user, type_commande="service", nom_produit="Déblocage", prix=300,
+            email="service@exemple.com", username_service="awa", imei=_imei(imei_debut),
+        )
+        notifications.notifier_plusieurs("commande", self.user, [commandes._notification(self.user, commande, [])])
+
+    def vieillir(self):
+        Notification.objects.update(date=timezone.now() - timedelta(minutes=20))
+
+    def test_digest_apres_commit_une_fois_la_fenetre_echue(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.commander()
+        self.assertEqual(mail.outbox, [])
+
+        self.vieillir()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.commander("49015420323751")
+            notifications.notifier("depot", self.user, "wave", 5000, "Dépôt", "Référence : W-42")
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, "📋 SK Serveur : 2 commande(s), 1 dépôt(s)")
+        self.assertFalse(Notification.objects.filter(envoyee_le__isnull=True).exists())
+
+    def test_contenu_groupe_et_detail(self):
+        self.commander()
+        self.commander("49015420323751")
+        notifications.notifier("depot", self.user, "wave", 5000, "Dépôt", "Référence : W-42")
+
+        self.assertEqual(notifications.envoyer_digest(force=True), 3)
+        corps = mail.outbox[0].body
+        self.assertIn("🛒 COMMANDES : 2 — 600 FCFA", corps)
+        self.assertIn("  • Déblocage : 2 — 600 FCFA", corps)
+        self.assertIn("💰 DÉPÔTS : 1 — 5000 FCFA", corps)
+        self.assertIn("  • wave : 1 — 5000 FCFA", corps)
+        # champs de chaque commande, comme dans l'e-mail individuel
+        self.assertIn(f"    IMEI : {_imei('35693803564380')}", corps)
+        self.assertIn("    Email service : service@exemple.com", corps)
+        self.assertIn("    Référence : W-42", corps)
+
+    def test_gros_montant_envoye_tout_de_suite(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications.notifier("depot", self.user, "wave", 60000, "Dépôt", "Référence : W-1")
+
+        self.assertEqual([m.subject for m in mail.outbox], ["⚡ Dépôt"])
+        self.assertEqual(notifications.envoyer_digest(force=True), 0)
+
+    def test_verrou_un_seul_envoi(self):
+        self.commander()
+        caches["default"].add(notifications.VERROU, 1, 300)
+        self.assertEqual(notifications.envoyer_digest(force=True), 0)
+        self.assertEqual(mail.outbox, [])
+
+        caches["default"].delete(notifications.VERROU)
+        self.assertEqual(notifications.envoyer_digest(force=True), 1)
+        self.assertEqual(notifications.envoyer_digest(force=True), 0)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_echec_smtp_remet_en_attente(self):
+        self.commander()
+        with mock.patch.object(notifications, "_envoyer", side_effect=OSError("smtp")):
+            self.assertEqual(notifications.envoyer_si_echu(), 0)
+            self.vieillir()
+            self.assertEqual(notifications.envoyer_si_echu(), 0)
+        self.assertTrue(Notification.objects.filter(envoyee_le__isnull=True).exists())
+
+    @override_settings(NOTIFICATIONS_DIGEST=False)
+    def test_mode_direct(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.commander()
+            self.commander("49015420323751")
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(Notification.objects.exists())
+
+
+# =========================
+# TEST DE CHARGE : PRÉPARATION DES COMPTES
+# =========================
+class PreparationChargeTests(TestCase):
+    def test_solde_fixe_a_chaque_lancement(self):
+        for _ in range(2):
+            charge.Command(stdout=io.StringIO())._preparer(3)
+
+        soldes = Wallet.objects.filter(user__username__startswith=charge.PREFIXE).values_list("solde", flat=True)
+        self.assertEqual(list(soldes), [10**9] * 3)
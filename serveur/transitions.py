@@ -0,0 +1,172 @@
+"""
+Machine à états des commandes et des dépôts.
+
+Un changement de statut est un UPDATE conditionnel
+(WHERE statut = <attendu> AND version = <lue>) qui incrémente `version`.
+Quand deux opérateurs traitent les mêmes lignes, chaque ligne n'est gagnée
+qu'une fois et seul le gagnant applique les effets (historique,
+remboursement, crédit, e-mail) ; l'autre voit 0 ligne modifiée et passe.
+Aucun verrou posé à la lecture : des lots différents ne s'attendent jamais.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import compteurs, comptes, evenements, journal
+from .models import Historique
+
+
+# statut de départ -> statuts d'arrivée autorisés
+COMMANDE = {
+    "attente": {"succes", "refuse", "expire"},
+}
+DEPOT = {
+    "attente": {"valide", "refuse", "expire"},
+}
+
+
+class TransitionInvalide(ValueError):
+    pass
+
+
+def basculer(queryset, depuis, vers, etats):
+    """
+    Fait passer les lignes de `queryset` de `depuis` à `vers`.
+    Retourne les objets effectivement basculés par cet appel (à jour).
+    """
+    if vers not in etats.get(depuis, ()):
+        raise TransitionInvalide(f"{depuis} -> {vers} interdit")
+
+    modele = queryset.model
+    gagnees = []
+    for obj in queryset.filter(statut=depuis):
+        if modele.objects.filter(pk=obj.pk, statut=depuis, version=obj.version).update(
+            statut=vers, version=F("version") + 1, date_maj=timezone.now()
+        ):
+            obj.statut = vers
+            obj.version += 1
+            gagnees.append(obj)
+    return gagnees
+
+
+def _par_user(objets, champ):
+    totaux = defaultdict(lambda: [0, 0])
+    for obj in objets:
+        totaux[obj.user_id][0] += 1
+        totaux[obj.user_id][1] += getattr(obj, champ)
+    return totaux
+
+
+def _envoyer_apres_commit(messages):
+    # une seule connexion SMTP pour tout le lot, hors transaction
+    if messages:
+        transaction.on_commit(lambda: send_mass_mail(messages, fail_silently=True))
+
+
+# =========================
+# COMMANDES
+# =========================
+def valider_commandes(queryset):
+    with transaction.atomic():
+        commandes = basculer(queryset.select_related("user"), "attente", "succes", COMMANDE)
+        journal.consigner_commandes("commande.validee", commandes)
+
+        for user_id, (nombre, montant) in _par_user(commandes, "prix").items():
+            compteurs.incrementer(
+                user_id, commandes_attente=-nombre, commandes_succes=nombre, total_depense=montant
+            )
+            evenements.publier_compte(user_id)
+
+        Historique.objects.bulk_create([
+            Historique(user=c.user, nom_service=c.nom_produit, prix=c.prix, statut="succes")
+            for c in commandes
+        ])
+
+        for c in commandes:
+            evenements.publier(c.user_id, "commande", id=c.id, statut=c.statut, nom=c.nom_produit)
+
+        # 📧 EMAIL UTILISATEUR
+        _envoyer_apres_commit([
+            (
+                "✅ Commande validée - SK Serveur",
+                f"Bonjour {c.user.username},\n\n"
+                f"Votre commande '{c.nom_produit}' a été VALIDÉE avec succès.\n"
+                f"Montant : {c.prix} FCFA\n\n"
+                f"Merci pour votre confiance.\n"
+                f"— SK Serveur",
+                settings.DEFAULT_FROM_EMAIL,
+                [c.user.email],
+            )
+            for c in commandes
+        ])
+    return commandes
+
+
+def refuser_commandes(queryset):
+    with transaction.atomic():
+        commandes = basculer(queryset.select_related("user"), "attente", "refuse", COMMANDE)
+        journal.consigner_commandes("commande.refusee", commandes)
+
+        for user_id, (nombre, montant) in _par_user(commandes, "prix").items():
+            compteurs.incrementer(user_id, commandes_attente=-nombre, commandes_echec=nombre)
+            # 💰 remboursement : un seul crédit par utilisateur
+            comptes.crediter(user_id, montant, motif="remboursement")
+            evenements.publier_compte(user_id)
+
+        Historique.objects.bulk_create([
+            Historique(user=c.user, nom_service=c.nom_produit, prix=c.prix, statut="echec")
+            for c in commandes
+        ])
+
+        for c in commandes:
+            evenements.publier(c.user_id, "commande", id=c.id, statut=c.statut, nom=c.nom_produit)
+
+        # 📧 EMAIL UTILISATEUR
+        _envoyer_apres_commit([
+            (
+                "❌ Commande refusée - SK Serveur",
+                f"Bonjour {c.user.username},\n\n"
+                f"Votre commande '{c.nom_produit}' a été REFUSÉE.\n"
+                f"Le montant de {c.prix} FCFA a été remboursé dans votre solde.\n\n"
+                f"— SK Serveur",
+                settings.DEFAULT_FROM_EMAIL,
+                [c.user.email],
+            )
+            for c in commandes
+        ])
+    return commandes
+
+
+# =========================
+# DÉPÔTS
+# =========================
+def valider_depots(queryset):
+    with transaction.atomic():
+        depots = basculer(queryset, "attente", "valide", DEPOT)
+        journal.consigner_depots("depot.valide", depots)
+
+        for user_id, (nombre, montant) in _par_user(depots, "montant").items():
+            compteurs.incrementer(user_id, depots_attente=-nombre, total_depose=montant)
+            comptes.crediter(user_id, montant, motif="depot")
+            evenements.publier_compte(user_id)
+
+        for t in depots:
+            evenements.publier(t.user_id, "depot", id=t.id, statut=t.statut, libelle=t.get_statut_display())
+    return depots
+
+
+def refuser_depots(queryset):
+    with transaction.atomic():
+        depots = basculer(queryset, "attente", "refuse", DEPOT)
+        journal.consigner_depots("depot.refuse", depots)
+
+        for user_id, (nombre, _) in _par_user(depots, "montant").items():
+            compteurs.incrementer(user_id, depots_attente=-nombre)
+
+        for t in depots:
+            evenements.publier(t.user_id, "depot", id=t.id, statut=t.statut, libelle=t.get_statut_display())
+    return depots
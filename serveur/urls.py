@@ -1,6 +1,6 @@
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views
+from . import api, views
 
 urlpatterns = [
     # PAGE PUBLIQUE
@@ -13,8 +13,12 @@ urlpatterns = [
 
     # PRIVÉ
     path("accueil/", views.accueil, name="accueil"),
+    path("accueil/section/<int:categorie_id>/", views.accueil_section, name="accueil_section"),
+    path("accueil/recherche/", views.accueil_recherche, name="accueil_recherche"),
+    path("autocompletion/", views.autocompletion_catalogue, name="autocompletion"),
     path("fonds/", views.fonds, name="fonds"),
     path("ajouter-fonds/", views.ajouter_fonds, name="ajouter_fonds"),
+    path("evenements/", views.evenements_compte, name="evenements"),
 
     # COMMANDE
     path(
@@ -22,4 +26,21 @@ urlpatterns = [
         views.commande,
         name="commande"
     ),
+    path(
+        "commande/<str:type_produit>/<int:produit_id>/lot/",
+        views.commande_lot,
+        name="commande_lot"
+    ),
+
+    # API REVENDEURS (JSON, JETON)
+    path("api/v1/catalogue/", api.catalogue, name="api_catalogue"),
+    path("api/v1/commandes/", api.commandes_api, name="api_commandes"),
+
+    # SUPERVISION
+    path("metrics", views.metrics, name="metrics"),
+    path("supervision/profils/", views.profils, name="profils"),
+    path("supervision/profils/<str:ident>/", views.profil, name="profil"),
+
+    # IMAGES PRODUITS (MINIATURES)
+    path("img/<str:jeton>/<int:largeur>/", views.image_miniature, name="image_miniature"),
 ]
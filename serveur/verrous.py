@@ -0,0 +1,47 @@
+"""
+Verrous courts entre workers, posés dans le cache partagé.
+
+`cache.add` n'écrit que si la clé est absente, de façon atomique sur tous les
+backends (Redis SET NX, contrainte unique de la table de cache) : le worker
+qui l'a ajoutée tient le verrou jusqu'au `delete`, ou au plus DUREE secondes
+s'il meurt entre-temps. Pour les lire-modifier-écrire de quelques
+millisecondes (seaux du limiteur sous Redis, séquence des événements), pas plus.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+
+ATTENTE = 0.5
+DUREE = 2
+PAUSE = 0.005
+
+# cache indisponible : on ne protège plus que les threads du processus
+_local = threading.Lock()
+
+
+@contextmanager
+def verrou(nom, attente=ATTENTE, duree=DUREE):
+    """Fournit True si le verrou est tenu, False s'il n'a pas pu l'être à temps."""
+    cle = f"verrou:{nom}"
+    try:
+        fin = time.monotonic() + attente
+        obtenu = cache.add(cle, 1, duree)
+        while not obtenu and time.monotonic() < fin:
+            time.sleep(PAUSE)
+            obtenu = cache.add(cle, 1, duree)
+    except Exception:
+        with _local:
+            yield True
+        return
+
+    try:
+        yield obtenu
+    finally:
+        if obtenu:
+            try:
+                cache.delete(cle)
+            except Exception:
+                pass  # expirera après DUREE
@@ -0,0 +1,74 @@
+"""
+Tampons de version partagés (catalogue, configuration...).
+
+Un tampon est une valeur opaque stockée dans le cache Django ; toute
+modification des données concernées le remplace, et chaque worker compare le
+tampon courant à celui de son cache local pour savoir s'il doit recharger.
+Le cache par défaut est partagé (Redis ou table en base, voir CACHES). Sans
+Redis, chaque lecture du tampon est une requête SQL : un worker garde donc le
+tampon lu pendant LOCAL_SECONDES avant de relire le cache. Les autres workers
+voient un changement au plus tard LOCAL_SECONDES après le commit ; celui qui
+l'a fait, tout de suite.
+"""
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.dispatch import Signal
+
+
+CATALOGUE = "catalogue"
+CONFIGURATION = "configuration"
+
+LOCAL_SECONDES = 2
+
+# envoyé après le remplacement d'un tampon (argument `nom`)
+version_changee = Signal()
+
+_locales = {}  # nom -> (tampon, échéance time.monotonic())
+
+
+def _cle(nom):
+    return f"version:{nom}"
+
+
+def _retenir(nom, valeur):
+    _locales[nom] = (valeur, time.monotonic() + LOCAL_SECONDES)
+
+
+def version(nom):
+    """Tampon courant de `nom` (créé s'il n'existe pas encore)."""
+    local = _locales.get(nom)
+    if local is not None and local[1] > time.monotonic():
+        return local[0]
+
+    valeur = cache.get(_cle(nom))
+    if valeur is None:
+        valeur = uuid.uuid4().hex
+        # add : si un autre worker vient de le créer, on garde le sien
+        if not cache.add(_cle(nom), valeur, None):
+            valeur = cache.get(_cle(nom), valeur)
+    _retenir(nom, valeur)
+    return valeur
+
+
+def oublier():
+    """Relira le cache partagé à la prochaine lecture (tests, commandes)."""
+    _locales.clear()
+
+
+def incrementer(nom):
+    """
+    Invalide `nom` : les caches locaux seront reconstruits à la prochaine lecture.
+
+    Le tampon n'est remplacé qu'au commit, sinon un worker pourrait recharger
+    les anciennes données sous le nouveau tampon.
+    """
+    def remplacer():
+        valeur = uuid.uuid4().hex
+        cache.set(_cle(nom), valeur, None)
+        _retenir(nom, valeur)
+        version_changee.send(sender=None, nom=nom)
+
+    transaction.on_commit(remplacer)
@@ -1,29 +1,46 @@
+import hashlib
+import logging
+
+from asgiref.sync import sync_to_async
+
 from django.shortcuts import render, redirect, get_object_or_404
+from django.core import signing
+from django.core.paginator import Paginator
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Q
-from django.core.mail import send_mail
 from django.db.models import Q
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 
 from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
 
+from . import (
+    autocompletion, commandes, compteurs, configuration, evenements, images, journal, metriques,
+    notifications, profilage, recherche,
+)
+from .limiteur import limiter
 from .models import (
     Category,
     Licence,
     ServiceImei,
-    Wallet,
     Transaction,
     Commande,
     Historique,
-    PaymentConfig,
-    CommandeFieldValue,
     Service,
 )
 
+logger = logging.getLogger(__name__)
+
+
 # =====================================================
 # PAGE D’ACCUEIL PUBLIQUE (AVANT CONNEXION)
 # =====================================================
@@ -43,12 +60,9 @@ def home(request):
 )
 
     if query:
-        categories = categories.filter(
-            Q(licences__nom__icontains=query) |
-            Q(licences__destription__icontains=query) |
-            Q(services__nom__icontains=query) |
-            Q(services__destription__icontains=query)
-        ).distinct()
+        # catégories ayant une licence ou un service IMEI correspondant (résultats en cache)
+        _, categories_trouvees = recherche.ids(recherche.rechercher(query), "licences", "services")
+        categories = categories.filter(pk__in=categories_trouvees)
 
     return render(request, "affirche/home.html", {
         "categories": categories,
@@ -63,45 +77,57 @@ def home(request):
 
 from django.db.models import Q, Prefetch
 
-@login_required
-def accueil(request):
-    query = request.GET.get("q", "").strip()
 
-    if query:
-        # 🔹 éléments filtrés UNIQUEMENT par le mot recherché
-        licences_qs = Licence.objects.filter(
-            Q(nom__icontains=query) |
-            Q(destription__icontains=query)
-        )
+def _categories_recherche(query):
+    """Catégories contenant au moins un produit correspondant à `query`."""
+    # 🔹 ids des produits trouvés : en cache tant que le catalogue ne change pas
+    produits, categories = recherche.ids(
+        recherche.rechercher(query), "licences", "services", "services_generaux"
+    )
 
-        services_imei_qs = ServiceImei.objects.filter(
-            Q(nom__icontains=query) |
-            Q(destription__icontains=query)
-        )
+    # 🔹 catégories QUI CONTIENNENT AU MOINS UN MATCH, avec ces produits seulement
+    return Category.objects.filter(pk__in=categories).prefetch_related(
+        Prefetch("licences", queryset=Licence.objects.filter(pk__in=produits["licences"])),
+        Prefetch("services", queryset=ServiceImei.objects.filter(pk__in=produits["services"])),
+        Prefetch("services_generaux", queryset=Service.objects.filter(pk__in=produits["services_generaux"])),
+    )
 
-        services_generaux_qs = Service.objects.filter(
-            Q(nom__icontains=query) |
-            Q(description__icontains=query)
-        )
 
-        # 🔹 catégories QUI CONTIENNENT AU MOINS UN MATCH
-        categories = Category.objects.filter(
-            Q(licences__in=licences_qs) |
-            Q(services__in=services_imei_qs) |
-            Q(services_generaux__in=services_generaux_qs)
-        ).distinct().prefetch_related(
-            Prefetch("licences", queryset=licences_qs),
-            Prefetch("services", queryset=services_imei_qs),
-            Prefetch("services_generaux", queryset=services_generaux_qs),
-        )
+CATEGORIES_PAR_PAGE = 5
+
 
+def _categories_produits(categorie_id):
+    """Une catégorie avec ses produits (section du menu)."""
+    return Category.objects.prefetch_related(
+        "licences",
+        "services",
+        "services_generaux",
+    ).filter(pk=categorie_id)
+
+
+def _page_categories(numero):
+    """Tout le catalogue, CATEGORIES_PAR_PAGE catégories à la fois (« Voir plus »)."""
+    categories = Category.objects.prefetch_related(
+        "licences",
+        "services",
+        "services_generaux",
+    )
+    return Paginator(categories, CATEGORIES_PAR_PAGE).get_page(numero)
+
+
+@login_required
+def accueil(request):
+    query = request.GET.get("q", "").strip()
+
+    # 🔹 menu : noms seulement, les produits des autres sections
+    #    sont chargés à la demande (accueil_section)
+    menu_categories = Category.objects.only("id", "nom")
+
+    page = None
+    if query:
+        categories = _categories_recherche(query)
     else:
-        # 🔹 pas de recherche → affichage normal
-        categories = Category.objects.prefetch_related(
-            "licences",
-            "services",
-            "services_generaux",
-        )
+        categories = page = _page_categories(1)
 
     commandes_attente = Commande.objects.filter(
         user=request.user,
@@ -112,30 +138,114 @@ def accueil(request):
         user=request.user
     ).order_by("-date")
 
-    wallet, _ = Wallet.objects.get_or_create(user=request.user)
-
+    # 🔹 wallet + badges : déjà joints à request.user (request.account)
     return render(request, "affirche/accueil.html", {
         "categories": categories,
+        "page": page,
+        "menu_categories": menu_categories,
+        "resume": request.account.resume,
         "commandes_attente": commandes_attente,
         "historiques": historiques,
-        "wallet": wallet,
+        "wallet": request.account.wallet,
+        "query": query,
+    })
+
+
+# =====================================================
+# FRAGMENTS HTML (SECTION / RECHERCHE)
+# =====================================================
+@login_required
+def accueil_section(request, categorie_id):
+    categories = _categories_produits(categorie_id)
+    if not categories:
+        raise Http404
+
+    return render(request, "affirche/_produits.html", {
+        "categories": categories,
+    })
+
+
+@login_required
+def accueil_recherche(request):
+    query = request.GET.get("q", "").strip()
+
+    # recherche vide : retour au catalogue complet (page demandée)
+    page = None if query else _page_categories(request.GET.get("page"))
+    return render(request, "affirche/_produits.html", {
+        "categories": _categories_recherche(query) if query else page,
+        "page": page,
         "query": query,
     })
 
 
 
+# =====================================================
+# AUTOCOMPLÉTION (JSON, INDEX EN MÉMOIRE)
+# =====================================================
+@require_GET
+def autocompletion_catalogue(request):
+    prefixe = request.GET.get("q", "").strip()[:100]
+    try:
+        limite = int(request.GET.get("limite", autocompletion.LIMITE_DEFAUT))
+    except ValueError:
+        limite = autocompletion.LIMITE_DEFAUT
+    limite = max(1, min(limite, autocompletion.LIMITE_MAX))
+
+    version, index = autocompletion.index()
+
+    # même catalogue + même saisie → même réponse : revalidation par ETag
+    empreinte = hashlib.sha1(autocompletion.normaliser(prefixe).encode()).hexdigest()[:16]
+    etag = f'"{version}-{limite}-{empreinte}"'
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponse(status=304)
+    else:
+        response = JsonResponse({
+            "q": prefixe,
+            "resultats": index.chercher(prefixe, limite),
+        })
+    response["ETag"] = etag
+    response["Cache-Control"] = "public, max-age=60"
+    return response
+
+
+# =====================================================
+# ÉVÉNEMENTS TEMPS RÉEL (SSE : STATUTS + SOLDE)
+# =====================================================
+async def evenements_compte(request):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+
+    # sous WSGI un flux infini bloquerait un worker : 204 = pas de reconnexion
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    try:
+        depuis = int(request.headers.get("Last-Event-ID", ""))
+    except ValueError:
+        depuis = await sync_to_async(evenements.sequence)(user.id)
+
+    response = StreamingHttpResponse(
+        evenements.flux(user.id, depuis),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 # =====================================================
 # PAGE FONDS
 # =====================================================
 @login_required
 def fonds(request):
-    wallet, _ = Wallet.objects.get_or_create(user=request.user)
+    wallet = request.account.wallet
 
     transactions = Transaction.objects.filter(
         user=request.user
     ).order_by("-date")
 
-    payment_configs = PaymentConfig.objects.filter(actif=True)
+    payment_configs = configuration.paiements_actifs()
 
     return render(request, "affirche/fonds.html", {
         "wallet": wallet,
@@ -147,49 +257,45 @@ def fonds(request):
 # =====================================================
 # AJOUTER DES FONDS
 # =====================================================
+@limiter("ajouter_fonds")
 @login_required
 def ajouter_fonds(request):
-    print("🚨 ajouter_fonds APPELÉ 🚨")
-
     if request.method != "POST":
-        print("❌ PAS UN POST")
         return redirect("fonds")
 
-    print("✅ POST DÉTECTÉ")
-
     montant = request.POST.get("montant")
     methode = request.POST.get("methode")
     reference = request.POST.get("reference")
 
-    print("📦 DONNÉES :", montant, methode, reference)
-
     if not montant or not methode or not reference:
-        print("❌ CHAMPS MANQUANTS")
         messages.error(request, "Tous les champs sont obligatoires.")
         return redirect("fonds")
 
-    transaction = Transaction.objects.create(
-        user=request.user,
-        montant=int(montant),
-        methode=methode,
-        reference=reference,
-        statut="attente"
-    )
-
-    print("✅ TRANSACTION CRÉÉE")
+    with transaction.atomic():
+        depot = Transaction.objects.create(
+            user=request.user,
+            montant=int(montant),
+            methode=methode,
+            reference=reference,
+            statut="attente"
+        )
+        compteurs.depot_demande(depot)
+        journal.consigner_depots("depot.demande", [depot])
+    metriques.DEPOTS.inc(methode=methode)
+    logger.info("Dépôt %s demandé (%s, %s FCFA)", depot.id, methode, depot.montant)
 
-    config = PaymentConfig.objects.filter(
-        methode=methode,
-        actif=True
-    ).first()
+    config = configuration.paiement(methode)
 
     numero = config.numero if config else "NON DÉFINI"
 
-    print("📧 AVANT SEND_MAIL")
-
-    send_mail(
-        subject="💰 Nouvelle demande d'ajout de fonds",
-        message=(
+    # 📧 admin : récapitulatif groupé (ou envoi immédiat si gros montant)
+    notifications.notifier(
+        "depot",
+        request.user,
+        libelle=methode,
+        montant=depot.montant,
+        sujet="💰 Nouvelle demande d'ajout de fonds",
+        details=(
             f"Utilisateur : {request.user.username}\n"
             f"Email : {request.user.email}\n"
             f"Méthode : {methode}\n"
@@ -197,13 +303,8 @@ def ajouter_fonds(request):
             f"Montant : {montant} FCFA\n"
             f"Référence : {reference}"
         ),
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        recipient_list=[settings.ADMIN_EMAIL],
-        fail_silently=False,
     )
 
-    print("✅ APRÈS SEND_MAIL")
-
     messages.success(request, "Demande envoyée. En attente de validation.")
     return redirect("fonds")
 
@@ -213,6 +314,7 @@ def ajouter_fonds(request):
 # =====================================================
 # AUTHENTIFICATION
 # =====================================================
+@limiter("login")
 def login_view(request):
     if request.method == "POST":
         user = authenticate(
@@ -229,6 +331,7 @@ def login_view(request):
     return render(request, "affirche/login.html")
 
 
+@limiter("register")
 def register_view(request):
     if request.method == "POST":
         if request.POST["password1"] != request.POST["password2"]:
@@ -260,98 +363,45 @@ def commande(request, type_produit, produit_id):
     # =========================
     # RÉCUPÉRATION PRODUIT
     # =========================
-    if type_produit == "licence":
-        produit = get_object_or_404(Licence, id=produit_id)
-        produit.need_email = True
-        produit.need_username = True
-        produit.need_imei = False
-        produit.need_photo = False
-
-    elif type_produit == "service":
-        produit = get_object_or_404(ServiceImei, id=produit_id)
-        produit.need_email = True
-        produit.need_username = True
-        produit.need_imei = True
-        produit.need_photo = False
-
-    elif type_produit == "service_general":
-        produit = get_object_or_404(Service, id=produit_id)
-        produit.need_email = produit.demande_email
-        produit.need_username = produit.demande_username
-        produit.need_imei = produit.demande_imei
-        produit.need_photo = produit.demande_photo
-
-    else:
+    modele = commandes.PRODUITS.get(type_produit)
+    if modele is None:
         messages.error(request, "Produit invalide")
         return redirect("accueil")
 
+    produit = get_object_or_404(modele, id=produit_id)
+    requis = commandes.exigences(type_produit, produit)
+    produit.need_email = requis["email"]
+    produit.need_username = requis["username"]
+    produit.need_imei = requis["imei"]
+    produit.need_photo = requis["photo"]
+
     # =========================
     # CHAMPS DYNAMIQUES
     # =========================
-    custom_fields = []
-
-    if hasattr(produit, "custom_fields"):
-        custom_fields.extend(produit.custom_fields.all())
-
-    if produit.category:
-        for field in produit.category.custom_fields.all():
-            if field not in custom_fields:
-                custom_fields.append(field)
+    custom_fields = configuration.champs_personnalises(produit)
 
     # =========================
-    # POST
+    # POST : VALIDATION + DÉBIT + CRÉATION (SERVICE PARTAGÉ)
     # =========================
     if request.method == "POST":
-
-        commande = Commande.objects.create(
-            user=request.user,
-            type_commande=type_produit,
-            nom_produit=produit.nom,
-            prix=produit.prix,
-            email=request.POST.get("email", ""),
-            username_service=request.POST.get("username_service", ""),
-            imei=request.POST.get("imei", ""),
-            photo_lien=request.POST.get("photo_lien", ""),
-            statut="attente"
-        )
-
-        # =========================
-        # SAUVEGARDE CHAMPS CUSTOM
-        # =========================
-        custom_text = ""
-        for field in custom_fields:
-            value = request.POST.get(f"custom_{field.id}")
-            if value:
-                CommandeFieldValue.objects.create(
-                    commande=commande,
-                    field=field,
-                    value=value
-                )
-                custom_text += f"{field.nom} : {value}\n"
-
-        # =========================
-        # EMAIL ADMIN (ICI ✅)
-        # =========================
-        send_mail(
-            subject="🛒 Nouvelle commande - SK Serveur",
-            message=(
-                f"Utilisateur : {request.user.username}\n"
-                f"Email compte : {request.user.email}\n\n"
-                f"Produit : {commande.nom_produit}\n"
-                f"Type : {type_produit}\n"
-                f"Prix : {commande.prix} FCFA\n\n"
-                f"--- INFOS COMMANDE ---\n"
-                f"Email service : {commande.email}\n"
-                f"Username : {commande.username_service}\n"
-                f"IMEI : {commande.imei}\n"
-                f"Photo : {commande.photo_lien}\n\n"
-                f"--- CHAMPS PERSONNALISÉS ---\n"
-                f"{custom_text}"
-            ),
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[settings.ADMIN_EMAIL],
-            fail_silently=False,
-        )
+        donnees = {
+            "email": request.POST.get("email"),
+            "username_service": request.POST.get("username_service"),
+            "imei": request.POST.get("imei"),
+            "photo_lien": request.POST.get("photo_lien"),
+            "champs": {field.id: request.POST.get(f"custom_{field.id}") for field in custom_fields},
+        }
+
+        try:
+            ligne = commandes.preparer(request.user, type_produit, produit, donnees)
+            commandes.creer(request.user, [ligne])
+        except commandes.CommandeInvalide as exc:
+            for erreur in exc.erreurs:
+                messages.error(request, erreur)
+            return redirect(request.path)
+        except commandes.SoldeInsuffisant:
+            messages.error(request, "Solde insuffisant.")
+            return redirect("fonds")
 
         messages.success(request, "Commande envoyée avec succès")
         return redirect("accueil")
@@ -361,95 +411,150 @@ def commande(request, type_produit, produit_id):
     # =========================
     return render(request, "affirche/commande.html", {
         "produit": produit,
+        "type": type_produit,
         "custom_fields": custom_fields
     })
 
-    # =========================
-    # CHAMPS DYNAMIQUES
-    # =========================
-    custom_fields = getattr(produit, "custom_fields", []).all() if hasattr(produit, "custom_fields") else []
 
-    # =========================
-    # POST
-    # =========================
-    if request.method == "POST":
 
-        email = request.POST.get("email")
-        username_service = request.POST.get("username_service")
-        imei = request.POST.get("imei")
-        photo_lien = request.POST.get("photo_lien")
+# =====================================================
+# COMMANDE EN LOT (CSV D'IMEI)
+# =====================================================
+@login_required
+def commande_lot(request, type_produit, produit_id):
+    modele = commandes.PRODUITS.get(type_produit)
+    if modele is None:
+        raise Http404
+    produit = get_object_or_404(modele, id=produit_id)
+    if not commandes.accepte_lot(type_produit, produit):
+        raise Http404
+
+    custom_fields = configuration.champs_personnalises(produit)
+    contexte = {
+        "produit": produit,
+        "type": type_produit,
+        "custom_fields": custom_fields,
+        "requis": commandes.exigences(type_produit, produit),
+        "lignes_max": commandes.LOT_LIGNES_MAX,
+    }
 
-        # validation dynamique
-        if produit.need_email and not email:
-            messages.error(request, "Email obligatoire.")
-            return redirect(request.path)
+    if request.method != "POST":
+        return render(request, "affirche/commande_lot.html", contexte)
+
+    fichier = request.FILES.get("fichier")
+    if fichier is None:
+        messages.error(request, "Choisissez un fichier CSV.")
+        return render(request, "affirche/commande_lot.html", contexte)
+
+    defauts = {
+        "email": request.POST.get("email", ""),
+        "username_service": request.POST.get("username_service", ""),
+    }
+    try:
+        valides, rapport = commandes.lire_lot(fichier.file, request.user, type_produit, produit, defauts)
+    except commandes.CommandeInvalide as exc:
+        for erreur in exc.erreurs:
+            messages.error(request, erreur)
+        return render(request, "affirche/commande_lot.html", contexte)
+
+    # lignes valides : un seul débit, insertions groupées
+    try:
+        creees = commandes.creer(request.user, [ligne for _, ligne in valides])
+    except commandes.SoldeInsuffisant as exc:
+        messages.error(request, f"Solde insuffisant : {exc.total} FCFA nécessaires, aucune commande créée.")
+        creees = []
+    else:
+        for (index, _), commande_creee in zip(valides, creees):
+            rapport[index]["commande"] = commande_creee.id
+
+    contexte.update({
+        "rapport": rapport,
+        "nombre_creees": len(creees),
+        "nombre_erreurs": sum(1 for ligne in rapport if ligne["erreurs"]),
+        "total": sum(c.prix for c in creees),
+    })
+    return render(request, "affirche/commande_lot.html", contexte)
 
-        if produit.need_username and not username_service:
-            messages.error(request, "Nom d'utilisateur obligatoire.")
-            return redirect(request.path)
 
-        if produit.need_imei and not imei:
-            messages.error(request, "IMEI obligatoire.")
-            return redirect(request.path)
+# =====================================================
+# MINIATURES DES IMAGES PRODUITS
+# =====================================================
+@require_GET
+def image_miniature(request, jeton, largeur):
+    if largeur not in images.LARGEURS:
+        raise Http404
 
-        if produit.need_photo and not photo_lien:
-            messages.error(request, "Photo obligatoire.")
-            return redirect(request.path)
+    try:
+        url = images.url_source(jeton)
+    except signing.BadSignature:
+        raise Http404
 
-        if wallet.solde < produit.prix:
-            messages.error(request, "Solde insuffisant.")
-            return redirect("fonds")
+    extension = "webp" if "image/webp" in request.META.get("HTTP_ACCEPT", "") else "jpg"
 
-        wallet.solde -= produit.prix
-        wallet.save()
+    try:
+        chemin = images.variante(url, largeur, extension)
+        fichier = open(chemin, "rb")
+    except (images.ImageIndisponible, FileNotFoundError):
+        # on retombe sur l'image d'origine, sans la mettre en cache longtemps
+        response = redirect(url)
+        response["Cache-Control"] = "public, max-age=300"
+        return response
 
-        # ✅ CRÉATION COMMANDE (STOCKÉE)
-        commande = Commande.objects.create(
-            user=request.user,
-            type_commande=type_produit,
-            nom_produit=produit.nom,
-            prix=produit.prix,
-            email=email or "",
-            username_service=username_service or "",
-            imei=imei,
-            photo_lien=photo_lien,
-            statut="attente"
-        )
+    response = FileResponse(fichier, content_type=images.FORMATS[extension][1])
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    response["Vary"] = "Accept"
+    return response
 
-        # =========================
-        # VALEURS DES CHAMPS CUSTOM
-        # =========================
-        for field in custom_fields:
-            value = request.POST.get(f"custom_{field.id}")
-            if value:
-                CommandeFieldValue.objects.create(
-                    commande=commande,
-                    field=field,
-                    value=value
-                )
-
-        send_mail(
-            subject="🛒 Nouvelle commande reçue",
-            message=(
-                f"Utilisateur : {request.user.username}\n"
-                f"Produit : {produit.nom}\n"
-                f"Prix : {produit.prix} FCFA\n"
-            ),
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[settings.ADMIN_EMAIL],
-            fail_silently=False,
-        )
 
-        messages.success(request, "Commande envoyée (en attente de validation).")
-        return redirect("accueil")
 
-    # =========================
-    # GET
-    # =========================
-    return render(request, "affirche/commande.html", {
-        "produit": produit,
-        "type": type_produit,
-        "custom_fields": custom_fields,
+# =====================================================
+# MÉTRIQUES (PROMETHEUS)
+# =====================================================
+@require_GET
+def metrics(request):
+    token = settings.METRIQUES_TOKEN
+    autorise = request.user.is_staff or (
+        token and request.META.get("HTTP_AUTHORIZATION", "") == f"Bearer {token}"
+    )
+    if not autorise:
+        return HttpResponse(status=403)
+
+    return HttpResponse(
+        metriques.exposition(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+# =====================================================
+# PROFILS cProfile (STAFF)
+# =====================================================
+@staff_member_required
+@require_GET
+def profils(request):
+    return render(request, "admin/serveur/profils.html", {
+        **admin.site.each_context(request),
+        "title": "Profils des requêtes",
+        "profils": profilage.liste(),
     })
 
 
+@staff_member_required
+@require_GET
+def profil(request, ident):
+    infos = profilage.infos(ident)
+    chemin = profilage.chemin_profil(ident)
+    if infos is None or chemin is None:
+        raise Http404("Profil introuvable (évincé ?)")
+
+    # .prof brut pour snakeviz / python -m pstats
+    if request.GET.get("telecharger"):
+        return FileResponse(open(chemin, "rb"), as_attachment=True, filename=f"{ident}.prof")
+
+    tri = "tottime" if request.GET.get("tri") == "tottime" else "cumulative"
+    return render(request, "admin/serveur/profil.html", {
+        **admin.site.each_context(request),
+        "title": f"Profil {infos['vue']} — {infos['duree_ms']} ms",
+        "profil": infos,
+        "tri": tri,
+        "fonctions": profilage.fonctions(ident, tri),
+    })
@@ -57,12 +57,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'serveur.middleware.MetriquesMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'serveur.middleware.RoutageMiddleware',  # lectures sur réplicas (optionnel)
     'whitenoise.middleware.WhiteNoiseMiddleware',  # 👈 AJOUT ICI
+    'serveur.middleware.CompressionTexteMiddleware',  # gzip des pages HTML
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'serveur.middleware.CompteMiddleware',
+    'serveur.middleware.ProfilageMiddleware',  # profils cProfile à la demande
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -97,6 +102,79 @@ DATABASES = {
     )
 }
 
+# Réplicas en lecture (optionnel) : URLs séparées par des virgules.
+# Catalogue et historique y sont lus pendant les GET (voir serveur/routage.py).
+DATABASE_REPLICAS = []
+for numero, url in enumerate(
+    filter(None, (u.strip() for u in os.environ.get("DATABASE_REPLICA_URLS", "").split(","))), 1
+):
+    DATABASES[f"replica_{numero}"] = dj_database_url.parse(url)
+    DATABASES[f"replica_{numero}"]["TEST"] = {"MIRROR": "default"}
+    DATABASE_REPLICAS.append(f"replica_{numero}")
+
+DATABASE_ROUTERS = ["serveur.routage.RouteurReplicas"]
+
+# après un POST, l'utilisateur relit le principal pendant ce délai
+REPLICA_STICKY_SECONDES = int(os.environ.get("REPLICA_STICKY_SECONDES", 15))
+
+
+# Cache
+# "default" est toujours partagé entre les workers (tampons de version, index,
+# ETag, événements) : Redis si REDIS_URL est défini, sinon une table de la
+# base (créée par "manage.py createcachetable", voir build.sh).
+# "limiteur" ne doit jamais coûter de requête SQL : Redis s'il existe, sinon
+# la mémoire du processus (les limites s'appliquent alors par worker).
+
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        },
+        "limiteur": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "cache_partage",
+        },
+        "limiteur": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "limiteur",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        },
+    }
+
+
+# Limitation du débit (login / inscription / ajout de fonds)
+# Format "nombre/unité" (s, min, h, j), par IP et par nom d'utilisateur.
+
+LIMITEUR_ACTIF = os.environ.get("LIMITEUR_ACTIF", "True") == "True"
+
+# Derrière le proxy de Render, l'IP réelle est dans X-Forwarded-For : c'est
+# l'entrée ajoutée par le premier proxy de confiance, la N-ième en partant de
+# la droite (N = LIMITEUR_PROXIES, le nombre de proxies devant l'application)
+LIMITEUR_PROXY_DE_CONFIANCE = os.environ.get(
+    "LIMITEUR_PROXY_DE_CONFIANCE", os.environ.get("RENDER", "False")
+).lower() == "true"
+LIMITEUR_PROXIES = int(os.environ.get("LIMITEUR_PROXIES", 1))
+
+LIMITES_REQUETES = {
+    "login": {"ip": "60/min", "username": "5/min"},
+    "register": {"ip": "30/h", "username": "5/min"},
+    "ajouter_fonds": {"ip": "60/h", "username": "10/h"},
+}
+
+
+# request.user est chargé avec son wallet et son résumé (une requête jointe)
+AUTHENTICATION_BACKENDS = [
+    "serveur.comptes.CompteBackend",
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -140,11 +218,13 @@ LOGOUT_REDIRECT_URL = 'login'
 
 
 
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+# SMTP + mesure de la latence / des échecs d'envoi (métriques)
+EMAIL_BACKEND = "serveur.email.EmailBackendMesure"
 
-EMAIL_HOST = "smtp.gmail.com"
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
+# surchargeables pour pointer vers un SMTP local (ex. puits de test de charge)
+EMAIL_HOST = os.environ.get("EMAIL_HOST", "smtp.gmail.com")
+EMAIL_PORT = int(os.environ.get("EMAIL_PORT", 587))
+EMAIL_USE_TLS = os.environ.get("EMAIL_USE_TLS", "True") == "True"
 
 # Gmail qui ENVOIE les mails
 EMAIL_HOST_USER = "lesaints969@gmail.com"
@@ -155,6 +235,28 @@ DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 # Gmail qui REÇOIT les notifications
 ADMIN_EMAIL = "skofficiel969@gmail.com"
 
+# Notifications admin : un récapitulatif par fenêtre au lieu d'un e-mail par
+# commande / dépôt (cron conseillé : manage.py envoyer_digest toutes les minutes)
+NOTIFICATIONS_DIGEST = os.environ.get("NOTIFICATIONS_DIGEST", "True") == "True"
+NOTIFICATIONS_FENETRE_MINUTES = int(os.environ.get("NOTIFICATIONS_FENETRE_MINUTES", 15))
+# montant (FCFA) à partir duquel l'admin est prévenu immédiatement
+NOTIFICATIONS_SEUIL_IMMEDIAT = int(os.environ.get("NOTIFICATIONS_SEUIL_IMMEDIAT", 50000))
+
+# Expiration des demandes oubliées (cron : manage.py expirer_attente) :
+# commandes remboursées, dépôts clos, un e-mail récapitulatif par utilisateur
+EXPIRATION_COMMANDES_JOURS = int(os.environ.get("EXPIRATION_COMMANDES_JOURS", 7))
+EXPIRATION_DEPOTS_JOURS = int(os.environ.get("EXPIRATION_DEPOTS_JOURS", 3))
+
+# Recherche catalogue : part des recherches comptées dans les statistiques
+# (RechercheStat), recherches populaires préchauffées à chaque changement
+RECHERCHE_ECHANTILLON = float(os.environ.get("RECHERCHE_ECHANTILLON", 0.2))
+RECHERCHE_PRECHAUFFAGE = int(os.environ.get("RECHERCHE_PRECHAUFFAGE", 50))
+
+# Export du journal des changements (manage.py exporter_journal) :
+# fichiers JSONL gzip, un nouveau par jour ou au-delà de la taille max
+JOURNAL_EXPORT_DIR = os.environ.get("JOURNAL_EXPORT_DIR", BASE_DIR / "journal")
+JOURNAL_FICHIER_MAX_OCTETS = int(os.environ.get("JOURNAL_FICHIER_MAX_OCTETS", 64 * 1024 * 1024))
+
 
 
 
@@ -165,4 +267,33 @@ ADMIN_EMAIL = "skofficiel969@gmail.com"
 # c est l hebergement
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
-STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+# /metrics : accessible au staff ou avec "Authorization: Bearer <METRIQUES_TOKEN>"
+METRIQUES_TOKEN = os.environ.get("METRIQUES_TOKEN", "")
+
+# Miniatures des images produits (proxy local, cache disque LRU)
+IMAGES_CACHE_DIR = os.environ.get("IMAGES_CACHE_DIR", BASE_DIR / "cache_images")
+IMAGES_CACHE_MAX_OCTETS = int(os.environ.get("IMAGES_CACHE_MAX_OCTETS", 200 * 1024 * 1024))
+# après un échec de téléchargement, redirection directe vers l'origine pendant ce délai
+IMAGES_ECHEC_SECONDES = int(os.environ.get("IMAGES_ECHEC_SECONDES", 300))
+
+# Profilage cProfile à la demande (staff : en-tête "X-Profilage: 1") ou sur
+# une part des requêtes, limitée aux vues listées (vide = toutes) ;
+# anneau de PROFILAGE_MAX profils, consultables sur /supervision/profils/
+PROFILAGE_ECHANTILLON = float(os.environ.get("PROFILAGE_ECHANTILLON", 0))
+PROFILAGE_VUES = [v for v in os.environ.get("PROFILAGE_VUES", "").split(",") if v]
+PROFILAGE_DIR = os.environ.get("PROFILAGE_DIR", BASE_DIR / "profils")
+PROFILAGE_MAX = int(os.environ.get("PROFILAGE_MAX", 200))
+
+# Index TAC -> marque / modèle (manage.py importer_tac fichier.csv)
+TAC_INDEX = os.environ.get("TAC_INDEX", BASE_DIR / "donnees" / "tac.idx")
+
+# Fichiers statiques hashés (nom.<hash>.css) + versions gzip/brotli :
+# WhiteNoise les sert avec "Cache-Control: max-age=315360000, immutable".
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "serveur.stockage.StockageStatique",
+    },
+}